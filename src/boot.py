@@ -22,14 +22,16 @@ def DisableWifi() :
     wlan.active(False)
     sleep(1)
 
+def GetWifiTxPower() :
+    global wlan
+    return wlan.config('txpower')
+
+def SetWifiTxPower(dbm) :
+    global wlan
+    wlan.config(txpower=dbm)
+
 EnableWifi()
 
 if wlan.isconnected() == False :
     soft_reset()
 
-try :
-    import requests
-except :
-    import mip
-    mip.install('requests')
-    soft_reset()
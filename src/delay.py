@@ -0,0 +1,138 @@
+# Learned Stream Start Delay Model
+'''
+    model = DelayModel()
+
+    # When a stream goes live
+    model.record(channel_id, video_id, actual_start - scheduled_start)
+
+    # Seconds relative to the scheduled start, to begin polling (negative: before)
+    model.wait_start(channel_id)                        # -600 without enough samples
+
+    # Polling interval at (now - scheduled_start) seconds.
+    # Slower where the stream rarely goes live, base_ms where it is most likely.
+    model.interval_ms(channel_id, elapsed, base_ms=10000)
+'''
+
+from micropython import const
+import array, json
+
+__all__ = ['DelayModel']
+
+_BIN_SECONDS = const(60)    # 1 minute per bin
+_MIN_DELAY = const(-10)     # First bin: 10 minutes early (or more)
+_BINS = const(41)           # Last bin: 30 minutes late (or more)
+_MAX_COUNT = const(200)     # Counts are halved beyond this, recent streams weigh more
+
+class DelayModel:
+    """
+    Histogram of (actual start - scheduled start) per channel.
+    Polls are concentrated on the minutes where the stream is most likely to go live.
+    """
+    def __init__(self, path: str = './delay.json', min_samples: int = 5,
+                 max_factor: int = 6, quantile: float = 0.05):
+        """
+        Args:
+            path (str): File to persist the histograms.
+            min_samples (int): The model is not used below this number of samples.
+            max_factor (int): Upper limit of the polling interval multiplier.
+            quantile (float): Polling starts before this quantile of the delay.
+        """
+        self._path = path
+        self._min_samples = min_samples
+        self._max_factor = max_factor
+        self._quantile = quantile
+        self._hist = {}     # channel_id: array('H') of _BINS counts
+        self._last = {}     # channel_id: last recorded video_id
+        self._load()
+
+    def samples(self, channel_id) -> int:
+        hist = self._hist.get(channel_id)
+        return sum(hist) if hist is not None else 0
+
+    def histogram(self, channel_id):
+        return self._hist.get(channel_id)
+
+    def record(self, channel_id, video_id, delay_seconds: int):
+        """Adds a sample. The same video is recorded only once."""
+        if channel_id is None or self._last.get(channel_id) == video_id:
+            return
+        hist = self._hist.get(channel_id)
+        if hist is None:
+            hist = array.array('H', (0 for _ in range(_BINS)))
+            self._hist[channel_id] = hist
+        index = self._bin(delay_seconds)
+        hist[index] += 1
+        if hist[index] > _MAX_COUNT:
+            for i in range(_BINS):
+                hist[i] //= 2
+        self._last[channel_id] = video_id
+        self._save()
+
+    def wait_start(self, channel_id) -> int:
+        """
+        Seconds relative to the scheduled start to begin polling. Never earlier than 10 minutes.
+        A minute before the delay quantile, the stream has rarely started before it.
+        """
+        hist = self._hist.get(channel_id)
+        total = sum(hist) if hist is not None else 0
+        if total < self._min_samples:
+            return _MIN_DELAY * _BIN_SECONDS
+        threshold = total * self._quantile
+        acc = 0
+        for i in range(_BINS):
+            acc += hist[i]
+            if acc > threshold:
+                return max(_MIN_DELAY, _MIN_DELAY + i - 1) * _BIN_SECONDS
+        return _MIN_DELAY * _BIN_SECONDS
+
+    def interval_ms(self, channel_id, elapsed: int, base_ms: int) -> int:
+        """
+        Polling interval at elapsed seconds from the scheduled start.
+        Proportional to (peak hazard / current hazard), clamped to [base_ms, base_ms * max_factor].
+        Hazard is the probability of going live in a minute, given it hasn't gone live yet.
+        """
+        hist = self._hist.get(channel_id)
+        if hist is None or sum(hist) < self._min_samples:
+            return base_ms
+        current = self._bin(elapsed)
+        tail = 0
+        hazard = 0.0
+        peak = 0.0
+        # Laplace smoothing keeps unseen minutes possible
+        for i in range(_BINS - 1, current - 1, -1):
+            tail += hist[i] + 1
+            h = (hist[i] + 1) / tail
+            if i < _BINS - 1: # Last bin is the rest of all, its hazard is always 1
+                peak = max(peak, h)
+            if i == current:
+                hazard = h
+        if peak == 0.0:
+            return base_ms
+        factor = min(self._max_factor, peak / hazard)
+        return int(base_ms * factor)
+
+    def _bin(self, delay_seconds: int) -> int:
+        index = delay_seconds // _BIN_SECONDS - _MIN_DELAY
+        return max(0, min(_BINS - 1, index))
+
+    def _load(self):
+        try:
+            with open(self._path) as f:
+                data = json.loads(f.read())
+            for channel_id, item in data.items():
+                hist = item['hist']
+                if len(hist) == _BINS:
+                    self._hist[channel_id] = array.array('H', hist)
+                    self._last[channel_id] = item.get('last')
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def _save(self):
+        data = {}
+        for channel_id, hist in self._hist.items():
+            data[channel_id] = {'hist': list(hist), 'last': self._last.get(channel_id)}
+        try:
+            with open(self._path, 'w') as f:
+                f.write(json.dumps(data))
+        except OSError:
+            pass
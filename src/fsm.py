@@ -19,9 +19,56 @@
     for _ in range(15):
         fsm.run_cycle()
         time.sleep(0.5)
+
+    # State methods may be coroutines (async def).
+    # run_cycle() completes them without event loop, so they must not suspend.
+    # In asyncio, await the async variants instead.
+    await fsm.start_async(IdleState)
+    while True:
+        await fsm.run_cycle_async()
+        await asyncio.sleep_ms(500)
+
+    # Deadline-driven loop. States declare when they need the next update (State.deadline),
+    # and the loop sleeps until then instead of polling at a fixed period.
+    while True:
+        fsm.run_cycle()
+        machine.lightsleep(fsm.time_to_deadline(default_ms=500))
+
+    # Profiling. Hooks are called with (event, state name, next state name or None, duration_us),
+    # event is 'update' or 'transition' (on_exit + on_enter). Nothing is measured without hooks.
+    fsm.add_hook(lambda event, state, next_state, us: print(event, state, next_state, us))
+    profiler = fsm.enable_profiler(size=32)
+
+    # From the REPL
+    profiler.report()           # Transitions and update() time per state
+    profiler.transitions()      # [(ticks_ms, from, to, duration_us), ...] oldest first
+    profiler.histogram('Waiting')
 '''
 
-__all__ = ['State', 'StateMachine']
+from micropython import const
+import array, time
+
+__all__ = ['State', 'StateMachine', 'Profiler']
+
+def _complete(result):
+    """
+    Returns the value of a coroutine which completes without suspending.
+    Plain values are returned as is.
+    """
+    if not hasattr(result, 'send'):
+        return result
+    try:
+        result.send(None)
+    except StopIteration as e:
+        return e.value
+    result.close()
+    raise RuntimeError('Coroutine suspended in blocking mode, use run_cycle_async()')
+
+async def _await(result):
+    """Awaits a coroutine. Plain values are returned as is."""
+    if hasattr(result, 'send'):
+        return await result
+    return result
 
 class State:
     """
@@ -29,6 +76,8 @@ class State:
     State instances are stateless regarding the context data.
     They receive the context as an argument in methods.
     """
+    # Every method can be defined either as a function or as a coroutine (async def).
+
     def on_enter(self, ctx):
         """Executed once when entering this state."""
         pass
@@ -46,6 +95,136 @@ class State:
         """
         return None
 
+    def deadline(self, ctx):
+        """
+        ticks_ms of the next update() with something to do.
+        None: No deadline, updated at the default period of the loop.
+        """
+        return None
+
+_BUCKETS = const(16)        # update() time histogram: < 64 us, < 128 us, ..., >= 1 s
+_BUCKET_SHIFT = const(6)    # Upper bound of the first bucket: 2^6 us
+_MAX_U32 = const(0xFFFFFFFF)
+
+def _zeros(typecode: str, n: int):
+    return array.array(typecode, (0 for _ in range(n)))
+
+class Profiler:
+    """
+    Fixed-size transition trace and per-state update() time histograms.
+    Buffers are preallocated, recording doesn't allocate (except the first time a state is seen).
+    """
+    def __init__(self, size: int = 32, max_states: int = 8):
+        """
+        Args:
+            size (int): Transitions kept in the ring buffer.
+            max_states (int): Number of distinct states recorded.
+        """
+        self._names = []
+        self._max_states = max_states
+        self._size = size
+        self._ticks = _zeros('I', size)         # ticks_ms
+        self._from = bytearray(size)            # State index
+        self._to = bytearray(size)
+        self._duration = _zeros('I', size)      # on_exit + on_enter, us
+        self._pos = 0
+        self._count = 0
+        self._hist = _zeros('I', max_states * _BUCKETS)
+        # Total in ms, so it lasts ~49 days of update() time (HTTP calls included in blocking mode)
+        self._total_ms = _zeros('I', max_states)
+        self._total_rem_us = _zeros('H', max_states)    # < 1000
+        self._max_us = _zeros('I', max_states)
+        self._flaps = _zeros('I', max_states)   # A -> B -> A transitions
+
+    def __call__(self, event: str, state: str, next_state, duration_us: int):
+        index = self._index(state)
+        if index < 0:
+            return
+        duration_us = min(max(0, duration_us), _MAX_U32)
+        if event == 'update':
+            bucket = 0
+            d = duration_us >> _BUCKET_SHIFT
+            while d and bucket < _BUCKETS - 1:
+                d >>= 1
+                bucket += 1
+            self._hist[index * _BUCKETS + bucket] += 1
+            rem = self._total_rem_us[index] + duration_us % 1000
+            self._total_rem_us[index] = rem % 1000
+            self._total_ms[index] = min(self._total_ms[index] + duration_us // 1000 + rem // 1000, _MAX_U32)
+            if duration_us > self._max_us[index]:
+                self._max_us[index] = duration_us
+        elif event == 'transition':
+            to = self._index(next_state)
+            if to < 0:
+                return
+            pos = self._pos
+            prev = (pos - 1) % self._size
+            if self._count and self._from[prev] == to and self._to[prev] == index:
+                self._flaps[to] += 1
+            self._ticks[pos] = time.ticks_ms()
+            self._from[pos] = index
+            self._to[pos] = to
+            self._duration[pos] = duration_us
+            self._pos = (pos + 1) % self._size
+            self._count = min(self._count + 1, self._size)
+
+    def _index(self, name: str) -> int:
+        try:
+            return self._names.index(name)
+        except ValueError:
+            if len(self._names) >= self._max_states:
+                return -1
+            self._names.append(name)
+            return len(self._names) - 1
+
+    def reset(self):
+        for buf in (self._hist, self._total_ms, self._total_rem_us, self._max_us, self._flaps):
+            for i in range(len(buf)):
+                buf[i] = 0
+        self._pos = 0
+        self._count = 0
+
+    def transitions(self) -> list:
+        """[(ticks_ms, from, to, duration_us), ...] oldest first."""
+        result = []
+        for i in range(self._count):
+            pos = (self._pos - self._count + i) % self._size
+            result.append((self._ticks[pos], self._names[self._from[pos]],
+                           self._names[self._to[pos]], self._duration[pos]))
+        return result
+
+    def histogram(self, state: str) -> list:
+        """[(upper bound us, count), ...] of update() time. The last bound is None (no limit)."""
+        if state not in self._names:
+            return []
+        base = self._names.index(state) * _BUCKETS
+        result = []
+        for bucket in range(_BUCKETS):
+            bound = (1 << (bucket + _BUCKET_SHIFT)) if bucket < _BUCKETS - 1 else None
+            result.append((bound, self._hist[base + bucket]))
+        return result
+
+    def stats(self, state: str) -> dict:
+        """update() count, average and max time (us), and flaps (returned within one transition)."""
+        if state not in self._names:
+            return {'count': 0, 'avg_us': 0, 'max_us': 0, 'flaps': 0}
+        index = self._names.index(state)
+        count = sum(self._hist[index * _BUCKETS:(index + 1) * _BUCKETS])
+        total_us = self._total_ms[index] * 1000 + self._total_rem_us[index]
+        return {'count': count, 'avg_us': total_us // count if count else 0,
+                'max_us': self._max_us[index], 'flaps': self._flaps[index]}
+
+    def report(self):
+        """Prints the statistics and the transition trace."""
+        now = time.ticks_ms()
+        for name in self._names:
+            stats = self.stats(name)
+            print(f"{name}: {stats['count']} updates, avg {stats['avg_us']} us, "
+                  f"max {stats['max_us']} us, {stats['flaps']} flaps")
+            print('  ' + ' '.join(f'<{b}:{n}' if b else f'>=:{n}' for b, n in self.histogram(name) if n))
+        for ticks, src, dst, duration in self.transitions():
+            print(f'{time.ticks_diff(now, ticks):>10} ms ago  {src} -> {dst}  {duration} us')
+
 class StateMachine:
     """
     Generic controller handling state transitions.
@@ -55,6 +234,33 @@ class StateMachine:
         self.current_state = None
         self.states = {}             # Storage for state instances
         self.log = log_func          # Logging function (default: print)
+        self.profiler = None         # Profiler, enabled by enable_profiler()
+        self._hooks = []             # Profiling hooks, see add_hook()
+
+    def add_hook(self, hook):
+        """
+        Adds a profiling hook, hook(event, state, next_state, duration_us).
+            event 'update': update() took duration_us. next_state is the returned state name or None.
+            event 'transition': on_exit() + on_enter() took duration_us.
+        """
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        if hook in self._hooks:
+            self._hooks.remove(hook)
+
+    def enable_profiler(self, size: int = 32):
+        """Adds the built-in Profiler as a hook. Returns it."""
+        if self.profiler is None:
+            self.profiler = Profiler(size, max(len(self.states), 8))
+            self.add_hook(self.profiler)
+        return self.profiler
+
+    def _notify(self, event, state, next_state, start_us):
+        duration = time.ticks_diff(time.ticks_us(), start_us)
+        name = state.__class__.__name__
+        for hook in self._hooks:
+            hook(event, name, next_state, duration)
 
     def add_state(self, state_instance):
         """
@@ -71,7 +277,18 @@ class StateMachine:
         if key in self.states:
             self.current_state = self.states[key]
             self.log(f"[FSM] System Started. Initial State: {key}")
-            self.current_state.on_enter(self.context)
+            _complete(self.current_state.on_enter(self.context))
+        else:
+            self.log(f"[FSM] Error: Initial state '{key}' not registered.")
+
+    async def start_async(self, initial_state_cls):
+        """start() for asyncio. Coroutine state methods may suspend."""
+        key = initial_state_cls.__name__
+        
+        if key in self.states:
+            self.current_state = self.states[key]
+            self.log(f"[FSM] System Started. Initial State: {key}")
+            await _await(self.current_state.on_enter(self.context))
         else:
             self.log(f"[FSM] Error: Initial state '{key}' not registered.")
 
@@ -83,12 +300,55 @@ class StateMachine:
         if not self.current_state:
             return
 
+        hooks = self._hooks
+        if hooks:
+            start = time.ticks_us()
+
         # Inject context into the update method
-        next_state_cls = self.current_state.update(self.context)
+        next_state_cls = _complete(self.current_state.update(self.context))
+
+        if hooks:
+            self._notify('update', self.current_state,
+                         next_state_cls.__name__ if next_state_cls is not None else None, start)
 
         if next_state_cls is not None:
             self._transition(next_state_cls)
 
+    def time_to_deadline(self, default_ms: int = 1000, max_ms: int = None) -> int:
+        """
+        Milliseconds until the deadline of the current state (0 if passed).
+        default_ms if the state has no deadline. Clamped to max_ms.
+        """
+        deadline = None
+        if self.current_state is not None:
+            deadline = self.current_state.deadline(self.context)
+        if deadline is None:
+            ms = default_ms
+        else:
+            ms = max(0, time.ticks_diff(deadline, time.ticks_ms()))
+        if max_ms is not None:
+            ms = min(ms, max_ms)
+        return ms
+
+    async def run_cycle_async(self):
+        """run_cycle() for asyncio. Coroutine state methods may suspend."""
+        if not self.current_state:
+            return
+
+        hooks = self._hooks
+        if hooks:
+            start = time.ticks_us()
+
+        # Including the time suspended in awaits
+        next_state_cls = await _await(self.current_state.update(self.context))
+
+        if hooks:
+            self._notify('update', self.current_state,
+                         next_state_cls.__name__ if next_state_cls is not None else None, start)
+
+        if next_state_cls is not None:
+            await self._transition_async(next_state_cls)
+
     def _transition(self, next_state_cls):
         key = next_state_cls.__name__
         
@@ -102,11 +362,38 @@ class StateMachine:
         # 1. Log the transition
         self.log(f"[FSM] Transition: {prev_state.__class__.__name__} -> {key}")
 
+        hooks = self._hooks
+        if hooks:
+            start = time.ticks_us()
+
         # 2. Exit current state
-        prev_state.on_exit(self.context)
+        _complete(prev_state.on_exit(self.context))
         
         # 3. Switch state
         self.current_state = next_state
         
         # 4. Enter new state
-        self.current_state.on_enter(self.context)
+        _complete(self.current_state.on_enter(self.context))
+
+        if hooks:
+            self._notify('transition', prev_state, key, start)
+
+    async def _transition_async(self, next_state_cls):
+        key = next_state_cls.__name__
+        
+        if key not in self.states:
+            self.log(f"[FSM] Error: Target state '{key}' not registered.")
+            return
+
+        prev_state = self.current_state
+        next_state = self.states[key]
+
+        self.log(f"[FSM] Transition: {prev_state.__class__.__name__} -> {key}")
+        hooks = self._hooks
+        if hooks:
+            start = time.ticks_us()
+        await _await(prev_state.on_exit(self.context))
+        self.current_state = next_state
+        await _await(self.current_state.on_enter(self.context))
+        if hooks:
+            self._notify('transition', prev_state, key, start)
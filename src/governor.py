@@ -0,0 +1,106 @@
+# CPU Frequency Governor
+'''
+    governor = Governor(low_hz=80_000_000, high_hz=240_000_000)
+
+    # Boosted in the block. Nestable, the clock drops when the last holder leaves.
+    with governor:
+        parse()
+
+    # Boosted until the matching release(), e.g. while audio is playing
+    governor.acquire()
+    governor.release()
+
+    # From the REPL
+    governor.report()
+    governor.stats()        # {'low_ms', 'high_ms', 'switches', 'hz'}
+'''
+
+from machine import freq
+from micropython import const
+import time
+
+__all__ = ['Governor']
+
+# Lowest stable clock. APB (Timer, PWM/LEDC, UART) runs at 80 MHz from CPU clocks of 80 MHz and up,
+# so timer periods and the SPWM carrier don't change with the level. ticks_ms/ticks_us
+# come from esp_timer and are independent of the CPU clock. Below 80 MHz APB follows the CPU
+# clock and Wi-Fi stops, so lower levels are not used.
+_MIN_HZ = const(80_000_000)
+_MAX_HZ = const(240_000_000)    # Highest clock of ESP32-S2
+
+class Governor:
+    """
+    Two-level CPU clock: high while any holder needs headroom (TLS handshake, JSON parsing,
+    SPWM audio ISR), low otherwise. Time spent at each level is recorded.
+    """
+    def __init__(self, low_hz: int = _MIN_HZ, high_hz: int = _MAX_HZ):
+        """
+        Args:
+            low_hz (int): Clock while idle. Clamped to 80 MHz and up.
+            high_hz (int): Clock while boosted. low_hz == high_hz: Fixed clock.
+        """
+        self._low_hz = max(_MIN_HZ, min(low_hz, _MAX_HZ))
+        self._high_hz = max(self._low_hz, min(high_hz, _MAX_HZ))
+        self._holders = 0
+        self._high = False
+        self._since = time.ticks_ms()
+        self._low_ms = 0
+        self._high_ms = 0
+        self.switches = 0
+        freq(self._low_hz)
+
+    @property
+    def boosted(self) -> bool:
+        return self._high
+
+    def acquire(self):
+        self._holders += 1
+        if self._holders == 1:
+            self._set(True)
+
+    def release(self):
+        if self._holders == 0:
+            return
+        self._holders -= 1
+        if self._holders == 0:
+            self._set(False)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def _set(self, high: bool):
+        if high == self._high:
+            return
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self._since)
+        if self._high:
+            self._high_ms += elapsed
+        else:
+            self._low_ms += elapsed
+        self._since = now
+        self._high = high
+        if self._high_hz != self._low_hz:
+            # Must not be called from an ISR. Takes effect before the next instruction.
+            freq(self._high_hz if high else self._low_hz)
+            self.switches += 1
+
+    def stats(self) -> dict:
+        """Time spent at each level (ms, including the current one), level switches and the current clock."""
+        elapsed = time.ticks_diff(time.ticks_ms(), self._since)
+        return {
+            'low_ms': self._low_ms + (0 if self._high else elapsed),
+            'high_ms': self._high_ms + (elapsed if self._high else 0),
+            'switches': self.switches,
+            'hz': self._high_hz if self._high else self._low_hz,
+        }
+
+    def report(self):
+        stats = self.stats()
+        total = max(1, stats['low_ms'] + stats['high_ms'])
+        print(f"{self._low_hz // 1_000_000} MHz: {stats['low_ms']} ms ({stats['low_ms'] * 100 // total}%), "
+              f"{self._high_hz // 1_000_000} MHz: {stats['high_ms']} ms ({stats['high_ms'] * 100 // total}%), "
+              f"{stats['switches']} switches")
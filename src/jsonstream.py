@@ -0,0 +1,283 @@
+# Streaming JSON Field Extractor
+'''
+    # Pick fields of every object in root['items'] and 'etag' of root.
+    # Nested fields are written in dotted form, array elements as '[]'.
+    parser = JsonExtractor(
+        'items[]',
+        {'id': 'id', 'liveStreamingDetails.actualStartTime': 'actualStartTime'},
+        {'etag': 'etag'})
+
+    # Reads the stream in small chunks with a fixed-size buffer.
+    # The full document is never built, only the picked fields are kept.
+    records, top = parser.parse(sock)
+    # Stream with coroutine readinto (e.g. session.Response)
+    records, top = await parser.parse_async(response)
+    # records = [{'id': '...', 'actualStartTime': '...'}, ...]
+    # top = {'etag': '...'}
+
+    # Or push chunks manually (e.g. from an asyncio stream)
+    parser.reset()
+    parser.feed(buf, n)
+    records, top = parser.result()
+'''
+
+from micropython import const
+
+__all__ = ['JsonExtractor']
+
+# Tokenizer state
+_S_VALUE = const(0)     # Expecting value or structural character
+_S_STRING = const(1)    # Inside of string
+_S_ESCAPE = const(2)    # After backslash in string
+_S_UNICODE = const(3)   # Inside of \uXXXX escape
+_S_LITERAL = const(4)   # Inside of number, true, false, null
+
+_ARRAY = b'[]'          # Path segment of array element
+
+_ESCAPES = {
+    ord('b'): 0x08, ord('f'): 0x0C, ord('n'): 0x0A, ord('r'): 0x0D, ord('t'): 0x09,
+}
+
+def _split_path(path: str) -> tuple:
+    segments = []
+    for name in path.split('.'):
+        if name.endswith('[]'):
+            if len(name) > 2:
+                segments.append(name[:-2].encode())
+            segments.append(_ARRAY)
+        elif name:
+            segments.append(name.encode())
+    return tuple(segments)
+
+def _decode(data: bytes) -> str:
+    # Truncated capture may end in the middle of multi-byte character
+    for end in range(len(data), max(len(data) - 4, -1), -1):
+        try:
+            return data[:end].decode('utf-8')
+        except UnicodeError:
+            continue
+    return ''
+
+def _literal(data: bytes):
+    if data == b'true':
+        return True
+    if data == b'false':
+        return False
+    if data == b'null':
+        return None
+    try:
+        return int(data)
+    except ValueError:
+        return float(data)
+
+class JsonExtractor:
+    """
+    Incremental JSON parser extracting only the requested scalar fields.
+    Memory usage is bounded by buffer_size, max_length and the nesting depth.
+    """
+    def __init__(self, record_path: str, fields: dict, top_fields: dict = None,
+                 buffer_size: int = 256, max_length: int = 64, max_records: int = 50):
+        """
+        Args:
+            record_path (str): Path of the objects collected as records (e.g. 'items[]', '[]').
+            fields (dict): Dotted field path relative to the record -> output key.
+            top_fields (dict): Dotted field path relative to the root -> output key.
+            buffer_size (int): Size of the socket read buffer.
+            max_length (int): Captured strings are truncated to this size in bytes.
+            max_records (int): Records after this count are ignored.
+        """
+        self._record_path = _split_path(record_path)
+        self._fields = {_split_path(k): v for k, v in fields.items()}
+        self._top_fields = {_split_path(k): v for k, v in (top_fields or {}).items()}
+        # Cheap filter before building the path tuple
+        self._leaves = set(p[-1] for p in self._fields)
+        self._leaves.update(p[-1] for p in self._top_fields)
+        self._buffer = bytearray(buffer_size)
+        self._capture = bytearray(max_length)
+        self._max_records = max_records
+        self.reset()
+
+    def reset(self):
+        self._state = _S_VALUE
+        self._path = []             # Segments of current position
+        self._expect_key = False    # Next string is an object key
+        self._is_key = False        # Current string is an object key
+        self._target = None         # Output key of current scalar (None: skipped)
+        self._capture_len = 0
+        self._unicode = 0
+        self._unicode_len = 0
+        self._high = 0              # Pending high surrogate of \uXXXX\uXXXX (0: None)
+        self._record = None
+        self._record_base = 0
+        self._records = []
+        self._top = {}
+
+    def result(self):
+        return self._records, self._top
+
+    def parse(self, stream):
+        """Reads the stream (readinto) until EOF and returns (records, top)."""
+        self.reset()
+        buf = self._buffer
+        while True:
+            n = stream.readinto(buf)
+            if not n:
+                break
+            self.feed(buf, n)
+        return self.result()
+
+    async def parse_async(self, stream):
+        """Same as parse(), for the stream with coroutine readinto."""
+        self.reset()
+        buf = self._buffer
+        while True:
+            n = await stream.readinto(buf)
+            if not n:
+                break
+            self.feed(buf, n)
+        return self.result()
+
+    def feed(self, data, n: int = -1):
+        """Processes the first n bytes of data."""
+        if n < 0:
+            n = len(data)
+        i = 0
+        while i < n:
+            c = data[i]
+            i += 1
+            state = self._state
+
+            if state == _S_STRING:
+                if c == 0x22: # "
+                    self._end_string()
+                elif c == 0x5C: # \\
+                    self._state = _S_ESCAPE
+                elif self._target is not None:
+                    if self._high:
+                        self._append_code(0x3F) # Unpaired high surrogate
+                    self._append(c)
+
+            elif state == _S_VALUE:
+                if c in b' \t\r\n,':
+                    if c == 0x2C and self._path and self._path[-1] != _ARRAY: # , in object
+                        self._expect_key = True
+                elif c == 0x22: # "
+                    self._start_string()
+                elif c == 0x3A: # :
+                    self._expect_key = False
+                elif c == 0x7B: # {
+                    self._start_object()
+                elif c == 0x5B: # [
+                    self._path.append(_ARRAY)
+                    self._expect_key = False
+                elif c == 0x7D or c == 0x5D: # } or ]
+                    self._end_container()
+                else:
+                    self._target = self._lookup()
+                    self._capture_len = 0
+                    self._append(c)
+                    self._state = _S_LITERAL
+
+            elif state == _S_LITERAL:
+                if c in b' \t\r\n,}]':
+                    if self._target is not None:
+                        self._emit(_literal(bytes(self._capture[:self._capture_len])))
+                    self._state = _S_VALUE
+                    i -= 1 # Reprocess delimiter
+                else:
+                    self._append(c)
+
+            elif state == _S_ESCAPE:
+                self._state = _S_STRING
+                if c == 0x75: # u
+                    self._unicode = 0
+                    self._unicode_len = 0
+                    self._state = _S_UNICODE
+                elif self._target is not None:
+                    if self._high:
+                        self._append_code(0x3F) # Unpaired high surrogate
+                    self._append(_ESCAPES.get(c, c))
+
+            else: # _S_UNICODE
+                self._unicode = (self._unicode << 4) | int(chr(c), 16)
+                self._unicode_len += 1
+                if self._unicode_len == 4:
+                    self._state = _S_STRING
+                    if self._target is not None:
+                        code = self._unicode
+                        high = self._high
+                        if 0xD800 <= code < 0xDC00: # High surrogate, combined with the next escape
+                            if high:
+                                self._append_code(0x3F)
+                            self._high = code
+                            continue
+                        if high:
+                            self._high = 0
+                            if code < 0xDC00 or code >= 0xE000:
+                                self._append_code(0x3F) # Unpaired high surrogate
+                            else:
+                                code = 0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)
+                        if 0xDC00 <= code < 0xE000: # Unpaired low surrogate
+                            code = 0x3F # ?
+                        self._append_code(code)
+
+    def _append_code(self, code: int):
+        # Unicode code point as UTF-8
+        self._high = 0
+        for b in chr(code).encode('utf-8'):
+            self._append(b)
+
+    def _append(self, c: int):
+        if self._capture_len < len(self._capture):
+            self._capture[self._capture_len] = c
+            self._capture_len += 1
+
+    def _lookup(self):
+        path = self._path
+        if not path or path[-1] not in self._leaves:
+            return None
+        if self._record is not None:
+            return self._fields.get(tuple(path[self._record_base:]))
+        return self._top_fields.get(tuple(path))
+
+    def _emit(self, value):
+        if self._record is not None:
+            self._record[self._target] = value
+        else:
+            self._top[self._target] = value
+
+    def _start_string(self):
+        self._state = _S_STRING
+        self._capture_len = 0
+        self._is_key = self._expect_key
+        # Keys are always captured to track the path
+        self._target = True if self._is_key else self._lookup()
+
+    def _end_string(self):
+        self._state = _S_VALUE
+        if self._high:
+            self._append_code(0x3F) # Unpaired high surrogate
+        if self._is_key:
+            self._path[-1] = bytes(self._capture[:self._capture_len])
+            self._is_key = False
+            self._expect_key = False
+        elif self._target is not None:
+            self._emit(_decode(bytes(self._capture[:self._capture_len])))
+        self._target = None
+
+    def _start_object(self):
+        if self._record is None and tuple(self._path) == self._record_path:
+            if len(self._records) < self._max_records:
+                self._record = {}
+                self._record_base = len(self._path)
+        self._path.append(None) # Replaced by the key
+        self._expect_key = True
+
+    def _end_container(self):
+        if not self._path:
+            return
+        self._path.pop()
+        self._expect_key = False
+        if self._record is not None and len(self._path) == self._record_base:
+            self._records.append(self._record)
+            self._record = None
@@ -1,12 +1,86 @@
-from machine import freq, Pin
+from machine import lightsleep, Pin
 from micropython import const
-import time, ntptime, struct
-import requests
+import time, asyncio
 import boot
 from fsm import *
 from spwm import *
+from sequencer import Sequencer
+from jsonstream import JsonExtractor
+from session import Session
+from quota import QuotaBudget
+from delay import DelayModel
+from wallclock import WallClock
+from metrics import Metrics
+from status import StatusServer
+from governor import Governor
+
+# Log levels. 0: Disabled, the guarded log calls are removed at compile time (const),
+# so messages are not even formatted on the polling path.
+LOG_ERROR = const(1)
+LOG_INFO = const(0)
+LOG_DEBUG = const(0)
+
+def _days_from_civil(year: int, month: int, day: int) -> int:
+    # Days since 1970-01-01 of the proleptic Gregorian date
+    if month <= 2:
+        year -= 1
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    return era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+
+# Epoch of time.time() differs by port (1970 or 2000)
+_EPOCH_DAYS = _days_from_civil(*time.gmtime(0)[:3])
 
 class Datetime:
+    clock = None # WallClock, set by init(). time.time() (RTC) until then.
+
+    @staticmethod
+    def now() -> int:
+        """Current UTC seconds, drift-corrected."""
+        if Datetime.clock is None:
+            return time.time()
+        return Datetime.clock.now()
+
+    @staticmethod
+    def parse(datetime_str: str) -> int:
+        """
+        Args:
+            datetime_str (str): ISO 8601 datetime string "YYYY-MM-DDTHH:MM:SS",
+                followed by optional fraction and "Z", "+HH:MM", "+HHMM" or "+HH". UTC without suffix.
+        Returns:
+            int: Seconds since the epoch of time.time(). Fraction is truncated.
+        Raises:
+            ValueError: Malformed string.
+        """
+        s = datetime_str
+        if len(s) < 19 or s[4] != '-' or s[7] != '-' or s[13] != ':' or s[16] != ':':
+            raise ValueError(s)
+        days = _days_from_civil(int(s[0:4]), int(s[5:7]), int(s[8:10])) - _EPOCH_DAYS
+        seconds = ((days * 24 + int(s[11:13])) * 60 + int(s[14:16])) * 60 + int(s[17:19])
+
+        i = 19
+        n = len(s)
+        if i < n and (s[i] == '.' or s[i] == ','):
+            i += 1
+            while i < n and '0' <= s[i] <= '9':
+                i += 1
+        if i == n or s[i] == 'Z' or s[i] == 'z':
+            return seconds
+        if s[i] != '+' and s[i] != '-':
+            raise ValueError(s)
+        offset = s[i + 1:]
+        if len(offset) == 2:
+            offset = int(offset) * 60
+        elif len(offset) == 4:
+            offset = int(offset[0:2]) * 60 + int(offset[2:4])
+        elif len(offset) == 5 and offset[2] == ':':
+            offset = int(offset[0:2]) * 60 + int(offset[3:5])
+        else:
+            raise ValueError(s)
+        # Local time = UTC + offset
+        return seconds - offset * 60 if s[i] == '+' else seconds + offset * 60
+
     @staticmethod
     def diff_from_now_in_seconds(datetime_str: str) -> int:
         """
@@ -15,66 +89,78 @@ class Datetime:
         Returns:
             int: The difference in seconds (positive if the time is in the future).
         """
-        # Parse the ISO 8601 string manually
-        year = int(datetime_str[0:4])
-        month = int(datetime_str[5:7])
-        day = int(datetime_str[8:10])
-        hour = int(datetime_str[11:13])
-        minute = int(datetime_str[14:16])
-        second = int(datetime_str[17:19])
-        
-        # mktime tuple: (year, month, mday, hour, minute, second, weekday, yearday)
-        # We set weekday and yearday to -1 to let mktime calculate them.
-        parsed_time_tuple = (year, month, day, hour, minute, second, -1, -1)
-        
-        parsed_seconds = time.mktime(parsed_time_tuple)
-        
-        # Get current time in seconds since the epoch (UTC)
-        current_seconds = time.time()
-        
-        return int(parsed_seconds - current_seconds)
+        return Datetime.parse(datetime_str) - Datetime.now()
 
     @staticmethod
-    def diff(datetime_str: str) -> int:
-        return Datetime.diff_from_now_in_seconds(datetime_str)
+    def diff(epoch: int) -> int:
+        """Seconds from now to the parsed time (positive if the time is in the future)."""
+        return epoch - Datetime.now()
 
     @staticmethod
-    def diff_minute(datetime_str: str) -> int:
-        return int(Datetime.diff(datetime_str) / 60)
+    def diff_minute(epoch: int) -> int:
+        return int(Datetime.diff(epoch) / 60)
 
     @staticmethod
-    def diff_hour(datetime_str: str) -> int:
-        return int(Datetime.diff(datetime_str) / 3600)
+    def diff_hour(epoch: int) -> int:
+        return int(Datetime.diff(epoch) / 3600)
+
+HEARTBEAT_MS = const(500) # LED toggle interval: blinks at 1 Hz
+
+class Heartbeat:
+    """
+    Status LED blinking at 1 Hz while the firmware runs.
+      'wakeup': Toggled by the main loop, which wakes up every HEARTBEAT_MS for it.
+      'off': Always off. The main loop only wakes up when something is due.
+    Not driven by LEDC: 1 Hz needs a slow LEDC clock source, and every LEDC timer of ESP32-S2 shares
+    the clock source with the 80 MHz SPWM carrier.
+    """
+    def __init__(self, pin: int, mode: str = 'wakeup'):
+        self._pin = Pin(pin, Pin.OUT)
+        self._pin.off()
+        self.mode = mode
+
+    def toggle(self):
+        """Called on every wakeup of the main loop."""
+        if self.mode == 'wakeup':
+            self._pin.value(not self._pin.value())
+
+    def wait_ms(self, ms: int) -> int:
+        """ms, shortened to the next toggle if the main loop blinks the LED."""
+        return min(ms, HEARTBEAT_MS) if self.mode == 'wakeup' else ms
 
 class Desklight:
     def __init__(self, light_pin:int, spwm_pin:int, trigger_pin:int, amp_pin:int):
         self._light = Pin(light_pin, Pin.OUT)
         self._light.on()
-        self._spwm = SPWM(spwm_pin)
-        self._trg = Pin(trigger_pin, Pin.OUT)
-        self._trg.off()
+        self._sequencer = Sequencer(SPWM(spwm_pin), Pin(trigger_pin, Pin.OUT))
+        try:
+            self._sequencer.load('./audio.bin') # Loaded once, not read from flash while playing
+        except (OSError, ValueError):
+            pass # No audio or unsupported file, play() finishes immediately
         self._amp = Pin(amp_pin, Pin.OUT)
         self._amp.off()
+        self._callback = None
 
-    def play(self):
+    def play(self, callback=None):
+        """
+        Returns immediately, audio is played in the background.
+        The callback is called from the timer callback when finished.
+        """
+        self._callback = callback
         self._amp.on()
-        with open('./audio.bin', 'rb') as f:
-            while True:
-                data = f.read(4)
-                if not data: #EOF
-                    break
-                freq, duration = struct.unpack('<HH', data)
-                if freq == 0:
-                    self._spwm.stop()
-                    time.sleep_us(duration*1000)
-                    continue
-                self._spwm.start(freq)
-                self._trg.on()
-                time.sleep_us(1000)
-                self._trg.off()
-                time.sleep_us((duration-1)*1000)
+        self._sequencer.play(self._on_finished)
+
+    def is_playing(self) -> bool:
+        return self._sequencer.is_playing()
+
+    def jitter(self) -> dict:
+        """Note start error of the last playback."""
+        return self._sequencer.jitter()
+
+    def _on_finished(self):
         self._amp.off()
-        self._spwm.stop()
+        if self._callback is not None:
+            self._callback()
     
     def light_on(self):
         self._light.on()
@@ -82,192 +168,452 @@ class Desklight:
     def light_off(self):
         self._light.off()
 
+async def parse(parser, response, governor=None):
+    """parser.parse_async(response), with the CPU clock boosted."""
+    if governor is None:
+        return await parser.parse_async(response)
+    with governor:
+        return await parser.parse_async(response)
+
 class Holodex:
-    def __init__(self, token, channel_id):
+    def __init__(self, token, channel_ids, use_asyncio=False, governor=None):
         self._token = token
-        self._channel_id = channel_id
+        self._governor = governor
+        self._session = Session('holodex.net', use_asyncio=use_asyncio, governor=governor)
+        # Single id, comma-separated ids or list of ids
+        if isinstance(channel_ids, str):
+            channel_ids = channel_ids.split(',')
+        self._channel_ids = [c.strip() for c in channel_ids if c.strip()]
+        # Only the fields used by FSM are picked from the response
+        self._parser = JsonExtractor('[]', {
+            'id': 'id',
+            'title': 'title',
+            'status': 'status',
+            'start_scheduled': 'start_scheduled',
+            'start_actual': 'start_actual',
+            'channel.id': 'channel_id',
+            'channel_id': 'channel_id',
+        })
+
+    @property
+    def channel_ids(self):
+        return self._channel_ids
+
+    @property
+    def session(self):
+        return self._session
 
     def _get_live_url(self):
-        base = 'https://holodex.net/api/v2/live'
+        # /users/live takes a comma-separated channel list,
+        # so the call count stays constant regardless of the watch list size.
+        base = '/api/v2/users/live'
         params = []
-        params.append(f'channel_id={self._channel_id}')
-        params.append(f'status=live,upcoming')
-        params.append(f'limit=5')
-        params.append(f'order=asc')
-        params.append(f'sort=start_scheduled')
-        params.append(f'include=live_info')
+        params.append(f'channels={",".join(self._channel_ids)}')
         return base + '?' + '&'.join(params)
 
-    # Blokcing api call
-    def get_live(self):
-        response = requests.get(self._get_live_url(), headers={'X-APIKEY': self._token})
-        if response.status_code != 200:
-            return None, response.status_code
-        return response.json(), response.status_code
+    # Blokcing api call, unless the session is in asyncio mode
+    async def get_live(self):
+        response = await self._session.get(self._get_live_url(), headers={'X-APIKEY': self._token})
+        try:
+            if response.status_code != 200:
+                return None, response.status_code
+            records, _ = await parse(self._parser, response, self._governor)
+            return records, response.status_code
+        finally:
+            await response.close()
 
 class YoutubeData:
-    def __init__(self, token):
+    MAX_VIDEO_IDS = const(50) # Upper limit of id parameter in videos.list
+
+    def __init__(self, token, use_asyncio=False, governor=None):
         self._token = token
-        self._channel_id = ''
-        self._video_id = ''
+        self._governor = governor
+        self._session = Session('www.googleapis.com', use_asyncio=use_asyncio, governor=governor)
+        self._video_ids = []
         self._video_etag = ''
+        # Only the fields used by FSM are picked from the response
+        self._parser = JsonExtractor('items[]', {
+            'id': 'id',
+            'liveStreamingDetails.actualStartTime': 'actualStartTime',
+            'liveStreamingDetails.scheduledStartTime': 'scheduledStartTime',
+        }, {'etag': 'etag'})
 
-    def set_channel_id(self, channel_id):
-        self._channel_id = channel_id
+    @property
+    def session(self):
+        return self._session
 
     def set_video_id(self, video_id):
-        self._video_id = video_id
-
-    def get_video_list(self):
-        base = 'https://www.googleapis.com/youtube/v3/videos'
+        self.set_video_ids([video_id])
+
+    def set_video_ids(self, video_ids):
+        video_ids = list(video_ids)[:self.MAX_VIDEO_IDS]
+        # ETag belongs to the previous id set
+        if video_ids != self._video_ids:
+            self._video_etag = ''
+        self._video_ids = video_ids
+
+    async def get_video_list(self):
+        # Every imminent stream is polled in a single call (1 quota unit)
+        base = '/youtube/v3/videos'
         params = []
         params.append(f'part=liveStreamingDetails')
-        params.append(f'id={self._video_id}')
+        params.append(f'id={",".join(self._video_ids)}')
         params.append(f'key={self._token}')
 
         headers = {'If-None-Match': self._video_etag}
 
-        response = requests.get(base + '?' + '&'.join(params), headers=headers)
+        response = await self._session.get(base + '?' + '&'.join(params), headers=headers)
         
         # 304: Duplicated response(If-None-Match) >> Not updated
         # 404: Video ID is not valid >> Upcomming live is removed
-        if response.status_code != 200:
-            return None, response.status_code
-        result = response.json()
-        self._video_etag = result['etag']
-        return result, response.status_code
+        try:
+            if response.status_code != 200:
+                return None, response.status_code
+            items, top = await parse(self._parser, response, self._governor)
+            self._video_etag = top.get('etag', '')
+            return {'etag': self._video_etag, 'items': items}, response.status_code
+        finally:
+            await response.close()
+
+AUDIO_TXPOWER_DBM = const(2) # Wi-Fi TX power while playing in 'low_txpower' mode
 
 # Global status / data class
 class Context:
-    def __init__(self):
-        self.upcomming: dict = None # Holodex api response
-        self.on_air: dict = None # Youtube api response
+    def __init__(self, use_asyncio=False):
+        self.upcomming: dict = None # Holodex api response (most relevant one)
+        self.upcomming_table: dict = {} # Holodex api response per channel
+        self.on_air: dict = None # Youtube api response (most relevant one)
+        self.on_air_table: dict = {} # Youtube api response per video
         self.__timer = time.ticks_ms()
-        self.api = Holodex(boot.config['key_holodex'], boot.config['channelId'])
+        # CPU clock: boosted for TLS handshakes, JSON parsing and audio, lowest stable clock otherwise
+        self.governor = Governor(boot.config.get('cpu_freq_low', 80_000_000),
+                                 boot.config.get('cpu_freq_high', 240_000_000))
+        self.api = Holodex(boot.config['key_holodex'], boot.config['channelId'], use_asyncio, self.governor)
         if boot.config['enable_youtube_api']:
-            self.youtube = YoutubeData(boot.config['key_youtube'])
-            self.youtube.set_channel_id(boot.config['channelId'])
+            self.youtube = YoutubeData(boot.config['key_youtube'], use_asyncio, self.governor)
+            self.quota = QuotaBudget(boot.config.get('youtube_quota', 10000))
         else:
             self.youtube = None
+            self.quota = None
 
         self.desklight = Desklight(35, 34, 33, 12) # original
         # self.desklight = Desklight(11, 34, 33, 12) # test board
+        # Wi-Fi interference mitigation while playing audio
+        #   'keep': No change, 'low_txpower': Lower TX power, 'off': Disable Wi-Fi
+        self.audio_wifi_mode = boot.config.get('audio_wifi_mode', 'keep')
+        self.delay = DelayModel() # Learned start delay per channel
+        self.audio_flag = None # asyncio.ThreadSafeFlag set when audio is finished (asyncio mode only)
+        # Sleep between wakeups of the blocking main loop
+        #   'lightsleep': CPU and Wi-Fi modem sleep, 'idle': time.sleep_ms()
+        self.sleep_mode = boot.config.get('sleep_mode', 'lightsleep')
+        self.wakeups = 0
+        self.metrics = Metrics(('holodex', 'youtube'))
+        self.status_server = None # StatusServer, set by create_status_server()
+        self._audio_active = False
+        self._saved_txpower = None
     
-    def log(self, msg):
-        # print(f'{msg}') # for debugging
-        pass
+    def log(self, level: int, msg: str):
+        # level: LOG_ERROR, LOG_INFO or LOG_DEBUG. Guard the call with the same flag (if LOG_INFO: ...)
+        # so the message isn't even formatted when the level is disabled.
+        if level:
+            print(msg)
     
     def set_timer(self):
         self.__timer = time.ticks_ms()
     
     def get_timer(self):
         return time.ticks_diff(time.ticks_ms(), self.__timer)
+
+    def timer_deadline(self, interval_ms: int) -> int:
+        """ticks_ms when get_timer() reaches interval_ms."""
+        return time.ticks_add(self.__timer, interval_ms)
     
     def clear_timer(self):
         self.__timer = 0
 
+    def start_audio(self):
+        """Starts audio in the background with the Wi-Fi mitigation. Does nothing while a tune is playing."""
+        self.update_audio() # Releases a tune that has finished but not been restored yet
+        if self._audio_active:
+            return
+        if self.audio_wifi_mode == 'off':
+            boot.DisableWifi()
+        elif self.audio_wifi_mode == 'low_txpower':
+            self._saved_txpower = boot.GetWifiTxPower()
+            boot.SetWifiTxPower(AUDIO_TXPOWER_DBM)
+        self._audio_active = True
+        self.governor.acquire() # Headroom for the SPWM timer ISR
+        self.desklight.play(self._on_audio_finished)
+
+    def _on_audio_finished(self):
+        # Called from timer callback. Wi-Fi is restored by update_audio() in the main loop.
+        if self.audio_flag is not None:
+            self.audio_flag.set()
+
+    def update_audio(self):
+        """Restores Wi-Fi after audio is finished. Called from the main loop."""
+        if not self._audio_active or self.desklight.is_playing():
+            return
+        self._audio_active = False
+        self.governor.release()
+        if LOG_INFO:
+            jitter = self.desklight.jitter()
+            self.log(LOG_INFO, f'[Audio] Finished: {jitter["notes"]} notes, jitter avg {jitter["avg_us"]}us, max {jitter["max_us"]}us')
+        if self.audio_wifi_mode == 'off':
+            boot.EnableWifi()
+        elif self.audio_wifi_mode == 'low_txpower':
+            boot.SetWifiTxPower(self._saved_txpower)
+
 
 #### Main FSM
 
-def get_upcomming(ctx):
+def is_prior(video: dict, other: dict) -> bool:
+    """
+    Returns True if the video should be watched before the other one.
+    Live stream comes first, then the earliest scheduled one.
+    """
+    if (video['status'] == 'live') != (other['status'] == 'live'):
+        return video['status'] == 'live'
+    return video['start_scheduled'] < other['start_scheduled']
+
+def record_delay(ctx, video: dict, actual_start: int):
+    ctx.delay.record(video.get('channel_id'), video['id'], actual_start - video['start_scheduled'])
+
+def record_call(ctx, endpoint: str, session, code: int, start: int, connects: int):
+    # code 0: Exception (network related)
+    ctx.metrics.record(endpoint, code, time.ticks_diff(time.ticks_ms(), start),
+                       session.response_bytes if code else 0, session.connect_count != connects)
+
+async def get_upcomming(ctx):
+    start = time.ticks_ms()
+    connects = ctx.api.session.connect_count
     try :
-        resp, code = ctx.api.get_live()
+        resp, code = await ctx.api.get_live()
     except :
-        ctx.log(f'[Error] API call failed with exception (network related)')
+        record_call(ctx, 'holodex', ctx.api.session, 0, start, connects)
+        if LOG_ERROR:
+            ctx.log(LOG_ERROR, f'[Error] API call failed with exception (network related)')
         return None # Using cached response.
+    record_call(ctx, 'holodex', ctx.api.session, code, start, connects)
     
     # Using cached response.
     if resp is None:
-        ctx.log(f'[Error] API call failed with code {code}')
+        if LOG_ERROR:
+            ctx.log(LOG_ERROR, f'[Error] API call failed with code {code}')
         return None
     
+    # Rebuild per-channel table
+    table = {}
+    for video in resp:
+        if video.get('status') not in ('live', 'upcoming'):
+            continue
+        if not video.get('start_scheduled'):
+            continue
+        # Timestamps are parsed once here, epoch seconds in the cached record
+        try:
+            video['start_scheduled'] = Datetime.parse(video['start_scheduled'])
+            if video.get('start_actual'):
+                video['start_actual'] = Datetime.parse(video['start_actual'])
+        except ValueError:
+            continue
+        channel_id = video.get('channel_id')
+        if channel_id not in table or is_prior(video, table[channel_id]):
+            table[channel_id] = video
+    ctx.upcomming_table = table
+
+    for video in table.values():
+        if video['status'] == 'live' and video.get('start_actual'):
+            record_delay(ctx, video, video['start_actual'])
+
     # Upcomming live is removed
     # Remove cached response.
-    if len(resp) == 0:
-        ctx.log(f'[API] Upcomming is empty')
+    if len(table) == 0:
+        if LOG_INFO:
+            ctx.log(LOG_INFO, f'[API] Upcomming is empty')
         ctx.upcomming = None
         return None
-    
+
     # Update cached response
-    ctx.log(f'[API] Upcomming found: {resp[0]["title"]}, {resp[0]["start_scheduled"]}')
-    ctx.upcomming = resp[0]
+    upcomming = None
+    for video in table.values():
+        if upcomming is None or is_prior(video, upcomming):
+            upcomming = video
+    if LOG_INFO:
+        ctx.log(LOG_INFO, f'[API] Upcomming found: {upcomming.get("title")}, {upcomming["start_scheduled"]}')
+    ctx.upcomming = upcomming
     return ctx.upcomming
 
-def get_on_air(ctx):
+def youtube_interval_ms(ctx):
+    """
+    Polling interval of videos.list which fits the remaining quota today.
+    None: YouTube API is disabled or running out of quota, use Holodex-only polling.
+    """
+    if ctx.youtube is None:
+        return None
+    reset = ctx.quota.seconds_until_reset()
+    # Waits expected until the quota reset, including the current one
+    waits = 1
+    for video in ctx.upcomming_table.values():
+        if video is not ctx.upcomming and 0 < Datetime.diff(video['start_scheduled']) < reset:
+            waits += 1
+    return ctx.quota.interval_ms(waits)
+
+async def get_on_air(ctx):
+    ctx.quota.spend(1) # videos.list costs 1 unit, even if not modified
+    start = time.ticks_ms()
+    connects = ctx.youtube.session.connect_count
     try :
-        resp, code = ctx.youtube.get_video_list()
+        resp, code = await ctx.youtube.get_video_list()
     except :
-        ctx.log(f'[Error] API call failed with exception (network related)')
+        record_call(ctx, 'youtube', ctx.youtube.session, 0, start, connects)
+        if LOG_ERROR:
+            ctx.log(LOG_ERROR, f'[Error] API call failed with exception (network related)')
         return None # Using cached response.
+    record_call(ctx, 'youtube', ctx.youtube.session, code, start, connects)
     
     # Data is no updated (Still upcommnig)
     # Using cached response. 
     if code == 304 :
-        ctx.log(f'[API] Data is not updated')
+        if LOG_DEBUG:
+            ctx.log(LOG_DEBUG, f'[API] Data is not updated')
         return None
 
     # Upcomming live is removed
     # Remove cached response.
     if code == 404 :
         ctx.on_air = None
+        ctx.on_air_table = {}
         ctx.upcomming = None
-        ctx.log(f'[API] Upcomming live is removed')
+        if LOG_INFO:
+            ctx.log(LOG_INFO, f'[API] Upcomming live is removed')
         return None
 
     # Using cached response.
     if code != 200 :
-        ctx.log(f'[Error] API call failed with code {code}')
+        if LOG_ERROR:
+            ctx.log(LOG_ERROR, f'[Error] API call failed with code {code}')
+        return None
+
+    # Fan out the batched response per video.
+    # Video missing in items is removed.
+    table = {}
+    for item in resp['items']:
+        start_scheduled = item.get('scheduledStartTime', item.get('actualStartTime'))
+        if start_scheduled is None: # Not a live stream
+            continue
+        try:
+            start_scheduled = Datetime.parse(start_scheduled)
+            actual_start = Datetime.parse(item['actualStartTime']) if 'actualStartTime' in item else None
+        except ValueError:
+            continue
+        # Channel is not in the response (part=liveStreamingDetails only)
+        cached = ctx.on_air_table.get(item['id'])
+        video = {'id': item['id'], 'channel_id': cached.get('channel_id') if cached else None}
+        # Assume snippet.liveBroadcastContent 
+        #   by existence of liveStreamingDetails.actualStartTime
+        # Workaround due to large size response of snippet
+        if actual_start is not None:
+            video['status'] = 'live'
+        else:
+            video['status'] = 'upcoming'
+        video['start_scheduled'] = start_scheduled
+        table[item['id']] = video
+        if actual_start is not None:
+            record_delay(ctx, video, actual_start)
+    ctx.on_air_table = table
+
+    if len(table) == 0:
+        ctx.on_air = None
+        ctx.upcomming = None
+        if LOG_INFO:
+            ctx.log(LOG_INFO, f'[API] Upcomming live is removed')
         return None
 
     # Update cached response.
-    ctx.on_air = resp['items'][0]
-    
-    # Assume snippet.liveBroadcastContent 
-    #   by existence of liveStreamingDetails.actualStartTime
-    # Workaround due to large size response of snippet
-    if 'actualStartTime' in ctx.on_air['liveStreamingDetails']:
-        ctx.on_air['status'] = 'live'
-    else:
-        ctx.on_air['status'] = 'upcoming'
-    ctx.on_air['start_scheduled'] = ctx.on_air['liveStreamingDetails']['scheduledStartTime']
-    ctx.log(f'[API] Data updated: {ctx.on_air['status']}, {ctx.on_air['start_scheduled']}')
+    on_air = None
+    for video in table.values():
+        if on_air is None or is_prior(video, on_air):
+            on_air = video
+    ctx.on_air = on_air
+    if LOG_INFO:
+        ctx.log(LOG_INFO, f'[API] Data updated: {on_air["id"]}, {on_air["status"]}, {on_air["start_scheduled"]}')
     return ctx.on_air
 
-class IdleState(State):
-    def update(self, ctx):
-        # Every 5 minutes. Reducing API call count.
-        if ctx.get_timer() < const(5 * 60 * 1000):
+class PollingState(State):
+    INTERVAL_MS = const(1000)
+
+    def interval_ms(self, ctx) -> int:
+        """Polling interval of the state."""
+        return self.INTERVAL_MS
+
+    def deadline(self, ctx):
+        # Next poll. Nothing to do until then, the main loop sleeps.
+        return ctx.timer_deadline(self.interval_ms(ctx))
+
+class IdleState(PollingState):
+    # Every 5 minutes. Reducing API call count.
+    INTERVAL_MS = const(5 * 60 * 1000)
+
+    async def update(self, ctx):
+        if ctx.get_timer() < self.INTERVAL_MS:
             return None
         ctx.set_timer()
 
-        get_upcomming(ctx)
+        await get_upcomming(ctx)
         if ctx.upcomming is None:
             return None
 
         if ctx.upcomming['status'] == 'live':
             return OnAir
 
-        if Datetime.diff_minute(ctx.upcomming['start_scheduled']) < 10:
+        # 10 minutes before, or later if the channel rarely starts that early
+        wait_start = ctx.delay.wait_start(ctx.upcomming.get('channel_id'))
+        if Datetime.diff(ctx.upcomming['start_scheduled']) < -wait_start:
             return Waiting
         return None
 
-class Waiting(State):
+class Waiting(PollingState):
     # Waiting state must be after IdleState
+    # Every 10 seconds with Holodex. YouTube API interval is decided by the quota budget.
+    INTERVAL_MS = const(10 * 1000)
+
+    def interval_ms(self, ctx) -> int:
+        base = youtube_interval_ms(ctx)
+        if base is None:
+            base = self.INTERVAL_MS
+        # Slower in the minutes the stream rarely goes live, by the learned start delay
+        interval = None
+        for video in ctx.upcomming_table.values():
+            elapsed = -Datetime.diff(video['start_scheduled'])
+            if elapsed < -600:
+                continue
+            value = ctx.delay.interval_ms(video.get('channel_id'), elapsed, base)
+            interval = value if interval is None else min(interval, value)
+        return base if interval is None else interval
+
     def on_enter(self, ctx):
         if ctx.youtube is not None:
-            ctx.youtube.set_video_id(ctx.upcomming['id'])
-            ctx.on_air = {'status': 'upcoming', 'start_scheduled': ctx.upcomming['start_scheduled']}
-
-    def update(self, ctx):
-        # Every 10 seconds.
-        if ctx.get_timer() < const(10 * 1000):
+            # Poll every imminent stream together, not only the first one
+            table = {}
+            for video in ctx.upcomming_table.values():
+                if video is ctx.upcomming or Datetime.diff_minute(video['start_scheduled']) < 10:
+                    table[video['id']] = {'id': video['id'], 'channel_id': video.get('channel_id'),
+                                          'status': video['status'], 'start_scheduled': video['start_scheduled']}
+            ctx.youtube.set_video_ids(table.keys())
+            ctx.on_air_table = table
+            ctx.on_air = table[ctx.upcomming['id']]
+
+    async def update(self, ctx):
+        if ctx.get_timer() < self.interval_ms(ctx):
             return None
         ctx.set_timer()
         
-        api_call = get_upcomming if ctx.youtube is None else get_on_air
-        result = ctx.upcomming if ctx.youtube is None else ctx.on_air
+        # Falls back to Holodex before the quota runs out
+        use_youtube = youtube_interval_ms(ctx) is not None
+        api_call = get_on_air if use_youtube else get_upcomming
+        await api_call(ctx)
 
-        api_call(ctx)
+        result = ctx.on_air if use_youtube else ctx.upcomming
         if result is None:
             return IdleState
 
@@ -278,23 +624,23 @@ class Waiting(State):
             return IdleState
         return None
 
-class OnAir(State):
+class OnAir(PollingState):
+    # Every 5 minutes. Reducing API call count.
+    INTERVAL_MS = const(5 * 60 * 1000)
+
     def on_enter(self, ctx):
-        boot.DisableWifi()
         ctx.desklight.light_off()
-        ctx.desklight.play()
-        boot.EnableWifi()
+        ctx.start_audio() # Played in the background, polling keeps running
 
     def on_exit(self, ctx):
         ctx.desklight.light_on()
 
-    def update(self, ctx):
-        # Every 5 minutes. Reducing API call count.
-        if ctx.get_timer() < const(5 * 60 * 1000):
+    async def update(self, ctx):
+        if ctx.get_timer() < self.INTERVAL_MS:
             return None
         ctx.set_timer()
         
-        get_upcomming(ctx)
+        await get_upcomming(ctx)
         if ctx.upcomming is None:
             return IdleState
         if ctx.upcomming['status'] != 'live':
@@ -304,30 +650,176 @@ class OnAir(State):
 ####
 
 def init():
-    freq(240_000_000) # Highst clock of ESP32-S2
-    for _ in range(10):
-        try:
-            ntptime.settime()
-        except:
-            continue
-        break
+    # Resynced in the background by clock.update(), boot waits for the first sample only
+    Datetime.clock = WallClock(boot.config.get('ntp_host', 'pool.ntp.org'))
+    Datetime.clock.wait_synced(10 * 1000)
 
-def main():
-    init()
-    context = Context()
-    led = Pin(11, Pin.OUT)
-    led.off()
+state_machine = None # Running StateMachine, for the REPL: state_machine.profiler.report(),
+                     # state_machine.context.metrics.report(), state_machine.context.governor.report()
 
+def create_fsm(context):
+    global state_machine
     fsm = StateMachine(context)
+    if LOG_DEBUG:
+        fsm.log = lambda msg: context.log(LOG_DEBUG, msg)
     fsm.add_state(IdleState())
     fsm.add_state(Waiting())
     fsm.add_state(OnAir())
+    if boot.config.get('fsm_profile', False):
+        fsm.enable_profiler()
+    state_machine = fsm
+    return fsm
+
+#### Status server
+
+def video_summary(video: dict):
+    if video is None:
+        return None
+    return {'id': video['id'], 'status': video['status'],
+            'start_scheduled': video['start_scheduled'], 'channel_id': video.get('channel_id')}
+
+def status_handler(fsm, ctx):
+    """Request handler of the status server: GET /status and GET /metrics."""
+    def handler(method, path):
+        if path == '/metrics':
+            return 200, ctx.metrics.as_dict()
+        if path != '/' and path != '/status':
+            return 404, {'error': 'not found'}
+        state = fsm.current_state
+        api = {}
+        for name in ctx.metrics.endpoints:
+            stats = ctx.metrics.stats(name)
+            api[name] = {'calls': stats['calls'], 'errors': stats['errors'], 'avg_ms': stats['avg_ms']}
+        return 200, {
+            'state': state.__class__.__name__ if state is not None else None,
+            'now': Datetime.now(),
+            'next_poll_ms': fsm.time_to_deadline(None),
+            'upcomming': video_summary(ctx.upcomming),
+            'on_air': video_summary(ctx.on_air),
+            'quota_remaining': ctx.quota.remaining() if ctx.quota is not None else None,
+            'clock_synced': Datetime.clock.synced if Datetime.clock is not None else False,
+            'wakeups': ctx.wakeups,
+            'cpu': ctx.governor.stats(),
+            'api': api,
+            'mem_free': ctx.metrics.mem_free,
+            'mem_free_min': ctx.metrics.mem_free_min,
+        }
+    return handler
+
+def create_status_server(fsm, context):
+    """Starts the status server if status_port is configured. None otherwise."""
+    port = boot.config.get('status_port', 0)
+    if not port:
+        return None
+    server = StatusServer(status_handler(fsm, context), port)
+    try:
+        server.start()
+    except OSError:
+        pass # Wi-Fi is not ready, retried by update()
+    context.status_server = server
+    if LOG_INFO:
+        context.log(LOG_INFO, f'[Status] http://{boot.wlan.ifconfig()[0]}:{port}/status')
+    return server
+
+#### asyncio runtime
+# FSM (polling), heartbeat LED and audio run as independent tasks.
+# A slow API response doesn't delay the others.
+
+async def heartbeat_task(led, ctx):
+    while True:
+        led.toggle()
+        ctx.metrics.sample_memory()
+        await asyncio.sleep_ms(HEARTBEAT_MS)
+
+async def audio_task(ctx):
+    # Audio itself is played by the hardware timer.
+    # This task only restores Wi-Fi when it is finished.
+    while True:
+        await ctx.audio_flag.wait()
+        ctx.update_audio()
+
+async def fsm_task(fsm, ctx):
+    await fsm.start_async(OnAir) # For audio test run at power up.
+    while True:
+        await fsm.run_cycle_async()
+        # Wait until the poll deadline of the current state, instead of 1s ticks
+        await asyncio.sleep_ms(fsm.time_to_deadline())
+
+async def status_task(server):
+    while True:
+        await asyncio.sleep_ms(server.update())
+
+async def clock_task(clock):
+    while True:
+        await asyncio.sleep_ms(clock.update())
+
+async def main_async(led):
+    context = Context(use_asyncio=True)
+    context.audio_flag = asyncio.ThreadSafeFlag()
+    fsm = create_fsm(context)
+    server = create_status_server(fsm, context)
+
+    asyncio.create_task(heartbeat_task(led, context))
+    if server is not None:
+        asyncio.create_task(status_task(server))
+    asyncio.create_task(audio_task(context))
+    asyncio.create_task(clock_task(Datetime.clock))
+    await fsm_task(fsm, context)
+
+####
+
+MAX_SLEEP_MS = const(5 * 60 * 1000) # Longest sleep of the blocking main loop
+AUDIO_POLL_MS = const(100) # Wakeup period while audio is playing (Wi-Fi restore)
+LIGHTSLEEP_MIN_MS = const(1000) # Shorter waits are not worth the sleep/wakeup cost
+
+def step(fsm, context, led):
+    """
+    A single iteration of the blocking main loop.
+    Returns ms until the next iteration has something to do.
+    """
+    context.wakeups += 1
+    wait = Datetime.clock.update() # Non-blocking NTP resync
+    context.metrics.sample_memory()
+    fsm.run_cycle()
+    context.update_audio()
+    led.toggle()
+    wait = led.wait_ms(min(wait, fsm.time_to_deadline(MAX_SLEEP_MS, MAX_SLEEP_MS)))
+    if context.desklight.is_playing():
+        wait = min(wait, AUDIO_POLL_MS)
+    return wait
+
+def idle(context, ms):
+    """Sleeps between iterations of the blocking main loop."""
+    if context.status_server is not None:
+        # Requests are answered while waiting, so the CPU stays awake (no light sleep)
+        context.status_server.wait(max(0, ms))
+        return
+    if ms <= 0:
+        return
+    # Hardware timers of the audio don't run in light sleep
+    if context.sleep_mode != 'lightsleep' or ms < LIGHTSLEEP_MIN_MS or context.desklight.is_playing():
+        time.sleep_ms(ms)
+        return
+    lightsleep(ms)
+    # Connection may be lost while the modem is sleeping
+    if not boot.wlan.isconnected():
+        boot.EnableWifi()
+
+def main():
+    init()
+    led = Heartbeat(11, boot.config.get('heartbeat', 'wakeup'))
+
+    if boot.config.get('use_asyncio', False):
+        asyncio.run(main_async(led))
+        return
+
+    context = Context()
+    fsm = create_fsm(context)
+    create_status_server(fsm, context)
 
     fsm.start(OnAir) # For audio test run at power up. After audio playing, states fallbacks to IdleState.
     while True :
-        fsm.run_cycle()
-        led.value(not led.value())
-        time.sleep(1)
+        idle(context, step(fsm, context, led))
 
 if __name__ == '__main__' :
     main()
@@ -0,0 +1,182 @@
+# On-device Metrics
+'''
+    metrics = Metrics(('holodex', 'youtube'))
+
+    # Around an API call. code 0: Exception (network related)
+    start = time.ticks_ms()
+    ...
+    metrics.record('holodex', 200, time.ticks_diff(time.ticks_ms(), start), size=1234, reconnected=False)
+
+    # From the main loop. Cheap, doesn't allocate.
+    metrics.sample_memory()
+
+    # From the REPL
+    metrics.report()
+    metrics.stats('holodex')    # {'calls', 'errors', 'min_ms', 'avg_ms', 'max_ms', 'bytes', 'max_bytes', 'reconnects', 'codes'}
+    metrics.recent()            # [(ticks_ms, endpoint, code, ms, bytes), ...] oldest first
+'''
+
+from micropython import const
+import array, gc, time
+
+__all__ = ['Metrics']
+
+# Counted HTTP codes. 0: Exception (network related), the last slot counts the others.
+_CODES = (0, 200, 304, 400, 403, 404, 429, 500, 503)
+_OTHER = const(9)
+_SLOTS = const(10)
+_MAX_U32 = const(0xFFFFFFFF)
+
+def _zeros(typecode: str, n: int):
+    return array.array(typecode, (0 for _ in range(n)))
+
+class Metrics:
+    """
+    Per-endpoint call count, latency, response size and HTTP codes, a ring buffer of the recent calls
+    and the heap low-water mark.
+    Buffers are preallocated, recording doesn't allocate.
+    """
+    def __init__(self, endpoints: tuple, size: int = 16):
+        """
+        Args:
+            endpoints (tuple): Endpoint names.
+            size (int): Calls kept in the ring buffer.
+        """
+        self._endpoints = tuple(endpoints)
+        n = len(self._endpoints)
+        self._calls = _zeros('I', n)
+        self._errors = _zeros('I', n)           # Not 200/304
+        self._min_ms = array.array('I', (_MAX_U32 for _ in range(n)))
+        self._max_ms = _zeros('I', n)
+        self._total_ms = _zeros('I', n)
+        self._bytes = _zeros('I', n)            # Response body
+        self._max_bytes = _zeros('I', n)
+        self._reconnects = _zeros('I', n)
+        self._codes = _zeros('I', n * _SLOTS)
+
+        self._size = size
+        self._ticks = _zeros('I', size)         # ticks_ms
+        self._endpoint = bytearray(size)
+        self._code = _zeros('H', size)
+        self._ms = _zeros('I', size)
+        self._size_bytes = _zeros('I', size)
+        self._pos = 0
+        self._count = 0
+
+        self.mem_free = 0
+        self.mem_free_min = _MAX_U32            # Heap low-water mark since boot
+        self.sample_memory()
+
+    @property
+    def endpoints(self) -> tuple:
+        return self._endpoints
+
+    def record(self, endpoint: str, code: int, ms: int, size: int = 0, reconnected: bool = False):
+        """
+        Args:
+            endpoint (str): One of the endpoints.
+            code (int): HTTP status code. 0: Exception (network related).
+            ms (int): Latency, until the body is read.
+            size (int): Response body bytes.
+            reconnected (bool): A new connection was made for the call.
+        """
+        index = self._endpoints.index(endpoint)
+        ms = max(0, ms)
+        self._calls[index] += 1
+        if code != 200 and code != 304:
+            self._errors[index] += 1
+        if ms < self._min_ms[index]:
+            self._min_ms[index] = ms
+        if ms > self._max_ms[index]:
+            self._max_ms[index] = ms
+        self._total_ms[index] += ms
+        self._bytes[index] += size
+        if size > self._max_bytes[index]:
+            self._max_bytes[index] = size
+        if reconnected:
+            self._reconnects[index] += 1
+        slot = _OTHER
+        for i in range(len(_CODES)):
+            if _CODES[i] == code:
+                slot = i
+                break
+        self._codes[index * _SLOTS + slot] += 1
+
+        pos = self._pos
+        self._ticks[pos] = time.ticks_ms()
+        self._endpoint[pos] = index
+        self._code[pos] = code
+        self._ms[pos] = ms
+        self._size_bytes[pos] = size
+        self._pos = (pos + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+
+    def sample_memory(self) -> int:
+        """Updates the heap low-water mark. Returns the free heap bytes."""
+        free = gc.mem_free()
+        self.mem_free = free
+        if free < self.mem_free_min:
+            self.mem_free_min = free
+        return free
+
+    def reset(self):
+        for buf in (self._calls, self._errors, self._max_ms, self._total_ms, self._bytes,
+                    self._max_bytes, self._reconnects, self._codes):
+            for i in range(len(buf)):
+                buf[i] = 0
+        for i in range(len(self._min_ms)):
+            self._min_ms[i] = _MAX_U32
+        self._pos = 0
+        self._count = 0
+        self.mem_free_min = _MAX_U32
+        self.sample_memory()
+
+    def stats(self, endpoint: str) -> dict:
+        """Totals of the endpoint. Latency in ms, sizes in bytes, codes as {code: count} ('other' for the rest)."""
+        index = self._endpoints.index(endpoint)
+        calls = self._calls[index]
+        codes = {}
+        for slot in range(_SLOTS):
+            count = self._codes[index * _SLOTS + slot]
+            if count:
+                codes[_CODES[slot] if slot < _OTHER else 'other'] = count
+        return {
+            'calls': calls,
+            'errors': self._errors[index],
+            'min_ms': self._min_ms[index] if calls else 0,
+            'avg_ms': self._total_ms[index] // calls if calls else 0,
+            'max_ms': self._max_ms[index],
+            'bytes': self._bytes[index],
+            'max_bytes': self._max_bytes[index],
+            'reconnects': self._reconnects[index],
+            'codes': codes,
+        }
+
+    def recent(self) -> list:
+        """[(ticks_ms, endpoint, code, ms, bytes), ...] oldest first."""
+        result = []
+        for i in range(self._count):
+            pos = (self._pos - self._count + i) % self._size
+            result.append((self._ticks[pos], self._endpoints[self._endpoint[pos]], self._code[pos],
+                           self._ms[pos], self._size_bytes[pos]))
+        return result
+
+    def as_dict(self) -> dict:
+        """Every statistic, e.g. to be served as JSON."""
+        return {
+            'endpoints': {name: self.stats(name) for name in self._endpoints},
+            'mem_free': self.mem_free,
+            'mem_free_min': self.mem_free_min,
+        }
+
+    def report(self):
+        """Prints the statistics and the recent calls."""
+        now = time.ticks_ms()
+        for name in self._endpoints:
+            s = self.stats(name)
+            print(f"{name}: {s['calls']} calls, {s['errors']} errors, {s['reconnects']} reconnects, "
+                  f"{s['min_ms']}/{s['avg_ms']}/{s['max_ms']} ms, max {s['max_bytes']} bytes")
+            print('  ' + ' '.join(f'{code}:{count}' for code, count in s['codes'].items()))
+        print(f'heap: {self.mem_free} bytes free, low-water {self.mem_free_min}')
+        for ticks, name, code, ms, size in self.recent():
+            print(f'{time.ticks_diff(now, ticks):>10} ms ago  {name} {code}  {ms} ms  {size} bytes')
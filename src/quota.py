@@ -0,0 +1,131 @@
+# YouTube Data API Quota Budget
+'''
+    quota = QuotaBudget(daily_limit=10000)
+
+    # Fastest polling interval which fits the remaining budget today.
+    # None: Budget is running out, fall back to Holodex-only polling.
+    interval = quota.interval_ms(expected_waits=2)
+    if interval is not None:
+        quota.spend(1) # videos.list = 1 unit
+        ...
+'''
+
+from micropython import const
+import json, time
+
+__all__ = ['QuotaBudget', 'pacific_offset', 'pacific_day']
+
+_DAY = const(24 * 60 * 60)
+
+def _sunday_on_or_after(year: int, month: int, day: int) -> int:
+    weekday = time.gmtime(time.mktime((year, month, day, 0, 0, 0, 0, 0)))[6] # 0: Monday
+    return day + (6 - weekday) % 7
+
+def pacific_offset(utc_seconds: int) -> int:
+    """UTC offset of US Pacific time in seconds. PST: -8h, PDT: -7h."""
+    year = time.gmtime(utc_seconds)[0]
+    # 2:00 local time of the second Sunday in March ~ the first Sunday in November
+    dst_start = time.mktime((year, 3, _sunday_on_or_after(year, 3, 8), 10, 0, 0, 0, 0))
+    dst_end = time.mktime((year, 11, _sunday_on_or_after(year, 11, 1), 9, 0, 0, 0, 0))
+    if dst_start <= utc_seconds < dst_end:
+        return -7 * 3600
+    return -8 * 3600
+
+def pacific_day(utc_seconds: int) -> int:
+    """Date in US Pacific time as YYYYMMDD. YouTube quota is reset at its midnight."""
+    t = time.gmtime(utc_seconds + pacific_offset(utc_seconds))
+    return t[0] * 10000 + t[1] * 100 + t[2]
+
+class QuotaBudget:
+    """
+    Tracks YouTube Data API units spent per Pacific-time day.
+    The count is persisted, so it survives reboots.
+    """
+    def __init__(self, daily_limit: int = 10000, path: str = './quota.json',
+                 reserve: int = 500, min_interval_ms: int = 10 * 1000, max_interval_ms: int = 60 * 1000,
+                 wait_seconds: int = 20 * 60, save_every: int = 10):
+        """
+        Args:
+            daily_limit (int): Daily quota of the API key.
+            path (str): File to persist the count.
+            reserve (int): Units never spent by polling (manual use, miscount margin).
+            min_interval_ms (int): Fastest polling interval.
+            max_interval_ms (int): Polling slower than this is useless, Holodex is used instead.
+            wait_seconds (int): Expected polling duration of a single wait (early + late start).
+            save_every (int): Flash is written once per this units.
+                Unsaved units are assumed spent after reboot.
+        """
+        self._limit = daily_limit
+        self._path = path
+        self._reserve = reserve
+        self._min_interval_ms = min_interval_ms
+        self._max_interval_ms = max_interval_ms
+        self._wait_seconds = wait_seconds
+        self._save_every = save_every
+        self._day = 0
+        self._used = 0
+        self._saved = 0
+        self._load()
+
+    @property
+    def used(self) -> int:
+        self._roll()
+        return self._used
+
+    def remaining(self) -> int:
+        """Units available for polling today."""
+        self._roll()
+        return max(0, self._limit - self._reserve - self._used)
+
+    def seconds_until_reset(self) -> int:
+        now = time.time()
+        return _DAY - (now + pacific_offset(now)) % _DAY
+
+    def spend(self, units: int = 1):
+        self._roll()
+        self._used += units
+        if self._used - self._saved >= self._save_every:
+            self._save()
+
+    def interval_ms(self, expected_waits: int = 1):
+        """
+        Returns the fastest polling interval which fits the remaining budget
+        for the expected number of waits today, or None if it doesn't fit at all.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            return None
+        polls = remaining // max(1, expected_waits)
+        if polls <= 0:
+            return None
+        interval = self._wait_seconds * 1000 // polls
+        if interval > self._max_interval_ms:
+            return None
+        return max(self._min_interval_ms, interval)
+
+    def _roll(self):
+        day = pacific_day(time.time())
+        if day != self._day:
+            self._day = day
+            self._used = 0
+            self._save()
+
+    def _load(self):
+        try:
+            with open(self._path) as f:
+                data = json.loads(f.read())
+            self._day = data['day']
+            # Units spent after the last save are unknown
+            self._used = data['used'] + self._save_every
+            self._saved = self._used
+        except (OSError, ValueError, KeyError):
+            pass
+        self._roll()
+
+    def _save(self):
+        try:
+            with open(self._path, 'w') as f:
+                f.write(json.dumps({'day': self._day, 'used': self._used}))
+            self._saved = self._used
+        except OSError:
+            pass
@@ -0,0 +1,261 @@
+# Background Audio Sequencer
+'''
+    sequencer = Sequencer(SPWM(34), Pin(33, Pin.OUT))
+    sequencer.load('./audio.bin') # Once at startup. Compact format (see below) or legacy '<HH' pairs.
+
+    # Returns immediately. Notes are stepped by a hardware timer in the background.
+    # The callback is called from the timer callback when the tune is finished.
+    sequencer.play(callback=lambda: print('done'))
+
+    while sequencer.is_playing():
+        ...
+
+    # Measured note start error against the absolute timeline
+    print(sequencer.jitter())   # {'notes': 120, 'avg_us': 35, 'max_us': 210}
+    sequencer.jitter_table      # array('i') of per-note error [us]
+
+Compact audio format (written by tool/midi_converter.py), little-endian:
+
+    header      '<4sBBH'   b'LMPA', version 1, duration table size (0-15), event count
+    durations   '<H' * table size
+    events      1 byte each, hi = byte >> 4, lo = byte & 0x0F
+        hi 1-15         Note: previous note + (hi - 8) semitones
+        hi 0, lo 0-14   Rest
+        hi 0, lo 15     Literal: next byte is the MIDI note (0: rest), duration is a varint
+        lo 0-14         Duration: durations[lo] ms (literals excepted)
+        lo 15           Duration: varint follows (7 bits per byte, low bits first) [ms]
+    Durations are up to 60000 ms, longer rests are split into several events.
+'''
+
+from machine import Timer
+from micropython import const
+import array, os, time
+from spwm import SPWM
+
+__all__ = ['Sequencer']
+
+_TRIGGER_US = const(1000)   # Width of trigger pulse at the start of each note
+_SPIN_US = const(1500)      # Timer fires this much early, the rest is busy-waited
+
+_MAGIC = b'LMPA'
+_VERSION = const(1)
+_HEADER_SIZE = const(8)
+_VARINT = const(15)         # lo: duration follows as a varint. hi 0: literal event
+_MAX_DURATION_MS = const(60000) # ticks_add() is valid up to half the ticks_us period (~536 s)
+
+def _note_hz(note: int) -> int:
+    return int(440 * 2 ** ((note - 69) / 12) + 0.5) if note else 0
+
+class Sequencer:
+    """
+    Plays a tune (list of frequency[Hz], duration[ms]) with a one-shot hardware timer.
+    The main loop and the network stack keep running while playing.
+    Every note is scheduled against an absolute ticks_us timeline,
+    so timer latency and callback overhead don't accumulate as tempo drift.
+    The compact format is kept in memory as is and decoded one note at a time, without allocation.
+    """
+    def __init__(self, spwm: SPWM, trigger):
+        self._spwm = spwm
+        self._trg = trigger
+        self._trg.off()
+        # Shares the hardware timer pool with SPWM
+        self._timer = Timer(SPWM._allocate_id())
+        self._data = bytearray()        # Events of the compact format
+        self._notes = None              # Legacy format: array('H') of freq, duration, freq, duration, ...
+        self._durations = array.array('H')
+        self._hz = array.array('H', (_note_hz(note) for note in range(128)))
+        self._count = 0                 # Notes and rests
+        self.jitter_table = array.array('i')
+        self._index = 0                 # Played notes and rests
+        self._pos = 0                   # Decoder position in _data
+        self._pitch = 0                 # Previous MIDI note
+        self._freq = 0                  # Decoded note
+        self._duration = 0
+        self._deadline = 0              # ticks_us of the next event
+        self._note_end = 0              # ticks_us of the end of current note
+        self._callback = None
+        self._playing = False
+        # Bound methods are created once, not in every timer callback
+        self._next_note_cb = self._next_note
+        self._trigger_off_cb = self._trigger_off
+        self._on_timer_cb = self._on_timer
+        self._step = self._next_note_cb # Event at the deadline
+
+    def load(self, path: str):
+        """Loads the tune (compact format, or legacy '<HH' pairs) into memory."""
+        self.stop()
+        size = os.stat(path)[6]
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER_SIZE)
+            if len(header) == _HEADER_SIZE and header[:4] == _MAGIC:
+                if header[4] != _VERSION:
+                    raise ValueError('unsupported audio version')
+                table = header[5]
+                self._count = header[6] | header[7] << 8
+                self._durations = array.array('H', (0 for _ in range(table)))
+                f.readinto(self._durations)
+                # Preallocated once, the file is read directly into it
+                self._data = bytearray(size - _HEADER_SIZE - 2 * table)
+                f.readinto(self._data)
+                self._notes = None
+            else:
+                # '<HH' is little-endian, same as the device.
+                f.seek(0)
+                self._count = size // 4
+                self._notes = array.array('H', (0 for _ in range(self._count * 2)))
+                f.readinto(self._notes)
+                self._data = bytearray()
+        self.jitter_table = array.array('i', (0 for _ in range(self._count)))
+
+    def note_count(self) -> int:
+        return self._count
+
+    def is_playing(self) -> bool:
+        return self._playing
+
+    def jitter(self) -> dict:
+        """Summary of the note start error of the last playback."""
+        count = min(self._index, len(self.jitter_table))
+        total = 0
+        peak = 0
+        for i in range(count):
+            value = abs(self.jitter_table[i])
+            total += value
+            peak = max(peak, value)
+        return {'notes': count, 'avg_us': total // count if count else 0, 'max_us': peak}
+
+    def play(self, callback=None):
+        """Starts playing in the background. The previous playback is stopped."""
+        self.stop()
+        self._callback = callback
+        self._index = 0
+        self._pos = 0
+        self._pitch = 0
+        self._playing = True
+        self._deadline = time.ticks_us()
+        self._run(self._next_note_cb)
+
+    def stop(self):
+        """Stops playing without calling the callback."""
+        self._timer.deinit()
+        self._spwm.stop()
+        self._trg.off()
+        self._playing = False
+
+    def _finish(self):
+        callback = self._callback
+        self._callback = None
+        self.stop()
+        if callback is not None:
+            callback()
+
+    def _on_timer(self, _timer):
+        self._run(self._step)
+
+    def _run(self, step):
+        """
+        Runs events until the next one is far enough to arm the timer.
+        Events closer than _SPIN_US (e.g. trigger off, very short notes) are run in this loop,
+        not by nested calls, so a run of short notes doesn't grow the stack.
+        """
+        while step():
+            step = self._step
+            # Timer resolution is 1 ms. Fire a bit early and spin until the deadline.
+            remaining = time.ticks_diff(self._deadline, time.ticks_us())
+            if remaining > _SPIN_US:
+                self._timer.init(mode=Timer.ONE_SHOT, period=(remaining - _SPIN_US) // 1000 + 1, callback=self._on_timer_cb)
+                return
+
+    def _wait_deadline(self) -> int:
+        """Busy-waits until the deadline. Returns the error in us (positive: late)."""
+        while True:
+            error = time.ticks_diff(time.ticks_us(), self._deadline)
+            if error >= 0:
+                return error
+
+    def _decode(self) -> bool:
+        """Decodes the next note into _freq and _duration. False at the end of the tune."""
+        notes = self._notes
+        if notes is not None:
+            i = self._index << 1
+            if i >= len(notes):
+                return False
+            self._freq = notes[i]
+            self._duration = notes[i + 1]
+            return True
+        data = self._data
+        pos = self._pos
+        end = len(data)
+        if pos >= end or self._index >= self._count:
+            return False
+        byte = data[pos]
+        pos += 1
+        hi = byte >> 4
+        lo = byte & 0x0F
+        if hi:
+            pitch = self._pitch + hi - 8
+            self._pitch = pitch
+        elif lo == _VARINT:
+            if pos >= end:
+                return False # Truncated file
+            pitch = data[pos]
+            pos += 1
+            if pitch:
+                self._pitch = pitch
+        else:
+            pitch = 0
+        if lo == _VARINT:
+            duration = 0
+            shift = 0
+            while True:
+                if pos >= end:
+                    return False # Truncated file
+                byte = data[pos]
+                pos += 1
+                duration |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+        else:
+            duration = self._durations[lo]
+        if duration > _MAX_DURATION_MS:
+            return False # Not written by the converter: the tune ends here
+        self._freq = self._hz[pitch & 0x7F]
+        self._duration = duration
+        self._pos = pos
+        return True
+
+    def _next_note(self) -> bool:
+        """Starts the next note at the deadline. Sets the next event, False at the end of the tune."""
+        if not self._decode(): #EOF
+            self._finish()
+            return False
+        error = self._wait_deadline()
+        freq = self._freq
+        duration = self._duration
+        self.jitter_table[self._index] = error
+        self._index += 1
+
+        start = self._deadline
+        self._deadline = time.ticks_add(start, duration * 1000)
+        self._step = self._next_note_cb
+        if freq == 0:
+            self._spwm.stop()
+            return True
+        self._spwm.start(freq)
+        self._trg.on()
+        if duration * 1000 <= _TRIGGER_US:
+            self._trg.off()
+            return True
+        # Trigger off at start + 1 ms, next note at the note deadline
+        self._note_end = self._deadline
+        self._deadline = time.ticks_add(start, _TRIGGER_US)
+        self._step = self._trigger_off_cb
+        return True
+
+    def _trigger_off(self) -> bool:
+        self._wait_deadline()
+        self._trg.off()
+        self._deadline = self._note_end
+        self._step = self._next_note_cb
+        return True
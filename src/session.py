@@ -0,0 +1,297 @@
+# Persistent HTTPS Session (HTTP/1.1 keep-alive)
+'''
+    # One session (= one socket) per host, kept alive across polls.
+    session = Session('holodex.net')
+
+    # All methods are coroutines.
+    # Blocking mode (default): Coroutines never suspend, StateMachine.run_cycle() completes them.
+    # asyncio mode (use_asyncio=True): Other tasks run while waiting for the network.
+    response = await session.get('/api/v2/users/live?channels=...', headers={'X-APIKEY': key})
+    response.status_code            # 200
+    await response.readinto(buf)    # Reads the body only (Content-Length / chunked)
+    await response.close()          # Drains the rest of the body, socket is kept open
+
+    # DNS + TCP + TLS handshake time vs request (time to first byte) time
+    print(session.stats())
+
+    # CPU clock is boosted during the TLS handshake
+    session = Session('holodex.net', governor=Governor())
+'''
+
+import socket, ssl, time
+
+__all__ = ['Session', 'Response']
+
+class _SocketStream:
+    """Blocking socket transport. Coroutines complete without suspending."""
+    def __init__(self, sock):
+        self._sock = sock
+
+    async def readline(self) -> bytes:
+        return self._sock.readline()
+
+    async def readinto(self, buf) -> int:
+        return self._sock.readinto(buf)
+
+    async def write(self, data):
+        self._sock.write(data)
+
+    def close(self):
+        self._sock.close()
+
+class _AsyncStream:
+    """asyncio stream transport. Every read and write is bounded by the timeout."""
+    def __init__(self, stream, timeout: int):
+        self._stream = stream
+        self._timeout = timeout
+
+    async def readline(self) -> bytes:
+        import asyncio
+        return await asyncio.wait_for(self._stream.readline(), self._timeout)
+
+    async def readinto(self, buf) -> int:
+        import asyncio
+        return await asyncio.wait_for(self._stream.readinto(buf), self._timeout)
+
+    async def write(self, data):
+        import asyncio
+        self._stream.write(data)
+        await asyncio.wait_for(self._stream.drain(), self._timeout)
+
+    def close(self):
+        self._stream.close()
+
+class Response:
+    """
+    Body reader of a single response.
+    Reads never go beyond the end of the body, so the socket can be reused.
+    """
+    def __init__(self, session, stream, status_code: int, headers: dict, has_body: bool):
+        self._session = session
+        self._stream = stream
+        self.status_code = status_code
+        self.headers = headers
+        self._chunked = 'chunked' in headers.get('transfer-encoding', '')
+        self._remaining = -1 # Remaining bytes (-1: until connection close)
+        self._eof = not has_body
+        if not self._eof and not self._chunked:
+            length = headers.get('content-length')
+            if length is not None:
+                self._remaining = int(length)
+                self._eof = self._remaining == 0
+        if self._chunked:
+            self._remaining = 0 # Remaining bytes of current chunk
+        # Body delimited by connection close cannot be followed by other requests
+        self._keep_alive = (self._eof or self._chunked or self._remaining >= 0) \
+            and headers.get('connection', '').lower() != 'close'
+
+    async def readinto(self, buf, size: int = -1) -> int:
+        """Reads up to size (or len(buf)) bytes of the body. Returns 0 at the end of body."""
+        if self._eof:
+            return 0
+        if size < 0:
+            size = len(buf)
+        if self._chunked and self._remaining == 0:
+            self._remaining = await self._read_chunk_size()
+            if self._remaining == 0:
+                self._eof = True
+                return 0
+        if self._remaining >= 0:
+            size = min(size, self._remaining)
+        n = await self._stream.readinto(memoryview(buf)[:size])
+        self._session.response_bytes += n or 0
+        if not n:
+            # Connection closed by peer
+            self._eof = True
+            if self._remaining > 0:
+                self._keep_alive = False
+            return 0
+        if self._remaining >= 0:
+            self._remaining -= n
+            if self._remaining == 0 and not self._chunked:
+                self._eof = True
+            elif self._remaining == 0:
+                await self._stream.readline() # CRLF after chunk data
+        return n
+
+    async def read(self) -> bytes:
+        """Reads the whole body. Use readinto() for large responses."""
+        data = b''
+        buf = bytearray(256)
+        while True:
+            n = await self.readinto(buf)
+            if not n:
+                break
+            data += buf[:n]
+        return data
+
+    async def close(self):
+        """Drains the rest of the body and returns the socket to the session."""
+        if self._stream is None:
+            return
+        try:
+            buf = bytearray(64)
+            while await self.readinto(buf):
+                pass
+        except Exception: # OSError, asyncio.TimeoutError
+            self._keep_alive = False
+        self._session._release(self._keep_alive)
+        self._stream = None
+
+    async def _read_chunk_size(self) -> int:
+        line = await self._stream.readline()
+        size = int(line.split(b';')[0].strip() or b'0', 16)
+        if size == 0:
+            # Trailer headers until empty line
+            while True:
+                line = await self._stream.readline()
+                if not line or line == b'\r\n':
+                    break
+        return size
+
+class Session:
+    """
+    Keeps one socket per host alive across requests.
+    Reconnects transparently when the connection was reset by the peer.
+    """
+    def __init__(self, host: str, port: int = 443, timeout: int = 10,
+                 use_ssl: bool = True, use_asyncio: bool = False, governor=None):
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        self._use_ssl = use_ssl
+        self._use_asyncio = use_asyncio
+        self._governor = governor   # Governor, boosted during the handshake
+        self._stream = None
+        self._busy = False
+
+        # Statistics
+        self.connect_count = 0
+        self.request_count = 0
+        self.handshake_ms = 0       # Last DNS + TCP + TLS handshake time
+        self.handshake_total_ms = 0
+        self.request_ms = 0         # Last request time (until response headers)
+        self.request_total_ms = 0
+        self.response_bytes = 0     # Body bytes read from the last response
+
+    @property
+    def host(self):
+        return self._host
+
+    def stats(self) -> dict:
+        return {
+            'host': self._host,
+            'connect_count': self.connect_count,
+            'request_count': self.request_count,
+            'handshake_ms': self.handshake_ms,
+            'handshake_total_ms': self.handshake_total_ms,
+            'request_ms': self.request_ms,
+            'request_total_ms': self.request_total_ms,
+            'response_bytes': self.response_bytes,
+        }
+
+    def is_connected(self) -> bool:
+        return self._stream is not None
+
+    def close(self):
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except OSError:
+                pass
+        self._stream = None
+        self._busy = False
+
+    async def get(self, path: str, headers: dict = None) -> Response:
+        """
+        GET request. Raises OSError (or asyncio.TimeoutError) on network failure.
+        The response must be closed before the next request.
+        """
+        if self._busy:
+            raise RuntimeError('Previous response is not closed')
+        request = self._build_request('GET', path, headers)
+
+        # A kept-alive socket may have been closed by the peer since the last poll.
+        # Retry once with a fresh connection in that case.
+        while True:
+            reused = self._stream is not None
+            if not reused:
+                await self._connect()
+            try:
+                start = time.ticks_ms()
+                await self._stream.write(request)
+                response = await self._read_response()
+            except Exception: # OSError, asyncio.TimeoutError
+                self.close()
+                if reused:
+                    continue
+                raise
+            self.request_ms = time.ticks_diff(time.ticks_ms(), start)
+            self.request_total_ms += self.request_ms
+            self.request_count += 1
+            self.response_bytes = 0
+            self._busy = True
+            return response
+
+    def _build_request(self, method: str, path: str, headers: dict) -> bytes:
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self._host}', 'Connection: keep-alive']
+        if headers:
+            for key, value in headers.items():
+                if value != '':
+                    lines.append(f'{key}: {value}')
+        lines.append('\r\n')
+        return '\r\n'.join(lines).encode()
+
+    async def _connect(self):
+        if self._governor is None:
+            return await self._open()
+        with self._governor:
+            return await self._open()
+
+    async def _open(self):
+        start = time.ticks_ms()
+        if self._use_asyncio:
+            import asyncio
+            stream, _ = await asyncio.wait_for(
+                asyncio.open_connection(self._host, self._port, ssl=self._use_ssl), self._timeout)
+            self._stream = _AsyncStream(stream, self._timeout)
+        else:
+            addr = socket.getaddrinfo(self._host, self._port, 0, socket.SOCK_STREAM)[0]
+            sock = socket.socket(addr[0], socket.SOCK_STREAM, addr[2])
+            try:
+                sock.settimeout(self._timeout)
+                sock.connect(addr[-1])
+                if self._use_ssl:
+                    sock = ssl.wrap_socket(sock, server_hostname=self._host)
+            except OSError:
+                sock.close()
+                raise
+            self._stream = _SocketStream(sock)
+        self.handshake_ms = time.ticks_diff(time.ticks_ms(), start)
+        self.handshake_total_ms += self.handshake_ms
+        self.connect_count += 1
+
+    async def _read_response(self) -> Response:
+        line = await self._stream.readline()
+        if not line:
+            raise OSError('Connection closed by peer')
+        status_code = int(line.split(None, 2)[1])
+
+        headers = {}
+        while True:
+            line = await self._stream.readline()
+            if not line:
+                raise OSError('Connection closed by peer')
+            if line == b'\r\n':
+                break
+            key, _, value = line.decode().partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        # No body: 1xx, 204, 304
+        has_body = status_code >= 200 and status_code not in (204, 304)
+        return Response(self, self._stream, status_code, headers, has_body)
+
+    def _release(self, keep_alive: bool):
+        self._busy = False
+        if not keep_alive:
+            self.close()
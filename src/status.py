@@ -0,0 +1,223 @@
+# Non-blocking HTTP Status Server
+'''
+    def handler(method, path):
+        return 200, {'state': 'IdleState'}  # (code, JSON-serializable data)
+
+    server = StatusServer(handler, port=80)
+    server.start()
+
+    # Blocking main loop: serves requests while waiting, instead of time.sleep_ms()
+    server.wait(ms)
+
+    # asyncio: poll from a task. Returns ms until the next call is useful.
+    while True:
+        await asyncio.sleep_ms(server.update())
+
+    $ curl http://<lamp address>/status
+'''
+
+from micropython import const
+import json, select, socket, time
+
+__all__ = ['StatusServer']
+
+_EAGAIN = const(11)
+_REQUEST_SIZE = const(256)      # Request line and headers. Longer headers are ignored.
+_ACTIVE_POLL_MS = const(20)     # update() period while a client is connected
+_IDLE_POLL_MS = const(200)
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            500: 'Internal Server Error'}
+
+class _Client:
+    # A connection slot, buffers are reused across connections
+    def __init__(self):
+        self.sock = None
+        self.buf = bytearray(_REQUEST_SIZE)
+        self.size = 0
+        self.out = None     # memoryview of the response left to send
+        self.ticks = 0      # Accepted at
+
+class StatusServer:
+    """
+    Tiny HTTP/1.1 server answering GET requests with JSON, one request per connection.
+    Sockets are non-blocking, connections and buffers are bounded, so a slow or stuck client
+    never delays the caller. Clients over max_clients wait in the listen backlog.
+    """
+    def __init__(self, handler, port: int = 80, max_clients: int = 2, timeout_ms: int = 2000):
+        """
+        Args:
+            handler: func(method, path) -> (code, data). data is serialized as JSON.
+            port (int): TCP port.
+            max_clients (int): Connections served at the same time.
+            timeout_ms (int): A connection not completed in this time is closed.
+        """
+        self._handler = handler
+        self._port = port
+        self._timeout_ms = timeout_ms
+        self._clients = [_Client() for _ in range(max_clients)]
+        self._sock = None
+        self._poll = select.poll()
+        self._accepting = False
+
+        self.requests = 0
+        self.dropped = 0    # Timed out, closed by the client or malformed
+
+    @property
+    def port(self) -> int:
+        return self._port
+
+    def start(self):
+        """Starts listening. Raises OSError if Wi-Fi is not connected."""
+        addr = socket.getaddrinfo('0.0.0.0', self._port)[0][-1]
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(addr)
+        sock.listen(1)
+        sock.setblocking(False)
+        self._sock = sock
+        self._poll.register(sock, select.POLLIN)
+        self._accepting = True
+
+    def stop(self):
+        for client in self._clients:
+            self._close(client)
+        if self._sock is not None:
+            self._unregister(self._sock)
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def update(self) -> int:
+        """
+        Accepts, reads and answers what is ready. Never waits for the network.
+        Returns ms until the next call is useful.
+        """
+        ticks = time.ticks_ms()
+        if self._sock is None:
+            try:
+                self.start() # Listening socket is lost with Wi-Fi
+            except OSError:
+                self._sock = None
+                return _IDLE_POLL_MS
+        busy = 0
+        for client in self._clients:
+            if client.sock is not None:
+                self._serve(client, ticks)
+            if client.sock is None and self._sock is not None:
+                self._accept(client, ticks)
+            if client.sock is not None:
+                busy += 1
+        # Connections in the backlog must not wake up wait() while every slot is in use
+        accepting = busy < len(self._clients)
+        if self._sock is not None and accepting != self._accepting:
+            self._poll.modify(self._sock, select.POLLIN if accepting else 0)
+            self._accepting = accepting
+        return _ACTIVE_POLL_MS if busy else _IDLE_POLL_MS
+
+    def wait(self, ms: int):
+        """Serves requests for ms. Sleeps in select.poll() while nothing is ready."""
+        deadline = time.ticks_add(time.ticks_ms(), ms)
+        while True:
+            period = self.update()
+            remaining = time.ticks_diff(deadline, time.ticks_ms())
+            if remaining <= 0:
+                return
+            if self._sock is None:
+                time.sleep_ms(min(remaining, period))
+            else:
+                # Wakes up on a new connection or data, or to time out the clients
+                self._poll.poll(min(remaining, self._timeout_ms))
+
+    def _accept(self, client: _Client, ticks: int):
+        try:
+            sock, _ = self._sock.accept()
+        except OSError as e:
+            if e.args[0] != _EAGAIN:
+                self.stop() # Restarted by the next update()
+            return
+        sock.setblocking(False)
+        client.sock = sock
+        client.size = 0
+        client.out = None
+        client.ticks = ticks
+        self._poll.register(sock, select.POLLIN)
+
+    def _serve(self, client: _Client, ticks: int):
+        if time.ticks_diff(ticks, client.ticks) >= self._timeout_ms:
+            self.dropped += 1
+            self._close(client)
+            return
+        try:
+            if client.out is None:
+                self._read(client)
+            if client.out is not None:
+                self._send(client)
+        except OSError as e:
+            if e.args[0] != _EAGAIN:
+                self.dropped += 1
+                self._close(client)
+
+    def _read(self, client: _Client):
+        n = client.sock.readinto(memoryview(client.buf)[client.size:])
+        if n is None:
+            return # No data yet
+        if n == 0:
+            self.dropped += 1
+            self._close(client)
+            return
+        client.size += n
+        head = bytes(client.buf[:client.size])
+        if b'\r\n\r\n' not in head and client.size < _REQUEST_SIZE:
+            return
+        line = head.split(b'\r\n', 1)[0].split()
+        if len(line) != 3 or not line[2].startswith(b'HTTP/'):
+            self.dropped += 1
+            self._respond(client, 400, {'error': 'bad request'})
+            return
+        method = line[0].decode()
+        path = line[1].decode()
+        self.requests += 1
+        if method != 'GET':
+            self._respond(client, 405, {'error': 'method not allowed'})
+            return
+        try:
+            code, data = self._handler(method, path)
+        except Exception as e:
+            code, data = 500, {'error': str(e)}
+        self._respond(client, code, data)
+
+    def _respond(self, client: _Client, code: int, data):
+        body = json.dumps(data).encode()
+        head = (f'HTTP/1.1 {code} {_REASONS.get(code, "Status")}\r\n'
+                f'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: close\r\n\r\n')
+        client.out = memoryview(head.encode() + body)
+        self._poll.modify(client.sock, select.POLLOUT)
+
+    def _send(self, client: _Client):
+        n = client.sock.send(client.out)
+        if n:
+            client.out = client.out[n:]
+        if not len(client.out):
+            self._close(client)
+
+    def _close(self, client: _Client):
+        if client.sock is None:
+            return
+        self._unregister(client.sock)
+        try:
+            client.sock.close()
+        except OSError:
+            pass
+        client.sock = None
+        client.out = None
+
+    def _unregister(self, sock):
+        try:
+            self._poll.unregister(sock)
+        except (OSError, KeyError):
+            pass
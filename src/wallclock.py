@@ -0,0 +1,234 @@
+# Drift-corrected Wall Clock with Non-blocking NTP
+'''
+    clock = WallClock('pool.ntp.org')
+
+    # Call from the main loop. Never blocks on the network (sends/receives UDP without waiting).
+    # Returns ms until the next call is useful.
+    clock.update()
+
+    clock.now()         # UTC seconds, same epoch as time.time()
+    clock.now_ms()
+    clock.synced        # True after the first NTP sample
+
+    # Boot: wait for the first sample with a bounded time
+    clock.wait_synced(10000)
+'''
+
+from micropython import const
+import socket, time
+
+__all__ = ['WallClock']
+
+_NTP_PORT = const(123)
+_STEP_MS = const(2000)          # Larger errors are stepped, smaller ones are slewed
+_SLEW_PPM = const(500)          # Slew rate: 0.5 ms per second
+_MAX_RATE_PPM = const(1000)     # Drift estimate limit (crystal is within ~100 ppm)
+_RATE_PPM_ERROR = const(20)     # Drift is measured over a span long enough for this precision
+_REBASE_MS = const(24 * 60 * 60 * 1000)   # ticks_ms wraps in ~12 days (2^30 ms on ESP32)
+_DNS_CACHE_MS = const(24 * 60 * 60 * 1000)
+_MAX_RATE_SPAN_MS = const(5 * 24 * 60 * 60 * 1000) # Within the ticks_ms wrap
+_EAGAIN = const(11)
+
+# Seconds from 1900-01-01 (NTP) to the epoch of time.time()
+_NTP_DELTA = 2208988800 if time.gmtime(0)[0] == 1970 else 3155673600
+
+class WallClock:
+    """
+    Wall time anchored to ticks_ms.
+    NTP samples correct the offset gradually (slew) and estimate the drift rate of the crystal,
+    so now() stays monotonic and accurate between samples.
+    """
+    def __init__(self, host: str = 'pool.ntp.org', interval_ms: int = 60 * 60 * 1000,
+                 retry_ms: int = 60 * 1000, timeout_ms: int = 1000):
+        """
+        Args:
+            host (str): NTP server.
+            interval_ms (int): Resync interval.
+            retry_ms (int): Retry interval after a failure, doubled on every failure up to interval_ms.
+            timeout_ms (int): Wait for the response, the main loop keeps running meanwhile.
+        """
+        self._host = host
+        self._interval_ms = interval_ms
+        self._retry_ms = retry_ms
+        self._timeout_ms = timeout_ms
+
+        # now_ms(t) = base_ms + elapsed * (1 + rate) + slew applied so far
+        self._base_ticks = time.ticks_ms()
+        self._base_ms = time.time() * 1000  # RTC until the first sample
+        self._rate_ppm = 0
+        self._rate_known = False
+        self._slew_ms = 0                   # Correction left to apply
+        self._slew_ticks = self._base_ticks
+
+        self._anchor = None                 # (ticks, server ms, rtt) of the sample the drift is measured from
+        self._next_ticks = self._base_ticks # Next sync
+        self._sock = None
+        self._sent_ticks = 0
+        self._addr = None
+        self._addr_ticks = 0
+
+        self.synced = False
+        self.samples = 0
+        self.failures = 0                   # Consecutive failures
+        self.last_error_ms = 0              # Error of the last sample, before correction
+
+    # --- Time -----------------------------------------------------------------
+
+    def now(self) -> int:
+        """UTC seconds, same epoch as time.time()."""
+        return self.now_ms() // 1000
+
+    def now_ms(self) -> int:
+        return self._at(time.ticks_ms())
+
+    @property
+    def rate_ppm(self) -> int:
+        """Estimated drift of ticks_ms. Positive: ticks run slow."""
+        return self._rate_ppm
+
+    def _at(self, ticks: int) -> int:
+        elapsed = time.ticks_diff(ticks, self._base_ticks)
+        return self._base_ms + elapsed + elapsed * self._rate_ppm // 1_000_000 + self._applied(ticks)
+
+    def _applied(self, ticks: int) -> int:
+        # Part of the slew applied at ticks
+        limit = max(0, time.ticks_diff(ticks, self._slew_ticks)) * _SLEW_PPM // 1_000_000
+        if self._slew_ms >= 0:
+            return min(self._slew_ms, limit)
+        return max(self._slew_ms, -limit)
+
+    def _rebase(self, ticks: int):
+        # Folds the elapsed time and the applied slew into the base
+        applied = self._applied(ticks)
+        self._base_ms = self._at(ticks)
+        self._base_ticks = ticks
+        self._slew_ms -= applied
+        self._slew_ticks = ticks
+
+    # --- NTP ------------------------------------------------------------------
+
+    def update(self) -> int:
+        """
+        Sends or receives an NTP packet if due. Never waits for the network.
+        Returns ms until the next call is useful.
+        """
+        ticks = time.ticks_ms()
+        if time.ticks_diff(ticks, self._base_ticks) > _REBASE_MS:
+            self._rebase(ticks)
+
+        if self._sock is not None:
+            if self._receive(ticks):
+                return max(0, time.ticks_diff(self._next_ticks, ticks))
+            if time.ticks_diff(ticks, self._sent_ticks) < self._timeout_ms:
+                return 50 # Waiting for the response
+            self._fail(ticks)
+
+        remaining = time.ticks_diff(self._next_ticks, ticks)
+        if remaining > 0:
+            return remaining
+        self._send(ticks)
+        return 50
+
+    def wait_synced(self, timeout_ms: int) -> bool:
+        """Blocks until the first sample or the timeout. For boot only."""
+        start = time.ticks_ms()
+        while not self.synced and time.ticks_diff(time.ticks_ms(), start) < timeout_ms:
+            time.sleep_ms(min(self.update(), 100))
+        return self.synced
+
+    def _send(self, ticks: int):
+        try:
+            if self._addr is None or time.ticks_diff(ticks, self._addr_ticks) > _DNS_CACHE_MS:
+                self._addr = socket.getaddrinfo(self._host, _NTP_PORT)[0][-1]
+                self._addr_ticks = ticks
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            query = bytearray(48)
+            query[0] = 0x1B # LI = 0, VN = 3, Mode = 3 (client)
+            sock.sendto(query, self._addr)
+        except OSError:
+            self._addr = None
+            self._fail(ticks)
+            return
+        self._sock = sock
+        self._sent_ticks = time.ticks_ms()
+
+    def _receive(self, ticks: int) -> bool:
+        try:
+            data = self._sock.recv(48)
+        except OSError as e:
+            if e.args[0] == _EAGAIN:
+                return False
+            self._fail(ticks)
+            return True
+        self._close()
+        if not data or len(data) < 48 or data[1] == 0: # Stratum 0: Kiss-o'-Death
+            self._fail(ticks)
+            return True
+        seconds = int.from_bytes(data[40:44], 'big')
+        fraction = int.from_bytes(data[44:48], 'big')
+        # Server time at the middle of the round trip
+        rtt = time.ticks_diff(ticks, self._sent_ticks)
+        server_ms = (seconds - _NTP_DELTA) * 1000 + (fraction * 1000 >> 32)
+        self._sample(time.ticks_add(self._sent_ticks, rtt // 2), server_ms, rtt)
+        self._next_ticks = time.ticks_add(ticks, self._interval_ms)
+        self.failures = 0
+        return True
+
+    def _sample(self, ticks: int, server_ms: int, rtt: int):
+        error = server_ms - self._at(ticks)
+        self.last_error_ms = error
+        self.samples += 1
+        self._rebase(ticks)
+        if not self.synced or abs(error) > _STEP_MS:
+            # Step: first sync or lost (e.g. RTC was not set)
+            self._base_ms += error
+            self._slew_ms = 0
+            self._set_rtc(self._base_ms // 1000)
+            self.synced = True
+        else:
+            self._slew_ms = error
+        self._measure_rate(ticks, server_ms, rtt)
+
+    def _measure_rate(self, ticks: int, server_ms: int, rtt: int):
+        # Rate of ticks_ms against the server between two samples.
+        # The round trips bound the error, so the span is extended until it is small enough.
+        if self._anchor is None:
+            self._anchor = (ticks, server_ms, rtt)
+            return
+        anchor_ticks, anchor_ms, anchor_rtt = self._anchor
+        span = time.ticks_diff(ticks, anchor_ticks)
+        if span <= 0 or span > _MAX_RATE_SPAN_MS:
+            self._anchor = (ticks, server_ms, rtt)
+            return
+        if (anchor_rtt + rtt) * 1_000_000 // 2 > span * _RATE_PPM_ERROR:
+            return
+        measured = (server_ms - anchor_ms - span) * 1_000_000 // span
+        if self._rate_known:
+            measured = (self._rate_ppm + measured) // 2 # Smooths the remaining noise
+        self._rate_ppm = max(-_MAX_RATE_PPM, min(_MAX_RATE_PPM, measured))
+        self._rate_known = True
+        self._anchor = (ticks, server_ms, rtt)
+
+    def _fail(self, ticks: int):
+        self._close()
+        self.failures += 1
+        delay = min(self._interval_ms, self._retry_ms << min(self.failures - 1, 10))
+        self._next_ticks = time.ticks_add(ticks, delay)
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def _set_rtc(self, seconds: int):
+        # RTC is for the day-level users (quota reset). FSM uses now().
+        try:
+            from machine import RTC
+            tm = time.gmtime(seconds)
+            RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+        except (ImportError, OSError):
+            pass
@@ -3,7 +3,24 @@ import mido
 import argparse
 import struct
 import os
+import io
+import json
 import math
+import heapq
+import contextlib
+from collections import Counter
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+
+DRUM_CHANNEL = 9 # General MIDI percussion (channel 10)
+DEFAULT_TEMPO = 500000 # us per beat (120 BPM)
+
+# Compact audio format, decoded by Sequencer (src/sequencer.py, the format is described there)
+AUDIO_MAGIC = b'LMPA'
+AUDIO_VERSION = 1
+DURATION_TABLE_SIZE = 15
+VARINT = 15
+MAX_DURATION_MS = 60000 # Longer events would overflow the ticks_us deadline arithmetic of Sequencer
 
 def midi_to_hz(note, transpose=0):
     """Converts a MIDI note number to frequency in Hz, applying transposition."""
@@ -12,32 +29,65 @@ def midi_to_hz(note, transpose=0):
     note += transpose
     return 440 * 2**((note - 69) / 12)
 
-def analyze_and_process_midi(midi_path, transpose, target_bpm=None, max_beats=None):
+def note_intervals(track):
+    """[(start_tick, end_tick, note), ...] of a track, in the order the notes end."""
+    intervals = []
+    current_time_ticks = 0
+    open_notes = {} # {note: start_tick}
+    for msg in track:
+        current_time_ticks += msg.time
+        if msg.type == 'note_on' and msg.velocity > 0:
+            if msg.note in open_notes:
+                intervals.append((open_notes.pop(msg.note), current_time_ticks, msg.note))
+            open_notes[msg.note] = current_time_ticks
+        elif msg.type in ('note_on', 'note_off') and msg.note in open_notes:
+            intervals.append((open_notes.pop(msg.note), current_time_ticks, msg.note))
+    return intervals
+
+def monophony(intervals):
+    """Share of the sounding time with a single note (1.0: never more than one note at a time)."""
+    total = sum(end - start for start, end, _ in intervals)
+    if total <= 0:
+        return 0.0
+    covered = 0
+    covered_until = None
+    for start, end, _ in sorted(intervals):
+        if covered_until is None or start >= covered_until:
+            covered += end - start
+            covered_until = end
+        elif end > covered_until:
+            covered += end - covered_until
+            covered_until = end
+    return covered / total
+
+def melody_score(info):
     """
-    Analyzes a MIDI file, prompts the user to select a track,
-    and processes it into a list of (frequency, duration) tuples.
+    Likelihood of a track being the melody: monophonic, many notes, in a singable range and register.
+    0 for empty and percussion tracks.
     """
-    try:
-        mid = mido.MidiFile(midi_path)
-    except FileNotFoundError:
-        print(f"Error: MIDI file not found at '{midi_path}'")
-        return None, None
-
-    print("MIDI File Loaded. Analyzing tracks...")
-    print("-" * 40)
-
+    if info['note_count'] == 0 or info['drums']:
+        return 0.0
+    pitch_range = info['max_note'] - info['min_note']
+    range_factor = 1.0 if pitch_range <= 24 else 24 / pitch_range # Melodies rarely span over 2 octaves
+    register_factor = max(0.1, min(1.0, (info['mean_note'] - 36) / 36)) # Bass lines score low
+    return info['monophony'] * math.log1p(info['note_count']) * range_factor * register_factor
+
+def analyze_tracks(mid):
+    """Note statistics of each track, with the melody score."""
     tracks_info = []
     for i, track in enumerate(mid.tracks):
         instrument_name = "Not set"
         note_count = 0
         notes = []
+        drums = False
         for msg in track:
             if msg.is_meta and msg.type == 'instrument_name':
                 instrument_name = msg.name
             if msg.type == 'note_on' and msg.velocity > 0:
                 note_count += 1
                 notes.append(msg.note)
-        
+                drums = drums or msg.channel == DRUM_CHANNEL
+
         info = {
             "track_num": i,
             "name": track.name or "Unnamed",
@@ -45,148 +95,372 @@ def analyze_and_process_midi(midi_path, transpose, target_bpm=None, max_beats=No
             "note_count": note_count,
             "min_note": min(notes) if notes else 0,
             "max_note": max(notes) if notes else 0,
+            "mean_note": sum(notes) / len(notes) if notes else 0,
+            "monophony": monophony(note_intervals(track)),
+            "drums": drums,
         }
+        info["score"] = melody_score(info)
         tracks_info.append(info)
+    return tracks_info
 
+def pick_melody_track(tracks_info):
+    """Track number with the highest melody score. None if no track has notes."""
+    best = max(tracks_info, key=lambda info: info['score'], default=None)
+    if best is None or best['score'] <= 0:
+        return None
+    return best['track_num']
+
+def print_tracks(tracks_info, transpose):
+    print("MIDI File Loaded. Analyzing tracks...")
+    print("-" * 40)
+    for info in tracks_info:
         print(f"Track {info['track_num']}: {info['name']}")
         print(f"  - Instrument: {info['instrument']}")
         print(f"  - Note Count: {info['note_count']}")
-        if notes:
+        if info['note_count']:
             min_hz = midi_to_hz(info['min_note'], transpose)
             max_hz = midi_to_hz(info['max_note'], transpose)
             print(f"  - Lowest Note: {info['min_note']} ({min_hz:.2f} Hz)")
             print(f"  - Highest Note: {info['max_note']} ({max_hz:.2f} Hz)")
+            print(f"  - Melody Score: {info['score']:.2f} (monophony {info['monophony']:.2f})")
         print("-" * 40)
 
-    # --- Track Selection ---
-    selected_track_num = -1
+def track_error(tracks_info, track):
+    """Why the track can't be converted, None if it can."""
+    if not 0 <= track < len(tracks_info):
+        return f"Invalid track number: {track} (0 - {len(tracks_info) - 1})"
+    if tracks_info[track]['note_count'] == 0:
+        return f"Track {track} has no notes"
+    return None
+
+def select_track(tracks_info):
+    """Prompts the user to select a track with notes."""
+    suggested = pick_melody_track(tracks_info)
+    if suggested is not None:
+        print(f"Suggested melody track: {suggested}")
     while True:
         try:
             choice = input("Enter the track number to process: ")
             selected_track_num = int(choice)
-            if 0 <= selected_track_num < len(mid.tracks):
-                if tracks_info[selected_track_num]['note_count'] > 0:
-                    break
-                else:
-                    print("Selected track has no notes. Please choose another track.")
-            else:
-                print("Invalid track number.")
+            error = track_error(tracks_info, selected_track_num)
+            if error is None:
+                return selected_track_num
+            print(f"{error}. Please choose another track.")
         except ValueError:
             print("Please enter a valid number.")
 
+def analyze_and_process_midi(midi_path, transpose, target_bpm=None, max_beats=None, track=None):
+    """
+    Analyzes a MIDI file, prompts the user to select a track (unless track is given),
+    and processes it into a list of (MIDI note, duration) tuples.
+    """
+    try:
+        mid = mido.MidiFile(midi_path)
+    except FileNotFoundError:
+        print(f"Error: MIDI file not found at '{midi_path}'")
+        return None, None
+
+    tracks_info = analyze_tracks(mid)
+    print_tracks(tracks_info, transpose)
+    if track is not None:
+        error = track_error(tracks_info, track)
+        if error is not None:
+            print(f"Error: {error}")
+            return None, None
+    selected_track_num = select_track(tracks_info) if track is None else track
+    return process_track(mid, selected_track_num, transpose, target_bpm, max_beats), mid.filename
+
+class TempoMap:
+    """
+    Tick to ms conversion following every set_tempo of the file (of any track).
+    Built once: each tempo change starts a segment with its cumulative time, a tick is converted
+    by a binary search for its segment.
+    """
+    def __init__(self, mid, target_bpm=None):
+        self.ticks_per_beat = mid.ticks_per_beat
+        if target_bpm:
+            changes = [(0, mido.bpm2tempo(target_bpm))]
+        else:
+            changes = []
+            for track in mid.tracks:
+                current_time_ticks = 0
+                for msg in track:
+                    current_time_ticks += msg.time
+                    if msg.is_meta and msg.type == 'set_tempo':
+                        changes.append((current_time_ticks, msg.tempo))
+            changes.sort(key=lambda change: change[0]) # Stable: the last change at the same tick wins
+
+        self._ticks = [0]
+        self._ms = [0.0]
+        self._tempos = [DEFAULT_TEMPO]
+        for tick, tempo in changes:
+            if tick == self._ticks[-1]:
+                self._tempos[-1] = tempo
+                continue
+            self._ms.append(self.ms(tick))
+            self._ticks.append(tick)
+            self._tempos.append(tempo)
+
+    @property
+    def tempos(self):
+        return list(self._tempos)
+
+    def ms(self, tick):
+        i = bisect_right(self._ticks, tick) - 1
+        return self._ms[i] + (tick - self._ticks[i]) * self._tempos[i] / (self.ticks_per_beat * 1000)
+
+def skyline(intervals):
+    """
+    Highest sounding note at each instant, in O(n log n).
+    intervals: [(start, end, note), ...]. Returns non-overlapping [(start, end, note), ...] in time order,
+    a new segment starts whenever the highest note changes (including a re-struck note of the same pitch).
+    """
+    events = sorted(intervals)
+    segments = []
+    heap = [] # (-note, index, end): highest note first, then the earliest started
+    current = None # index of the sounding interval
+    segment_start = 0
+    i = 0
+    while i < len(events) or heap:
+        # Next instant the highest note can change: a note starts, or the highest one ends
+        t = events[i][0] if i < len(events) else None
+        if heap and (t is None or heap[0][2] < t):
+            t = heap[0][2]
+        while i < len(events) and events[i][0] <= t:
+            start, end, note = events[i]
+            heapq.heappush(heap, (-note, i, end))
+            i += 1
+        while heap and heap[0][2] <= t:
+            heapq.heappop(heap) # Notes below the highest are removed when they surface
+        top = heap[0][1] if heap else None
+        if top != current:
+            if current is not None and t > segment_start:
+                segments.append((segment_start, t, events[current][2]))
+            current = top
+            segment_start = t
+    return segments
+
+def process_track(mid, selected_track_num, transpose, target_bpm=None, max_beats=None):
+    """
+    Converts a track of a loaded MIDI file into a list of (MIDI note, duration [ms]) tuples.
+    Notes are transposed and clamped to 1-127, note 0 is a rest.
+    """
     print(f"Processing Track {selected_track_num}...")
 
-    # --- Note Processing ---
-    selected_track = mid.tracks[selected_track_num]
-    ticks_per_beat = mid.ticks_per_beat
-    
+    tempo_map = TempoMap(mid, target_bpm)
     if target_bpm:
-        tempo = mido.bpm2tempo(target_bpm)
-        print(f"Using manual BPM: {target_bpm} (Tempo: {tempo})")
+        print(f"Using manual BPM: {target_bpm} (Tempo: {tempo_map.tempos[0]})")
     else:
-        tempo = 500000  # Default MIDI tempo (120 BPM)
-        # Only detect tempo if not manually specified
-        for msg in mido.merge_tracks(mid.tracks): # Merge tracks to get global tempo changes
-            if msg.is_meta and msg.type == 'set_tempo':
-                tempo = msg.tempo
-        print(f"Detected Tempo: {tempo} (BPM: {mido.tempo2bpm(tempo):.2f})")
-
-    limit_ticks = None
+        bpms = [mido.tempo2bpm(tempo) for tempo in tempo_map.tempos]
+        print(f"Detected Tempo: {len(bpms)} segment(s), BPM {min(bpms):.2f} - {max(bpms):.2f}")
+
+    intervals = [(start, end, note) for start, end, note in note_intervals(mid.tracks[selected_track_num]) if end > start]
     if max_beats is not None:
-        limit_ticks = int(max_beats * ticks_per_beat)
+        limit_ticks = int(max_beats * mid.ticks_per_beat)
         print(f"Limit set to {max_beats} beats ({limit_ticks} ticks)")
+        intervals = [(start, min(end, limit_ticks), note) for start, end, note in intervals if start < limit_ticks]
 
-    note_events = []
-    current_time_ticks = 0
-    open_notes = {} # {note: start_tick}
-
-    for msg in selected_track:
-        current_time_ticks += msg.time
-        
-        if limit_ticks is not None and current_time_ticks > limit_ticks:
-            break
-
-        is_note_on = msg.type == 'note_on' and msg.velocity > 0
-        is_note_off = msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0)
-
-        if is_note_on:
-            # If the same note is already playing, end it first.
-            if msg.note in open_notes:
-                start_tick = open_notes.pop(msg.note)
-                start_ms = mido.tick2second(start_tick, ticks_per_beat, tempo) * 1000
-                end_ms = mido.tick2second(current_time_ticks, ticks_per_beat, tempo) * 1000
-                note_events.append({'start': start_ms, 'end': end_ms, 'pitch': msg.note})
-            open_notes[msg.note] = current_time_ticks
-
-        elif is_note_off:
-            if msg.note in open_notes:
-                start_tick = open_notes.pop(msg.note)
-                start_ms = mido.tick2second(start_tick, ticks_per_beat, tempo) * 1000
-                end_ms = mido.tick2second(current_time_ticks, ticks_per_beat, tempo) * 1000
-                if end_ms > start_ms: # only add notes with duration
-                    note_events.append({'start': start_ms, 'end': end_ms, 'pitch': msg.note})
-    
-    # Sort events by start time
-    note_events.sort(key=lambda x: x['start'])
-
-    if not note_events:
+    segments = skyline(intervals)
+    if not segments:
         print("No processable note events found in the selected track.")
-        return None, None
-        
+        return None
+
+    # Durations from rounded absolute times, so rounding errors don't add up over the song
     final_notes = []
     last_event_end_time = 0
-
-    # Group overlapping notes (chords)
-    processed_events = []
-    if note_events:
-        current_group = [note_events[0]]
-        for i in range(1, len(note_events)):
-            # if the current note starts before the previous one ends, it's part of a chord or overlap
-            if note_events[i]['start'] < current_group[-1]['end']:
-                current_group.append(note_events[i])
-            else:
-                processed_events.append(current_group)
-                current_group = [note_events[i]]
-        processed_events.append(current_group)
-    
-    for group in processed_events:
-        highest_pitch_note = max(group, key=lambda x: x['pitch'])
-        start_time = min(item['start'] for item in group)
-        end_time = max(item['end'] for item in group)
-        
-        # Add silence if needed
+    for start, end, note in segments:
+        start_time = round(tempo_map.ms(start))
+        end_time = round(tempo_map.ms(end))
         silence_duration = start_time - last_event_end_time
         if silence_duration > 1: # Use a small threshold to avoid tiny silences
-            final_notes.append((0, round(silence_duration)))
-
-        # Add the note (highest pitch from the chord)
-        freq = midi_to_hz(highest_pitch_note['pitch'], transpose)
-        duration = end_time - start_time
-        
-        if duration > 0:
-            final_notes.append((round(freq), round(duration)))
-        
-        last_event_end_time = end_time
-
-    # Clamp values to 16-bit range
-    clamped_notes = []
-    for freq, duration in final_notes:
-        clamped_freq = max(0, min(20000, freq))
-        clamped_duration = max(0, min(60000, duration))
-        clamped_notes.append((clamped_freq, clamped_duration))
-
-    return clamped_notes, mid.filename
-
-def write_binary_file(notes, output_path):
-    """Writes the processed notes to a binary file and returns its size."""
+            final_notes.append((0, silence_duration))
+        elif silence_duration > 0 and final_notes:
+            previous, duration = final_notes[-1]
+            final_notes[-1] = (previous, duration + silence_duration)
+        if end_time > start_time:
+            final_notes.append((max(1, min(127, note + transpose)), end_time - start_time))
+            last_event_end_time = end_time
+
+    return final_notes
+
+def varint(value):
+    """Unsigned LEB128: 7 bits per byte, low bits first."""
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def encode_audio(notes):
+    """
+    Encodes (MIDI note, duration) tuples into the compact audio format.
+    Consecutive rests are merged, then split into MAX_DURATION_MS parts. Notes are clamped to MAX_DURATION_MS.
+    Most notes take a single byte: a pitch step of up to 7 semitones and one of the
+    DURATION_TABLE_SIZE most frequent durations.
+    """
+    merged = []
+    for note, duration in notes:
+        if duration <= 0:
+            continue
+        if note == 0 and merged and merged[-1][0] == 0:
+            merged[-1] = (0, merged[-1][1] + duration)
+        else:
+            merged.append((note, duration))
+    events = []
+    for note, duration in merged:
+        if note:
+            events.append((note, min(duration, MAX_DURATION_MS)))
+            continue
+        while duration > 0:
+            events.append((0, min(duration, MAX_DURATION_MS)))
+            duration -= MAX_DURATION_MS
+    if len(events) > 0xFFFF:
+        raise ValueError(f"Too many notes for the audio format: {len(events)}")
+
+    counts = Counter(duration for _, duration in events if duration <= 0xFFFF)
+    table = [duration for duration, count in counts.most_common(DURATION_TABLE_SIZE) if count > 1]
+    index = {duration: i for i, duration in enumerate(table)}
+
+    out = bytearray(struct.pack('<4sBBH', AUDIO_MAGIC, AUDIO_VERSION, len(table), len(events)))
+    out += struct.pack(f'<{len(table)}H', *table)
+    previous = 0
+    for note, duration in events:
+        lo = index.get(duration, VARINT)
+        if note and previous and abs(note - previous) <= 7:
+            out.append((note - previous + 8) << 4 | lo)
+            previous = note
+        elif note == 0 and lo != VARINT:
+            out.append(lo)
+        else:
+            # Literal: absolute note, duration always as a varint
+            out += bytes((VARINT, note))
+            lo = VARINT
+            previous = note or previous
+        if lo == VARINT:
+            out += varint(duration)
+    return bytes(out)
+
+def write_binary_file(notes, output_path, legacy=False):
+    """
+    Writes the processed notes to a binary file and returns its size.
+    legacy: '<HH' (frequency, duration) pairs instead of the compact format.
+    """
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
+
     with open(output_path, 'wb') as f:
-        for freq, duration in notes:
-            f.write(struct.pack('<HH', int(freq), int(duration)))
+        if not legacy:
+            f.write(encode_audio(notes))
+        else:
+            for note, duration in notes:
+                # Clamp values to 16-bit range
+                freq = max(0, min(20000, round(midi_to_hz(note))))
+                f.write(struct.pack('<HH', freq, max(0, min(60000, int(duration)))))
 
     return os.path.getsize(output_path)
 
+def load_batch(source, out_dir, defaults):
+    """
+    Conversion jobs from a directory of MIDI files (recursive), or a JSON manifest:
+
+        [
+            "songs/a.mid",
+            {"file": "songs/b.mid", "track": 2, "key": 12, "bpm": 140, "length": 64, "output": "b.bin"}
+        ]
+
+    File paths in a manifest are relative to the manifest. Entries override defaults (track, key, bpm, length).
+    Outputs mirror the source directory layout under out_dir.
+    """
+    if os.path.isdir(source):
+        base = source
+        entries = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            entries += [os.path.relpath(os.path.join(root, f), source) for f in sorted(files)
+                        if f.lower().endswith(('.mid', '.midi'))]
+    else:
+        base = os.path.dirname(source)
+        with open(source, encoding='utf-8') as f:
+            entries = json.load(f)
+
+    jobs = []
+    for entry in entries:
+        job = dict(defaults)
+        job.update({'file': entry} if isinstance(entry, str) else entry)
+        output = job.pop('output', None) or os.path.splitext(job['file'])[0] + '.bin'
+        job['output'] = os.path.join(out_dir, output)
+        job['file'] = os.path.join(base, job['file'])
+        jobs.append(job)
+    return jobs
+
+def convert_job(job):
+    """
+    Batch worker: converts one file without prompts, the melody track is picked unless given.
+    Returns the report entry.
+    """
+    report = {'file': job['file'], 'output': job['output'], 'track': job['track']}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            mid = mido.MidiFile(job['file'])
+            tracks_info = analyze_tracks(mid)
+            track = job['track'] if job['track'] is not None else pick_melody_track(tracks_info)
+            if track is None:
+                raise ValueError("No track with notes")
+            error = track_error(tracks_info, track)
+            if error is not None:
+                raise ValueError(error)
+            notes = process_track(mid, track, job['key'], job['bpm'], job['length'])
+            if not notes:
+                raise ValueError(f"No processable note events in track {track}")
+            size = write_binary_file(notes, job['output'], job['legacy'])
+    except Exception as e:
+        report['error'] = str(e) or type(e).__name__
+        return report
+
+    info = tracks_info[track]
+    report.update({
+        'track': track,
+        'track_name': info['name'],
+        'score': round(info['score'], 3),
+        'auto': job['track'] is None,
+        'notes': len(notes),
+        'duration_ms': sum(duration for _, duration in notes),
+        'max_hz': round(midi_to_hz(max(note for note, _ in notes))),
+        'bytes': size,
+    })
+    return report
+
+def run_batch(source, out_dir, transpose=0, target_bpm=None, max_beats=None, jobs=None, report_path=None, legacy=False,
+              track=None):
+    """
+    Converts every file of a directory or manifest in parallel, and writes a JSON report.
+    track: Track of every file without a track in the manifest. None: Picked by melody score.
+    """
+    batch = load_batch(source, out_dir, {'track': track, 'key': transpose, 'bpm': target_bpm, 'length': max_beats,
+                                         'legacy': legacy})
+    if not batch:
+        print(f"Error: No MIDI files in '{source}'")
+        return False
+
+    print(f"Converting {len(batch)} files...")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(convert_job, batch))
+
+    for r in results:
+        if 'error' in r:
+            print(f"FAILED  {r['file']}: {r['error']}")
+        else:
+            print(f"OK      {r['file']} -> {r['output']} (track {r['track']} '{r['track_name']}'"
+                  f"{' auto' if r['auto'] else ''}, {r['notes']} notes, {r['duration_ms'] / 1000:.1f} s, {r['bytes']} bytes)")
+
+    report_path = report_path or os.path.join(out_dir, 'report.json')
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    failed = sum(1 for r in results if 'error' in r)
+    print(f"Report: {report_path} ({len(results) - failed} converted, {failed} failed)")
+    return failed == 0
+
 def main():
     """Main function to parse arguments and run the converter."""
     parser = argparse.ArgumentParser(
@@ -195,7 +469,7 @@ def main():
     )
     parser.add_argument(
         "midi_file",
-        help="Path to the input MIDI file."
+        help="Path to the input MIDI file.\nA directory or a JSON manifest converts every file in batch mode."
     )
     parser.add_argument(
         "-k", "--key",
@@ -215,9 +489,43 @@ def main():
         default=None,
         help="Limit the conversion to a specific number of beats (e.g., 120 or 100.25)."
     )
+    parser.add_argument(
+        "-t", "--track",
+        type=int,
+        default=None,
+        help="Track number to convert, instead of prompting.\nBatch mode: Track of the files without a track in the manifest (default: picked by melody score)."
+    )
+    parser.add_argument(
+        "--legacy",
+        action="store_true",
+        help="Write '<HH' (frequency, duration) pairs instead of the compact format."
+    )
+    parser.add_argument(
+        "-o", "--out-dir",
+        default=None,
+        help="Batch mode: Output directory of the .bin files (default: [script path]/bin)."
+    )
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=None,
+        help="Batch mode: Number of worker processes (default: number of CPUs)."
+    )
+    parser.add_argument(
+        "--report",
+        default=None,
+        help="Batch mode: Path of the JSON report (default: [out-dir]/report.json)."
+    )
     args = parser.parse_args()
 
-    processed_notes, original_filename = analyze_and_process_midi(args.midi_file, args.key, args.bpm, args.length)
+    if os.path.isdir(args.midi_file) or args.midi_file.lower().endswith('.json'):
+        out_dir = args.out_dir or os.path.join(os.path.dirname(os.path.realpath(__file__)), 'bin')
+        if not run_batch(args.midi_file, out_dir, args.key, args.bpm, args.length, args.jobs, args.report, args.legacy,
+                         args.track):
+            raise SystemExit(1)
+        return
+
+    processed_notes, original_filename = analyze_and_process_midi(args.midi_file, args.key, args.bpm, args.length, args.track)
 
     if processed_notes:
         script_dir = os.path.dirname(os.path.realpath(__file__))
@@ -234,11 +542,11 @@ def main():
         print("\n--- Writing output files ---")
 
         # Write file 1
-        file_size1 = write_binary_file(processed_notes, path1)
+        file_size1 = write_binary_file(processed_notes, path1, args.legacy)
         print(f"1. File created: {path1} ({file_size1} bytes)")
 
         # Write file 2
-        file_size2 = write_binary_file(processed_notes, path2)
+        file_size2 = write_binary_file(processed_notes, path2, args.legacy)
         print(f"2. File created: {path2} ({file_size2} bytes)")
 
         print("--- Success! ---")
@@ -7,15 +7,25 @@ MicroPython development tool.
 This tool provides functionalities for:
 1. Setting up the development environment using pyenv.
 2. Flashing the MicroPython firmware to an ESP32 device.
-3. Uploading project scripts to the device.
+3. Uploading project scripts to the device (precompiled to .mpy with mpy-cross),
+   or syncing only the changed ones over a single raw REPL session.
 4. Formatting the device's filesystem.
 """
 
 import os
+import re
 import sys
+import json
 import subprocess
 import argparse
 import shutil
+import tempfile
+import time
+import base64
+import hashlib
+import glob
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # ==============================================================================
 # Global Configuration
@@ -24,8 +34,27 @@ PROJECT_NAME = "hololive"
 FIRMWARE_RELEASE = "https://micropython.org/resources/firmware/ESP32_GENERIC_S2-20250911-v1.26.1.bin"
 SERIAL_PORT = None
 DEBUG = False
+MPY_CROSS_ARCH = "xtensawin" # ESP32/ESP32-S2 (Xtensa). Required by the @micropython.viper code of spwm.py
 # ==============================================================================
 
+# .mpy bytecode (version, sub-version) per MicroPython release (major, minor).
+# Bytecode only needs the version, native/viper code needs the sub-version as well.
+MPY_VERSIONS = {
+    (1, 19): (6, 0),
+    (1, 20): (6, 1), (1, 21): (6, 1),
+    (1, 22): (6, 2),
+    (1, 23): (6, 3), (1, 24): (6, 3), (1, 25): (6, 3), (1, 26): (6, 3),
+}
+
+# Kept as source: MicroPython only runs boot.py/main.py at startup, never .mpy files
+LOADER_FILE = "boot.py"
+LOADER_CODE = """
+# --- Added by mpy_tool.py upload: runs the precompiled main.mpy ---
+if __name__ == '__main__':
+    import main
+    main.main()
+"""
+
 class MockProcessResult:
     """A mock result object for dry runs to mimic subprocess.CompletedProcess."""
     def __init__(self, stdout='', stderr='', returncode=0):
@@ -135,22 +164,7 @@ def flash_firmware(port, baud="460800"):
         print("Error: Serial port must be provided via argument or SERIAL_PORT variable.", file=sys.stderr)
         sys.exit(1)
 
-    firmware_filename = FIRMWARE_RELEASE.split('/')[-1]
-    bin_files = [f for f in os.listdir('.') if f.endswith('.bin')]
-    if firmware_filename not in bin_files:
-        if DEBUG:
-            print("[DRY RUN] Would download firmware.")
-            bin_files.append("firmware.bin") # mock file
-        else:
-            print(f"No .bin file found. Downloading from {FIRMWARE_RELEASE}...")
-            curl_command = ["curl", "-L", "-o", firmware_filename, FIRMWARE_RELEASE]
-            if not run_command(curl_command):
-                print(f"Error downloading firmware.", file=sys.stderr)
-                sys.exit(1)
-            bin_files.append(firmware_filename)
-            print(f"Downloaded '{firmware_filename}'")
-    firmware_path = firmware_filename
-    print(f"Using firmware: {firmware_path}")
+    firmware_path = download_firmware()
 
     print("Erasing flash...")
     input('Make sure the target board is in bootloader mode, and press enter...')
@@ -173,12 +187,241 @@ def flash_firmware(port, baud="460800"):
     print("Firmware flashing complete.")
 
 
-def upload_scripts(path, port):
+def download_firmware():
+    """Downloads FIRMWARE_RELEASE if not present. Returns the file name."""
+    firmware_filename = FIRMWARE_RELEASE.split('/')[-1]
+    bin_files = [f for f in os.listdir('.') if f.endswith('.bin')]
+    if firmware_filename not in bin_files:
+        if DEBUG:
+            print("[DRY RUN] Would download firmware.")
+            bin_files.append("firmware.bin") # mock file
+        else:
+            print(f"No .bin file found. Downloading from {FIRMWARE_RELEASE}...")
+            curl_command = ["curl", "-L", "-o", firmware_filename, FIRMWARE_RELEASE]
+            if not run_command(curl_command):
+                print(f"Error downloading firmware.", file=sys.stderr)
+                sys.exit(1)
+            bin_files.append(firmware_filename)
+            print(f"Downloaded '{firmware_filename}'")
+    print(f"Using firmware: {firmware_filename}")
+    return firmware_filename
+
+
+def write_firmware(port, firmware_path, baud="460800"):
     """
-    Recursively uploads whitelisted files from a given path to the device.
+    Erases the flash and writes the firmware without prompts.
+    esptool enters the bootloader itself (DTR/RTS, or a USB-CDC reset on native USB),
+    and resets the device into the new firmware when done.
     """
-    check_venv()
-    print("--- Uploading scripts ---")
+    print("Erasing flash and writing firmware...")
+    write_command = [
+        "esptool.py", "--port", port, "--baud", baud, "--before", "default_reset", "--after", "hard_reset",
+        "write_flash", "--erase-all", "0x1000", firmware_path
+    ]
+    if not run_command(write_command):
+        print("Error writing firmware. Please check the connection and try again.", file=sys.stderr)
+        sys.exit(1)
+    print("Firmware flashing complete.")
+
+
+def firmware_version():
+    """(major, minor) of the MicroPython release in FIRMWARE_RELEASE."""
+    match = re.search(r"-v(\d+)\.(\d+)(?:\.\d+)?(?:-[\w.]+)?\.bin$", FIRMWARE_RELEASE)
+    if not match:
+        print(f"Error: Cannot read the MicroPython version from FIRMWARE_RELEASE: {FIRMWARE_RELEASE}", file=sys.stderr)
+        sys.exit(1)
+    return int(match.group(1)), int(match.group(2))
+
+
+def check_mpy_cross():
+    """
+    Checks that mpy-cross emits the .mpy version of the firmware in FIRMWARE_RELEASE.
+    Returns the expected (version, sub-version).
+    """
+    release = firmware_version()
+    expected = MPY_VERSIONS.get(release)
+    if expected is None:
+        print(f"Error: Unknown .mpy version of MicroPython v{release[0]}.{release[1]}. Add it to MPY_VERSIONS.", file=sys.stderr)
+        sys.exit(1)
+
+    result = run_command(["mpy-cross", "--version"], check=False)
+    if not result or result.returncode != 0:
+        print("Error: mpy-cross not found. Run 'python mpy_tool.py setup' or 'pip install mpy-cross'.", file=sys.stderr)
+        sys.exit(1)
+    if DEBUG:
+        return expected
+
+    # e.g. "MicroPython v1.26.1 on 2025-09-11; mpy-cross emitting mpy v6.3"
+    match = re.search(r"emitting mpy v(\d+)(?:\.(\d+))?", result.stdout)
+    if not match:
+        print(f"Error: Unexpected mpy-cross version output: {result.stdout.strip()}", file=sys.stderr)
+        sys.exit(1)
+    emitted = (int(match.group(1)), int(match.group(2) or 0))
+    if emitted != expected:
+        print(f"Error: mpy-cross emits mpy v{emitted[0]}.{emitted[1]}, but the firmware "
+              f"(MicroPython v{release[0]}.{release[1]}) loads mpy v{expected[0]}.{expected[1]}.", file=sys.stderr)
+        print(f"Install the matching compiler: pip install 'mpy-cross~={release[0]}.{release[1]}.0'", file=sys.stderr)
+        sys.exit(1)
+    return expected
+
+
+def check_mpy_header(mpy_path, expected):
+    """Checks the version of a compiled .mpy file (header: 'M', version, features)."""
+    if DEBUG:
+        return
+    with open(mpy_path, 'rb') as f:
+        header = f.read(4)
+    if len(header) < 4 or header[0] != ord('M') or header[1] != expected[0]:
+        print(f"Error: {mpy_path} is not a mpy v{expected[0]} file.", file=sys.stderr)
+        sys.exit(1)
+    sub_version = header[2] & 0x03
+    if sub_version != expected[1]:
+        print(f"Error: {mpy_path} is mpy v{expected[0]}.{sub_version}, expected v{expected[0]}.{expected[1]}.", file=sys.stderr)
+        sys.exit(1)
+
+
+def compile_sources(path, out_dir, expected):
+    """
+    Compiles every .py file under path with mpy-cross into out_dir (same layout).
+    The loader (boot.py) is copied as source with the code that runs main.mpy.
+    Returns [(local file, device path), ...] to upload.
+    """
+    files = []
+    for root, dirs, filenames in os.walk(path):
+        dirs[:] = [d for d in dirs if d != '__pycache__']
+        for filename in sorted(filenames):
+            if not filename.endswith('.py'):
+                continue
+            local_path = os.path.join(root, filename)
+            device_path = os.path.relpath(local_path, path).replace(os.sep, '/')
+            if device_path == LOADER_FILE:
+                out_path = os.path.join(out_dir, LOADER_FILE)
+                with open(local_path, encoding='utf-8') as src, open(out_path, 'w', encoding='utf-8') as dst:
+                    dst.write(src.read().rstrip('\n') + '\n' + LOADER_CODE)
+                files.append((out_path, device_path))
+                continue
+            mpy_device_path = device_path[:-3] + '.mpy'
+            out_path = os.path.join(out_dir, mpy_device_path)
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+            print(f"Compiling {local_path}...")
+            command = ["mpy-cross", f"-march={MPY_CROSS_ARCH}", "-s", device_path, "-o", out_path, local_path]
+            if not run_command(command):
+                print(f"Error compiling {local_path}.", file=sys.stderr)
+                sys.exit(1)
+            check_mpy_header(out_path, expected)
+            files.append((out_path, mpy_device_path))
+    return files
+
+
+def run_on_device(port, code):
+    """Runs code on the device (ampy run) and returns its output, or None on failure."""
+    with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False, encoding='utf-8') as f:
+        f.write(code)
+        script = f.name
+    try:
+        result = run_command(["ampy", "-p", port, "run", script], check=False)
+    finally:
+        os.remove(script)
+    if not result or result.returncode != 0:
+        return None
+    return result.stdout
+
+
+# Prints the .mpy version the firmware loads (version | sub-version << 8 | arch << 10)
+MPY_VERSION_CODE = "import sys\nprint(getattr(sys.implementation, '_mpy', 0))\n"
+
+
+def check_device_mpy(output, expected):
+    """Checks the .mpy version the firmware on the device loads. output: of MPY_VERSION_CODE."""
+    if DEBUG or output is None:
+        if output is None:
+            print("Warning: Could not read the .mpy version of the device.", file=sys.stderr)
+        return
+    value = int(output.strip().splitlines()[-1] or 0)
+    device = (value & 0xFF, (value >> 8) & 0x03)
+    if device != expected:
+        print(f"Error: The device loads mpy v{device[0]}.{device[1]}, compiled files are v{expected[0]}.{expected[1]}. "
+              f"Flash the firmware of FIRMWARE_RELEASE, or upload with --source.", file=sys.stderr)
+        sys.exit(1)
+
+
+# Imports main (and every module it imports) from the given directory first, and prints
+# the import time and heap use as JSON. boot is imported before, it connects Wi-Fi.
+MEASURE_CODE = """
+import gc, sys, time
+import boot
+result = {}
+for label, path in (('source', '/_src'), ('mpy', '')):
+    for name in list(sys.modules):
+        if name != 'boot':
+            del sys.modules[name]
+    sys.path.insert(0, path)
+    gc.collect()
+    free = gc.mem_free()
+    start = time.ticks_ms()
+    import main
+    elapsed = time.ticks_diff(time.ticks_ms(), start)
+    allocated = free - gc.mem_free()
+    gc.collect()
+    result[label] = {'ms': elapsed, 'allocated': allocated, 'retained': free - gc.mem_free()}
+    del main
+    sys.path.pop(0)
+print(result)
+"""
+
+
+def measure_startup(path, port):
+    """
+    Uploads the sources to /_src temporarily, and compares importing them with the .mpy files.
+    Prints the startup time and heap saved.
+    """
+    print("--- Measuring startup ---")
+    run_command(["ampy", "-p", port, "mkdir", "--exists-okay", "/_src"], check=False)
+    for name in sorted(os.listdir(path)):
+        if name.endswith('.py') and name != LOADER_FILE:
+            run_command(["ampy", "-p", port, "put", os.path.join(path, name), f"/_src/{name}"])
+    output = run_on_device(port, MEASURE_CODE)
+    run_command(["ampy", "-p", port, "rmdir", "/_src"], check=False)
+    if DEBUG:
+        return
+    if output is None:
+        print("Warning: Startup measurement failed.", file=sys.stderr)
+        return
+    try:
+        result = json.loads(output.strip().splitlines()[-1].replace("'", '"'))
+    except ValueError:
+        print(f"Warning: Unexpected measurement output: {output.strip()}", file=sys.stderr)
+        return
+    source, mpy = result['source'], result['mpy']
+    print(f"{'':<10} {'import ms':>10} {'allocated':>10} {'retained':>10}")
+    for label, values in (('source', source), ('mpy', mpy)):
+        print(f"{label:<10} {values['ms']:>10} {values['allocated']:>10} {values['retained']:>10}")
+    print(f"Saved: {source['ms'] - mpy['ms']} ms at startup, "
+          f"{source['allocated'] - mpy['allocated']} bytes of heap allocated while importing, "
+          f"{source['retained'] - mpy['retained']} bytes retained.")
+
+
+def collect_uploads(path, out_dir, compile, expected=None):
+    """
+    Files to upload: whitelisted files under path, with .py files compiled into out_dir if compile is True.
+    Returns [(local file, device path), ...].
+    """
+    whitelist = ['.py', '.mpy', '.pyc', '.pyo', '.json', '.txt', '.bin']
+
+    uploads = compile_sources(path, out_dir, expected) if compile else []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if d != '__pycache__'] # CPython bytecode
+        for filename in files:
+            if compile and filename.endswith('.py'):
+                continue
+            if any(filename.endswith(ext) for ext in whitelist):
+                local_path = os.path.join(root, filename)
+                uploads.append((local_path, os.path.relpath(local_path, path).replace(os.sep, '/')))
+    return uploads
+
+
+def check_upload_args(path, port):
+    """Returns the serial port to use. Exits if the port or path is not valid."""
     if SERIAL_PORT:
         port = SERIAL_PORT
     if not port:
@@ -188,23 +431,326 @@ def upload_scripts(path, port):
     if not os.path.isdir(path):
         print(f"Error: Path '{path}' is not a valid directory.", file=sys.stderr)
         sys.exit(1)
+    return port
 
-    whitelist = ['.py', '.pyc', '.pyo', '.json', '.txt', '.bin']
-    
-    for root, _, files in os.walk(path):
-        for filename in files:
-            if any(filename.endswith(ext) for ext in whitelist):
-                local_path = os.path.join(root, filename)
-                device_path = os.path.relpath(local_path, path)
-                print(f"Uploading {local_path} to /{device_path}...")
-                run_command(["ampy", "-p", port, "put", local_path, device_path])
+
+def upload_scripts(path, port, compile=True, measure=False):
+    """
+    Recursively uploads whitelisted files from a given path to the device.
+    .py files are precompiled to .mpy unless compile is False.
+    """
+    check_venv()
+    print("--- Uploading scripts ---")
+    port = check_upload_args(path, port)
+
+    with tempfile.TemporaryDirectory(prefix='mpy-') as out_dir:
+        expected = None
+        if compile:
+            expected = check_mpy_cross()
+            check_device_mpy(run_on_device(port, MPY_VERSION_CODE), expected)
+        uploads = collect_uploads(path, out_dir, compile, expected)
+
+        for local_path, device_path in uploads:
+            print(f"Uploading {local_path} to /{device_path}...")
+            run_command(["ampy", "-p", port, "put", local_path, device_path])
+            if compile and device_path.endswith('.mpy'):
+                # A .py file of the same name would be imported instead
+                run_command(["ampy", "-p", port, "rm", device_path[:-4] + '.py'], check=False)
+
+    if compile and measure:
+        measure_startup(path, port)
 
     print("Script upload complete.")
 
 
-def format_device(port):
+class RawRepl:
+    """
+    A raw REPL session over the serial port, kept open for any number of exec() calls.
+    Code is sent in raw-paste mode (flow-controlled, no echo) when the firmware supports it
+    (MicroPython v1.14 and later), in 256 byte blocks of the plain raw REPL otherwise.
+    """
+    def __init__(self, port, baud=115200, timeout=10):
+        self._port = port
+        self._baud = baud
+        self._timeout = timeout
+        self._serial = None
+        self._raw_paste = True
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        if DEBUG:
+            print(f"[DRY RUN] Would open raw REPL on {self._port}")
+            return
+        import serial # pyserial, installed with adafruit-ampy
+        self._serial = serial.Serial(self._port, self._baud, timeout=0.1)
+        self._serial.write(b"\r\x03\x03")  # Ctrl-C: stop the running program
+        time.sleep(0.2)
+        self._serial.reset_input_buffer()
+        self._serial.write(b"\r\x01")      # Ctrl-A: raw REPL
+        self._read_until(b"raw REPL; CTRL-B to exit\r\n>")
+
+    def close(self):
+        if self._serial is not None:
+            self._serial.write(b"\x02")     # Ctrl-B: friendly REPL
+            self._serial.close()
+            self._serial = None
+
+    def exec(self, code, timeout=None):
+        """Runs code on the device and returns its output. Raises RuntimeError on an exception."""
+        if DEBUG:
+            return ""
+        data = code.encode('utf-8') if isinstance(code, str) else code
+        if self._raw_paste:
+            self._serial.write(b"\x05A\x01")   # Ctrl-E A Ctrl-A: raw-paste request
+            reply = self._read(2)
+            if reply == b"R\x01":
+                self._paste(data)
+            else:
+                # R\x00: Understood but not supported. Anything else: Older firmware, which echoed the request.
+                if reply != b"R\x00":
+                    self._read_until(b"w REPL; CTRL-B to exit\r\n>")
+                self._raw_paste = False
+        if not self._raw_paste:
+            for i in range(0, len(data), 256):
+                self._serial.write(data[i:i + 256])
+                time.sleep(0.01)
+            self._serial.write(b"\x04")
+            if self._read(2) != b"OK":
+                raise RuntimeError("Could not execute code on the device")
+
+        output = self._read_until(b"\x04", timeout)[:-1]
+        error = self._read_until(b"\x04", timeout)[:-1]
+        self._read_until(b">", timeout) # Prompt for the next exec()
+        if error:
+            raise RuntimeError(error.decode('utf-8', 'replace').strip())
+        return output.decode('utf-8', 'replace')
+
+    def _paste(self, data):
+        window = int.from_bytes(self._read(2), 'little')
+        remaining = window
+        i = 0
+        while i < len(data):
+            while remaining == 0 or self._serial.in_waiting:
+                flow = self._read(1)
+                if flow == b"\x01":     # Device can take another window
+                    remaining += window
+                elif flow == b"\x04":   # Device aborted (e.g. syntax error): acknowledge
+                    self._serial.write(b"\x04")
+                    return
+                else:
+                    raise RuntimeError(f"Unexpected data from the device during raw paste: {flow!r}")
+            block = data[i:i + remaining]
+            self._serial.write(block)
+            remaining -= len(block)
+            i += len(block)
+        self._serial.write(b"\x04")
+        self._read_until(b"\x04")       # End of data acknowledged, compiled
+
+    def _read(self, size):
+        data = b""
+        deadline = time.monotonic() + self._timeout
+        while len(data) < size:
+            data += self._serial.read(size - len(data))
+            if len(data) < size and time.monotonic() > deadline:
+                raise TimeoutError(f"No response from the device on {self._port}")
+        return data
+
+    def _read_until(self, ending, timeout=None):
+        data = b""
+        deadline = time.monotonic() + (timeout or self._timeout)
+        while not data.endswith(ending):
+            chunk = self._serial.read(1)
+            if chunk:
+                data += chunk
+            elif time.monotonic() > deadline:
+                raise TimeoutError(f"No response from the device on {self._port}: {data[-80:]!r}")
+        return data
+
+
+SYNC_CHUNK_SIZE = 4096 # Bytes per write on the device (sent as base64)
+
+# Helpers defined on the device once per sync session
+SYNC_PRELUDE = """
+import os, hashlib, binascii, json
+def _hash(p):
+    try:
+        h = hashlib.sha256()
+        b = bytearray(1024)
+        m = memoryview(b)
+        with open(p, 'rb') as f:
+            while True:
+                n = f.readinto(b)
+                if not n:
+                    break
+                h.update(m[:n])
+        return binascii.hexlify(h.digest()).decode()
+    except OSError:
+        return None
+def _mkdirs(p):
+    d = ''
+    for part in p.split('/')[:-1]:
+        d += '/' + part
+        try:
+            os.mkdir(d)
+        except OSError:
+            pass
+def _replace(tmp, p):
+    try:
+        os.remove(p)
+    except OSError:
+        pass
+    os.rename(tmp, p)
+def _rm(p):
+    try:
+        os.remove(p)
+        return 1
+    except OSError:
+        return 0
+"""
+
+
+def file_hash(local_path):
+    if DEBUG and not os.path.exists(local_path):
+        return None # Not compiled in a dry run
+    with open(local_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def device_hashes(repl, device_paths):
+    """{device path: sha256 hex or None (missing)} computed on the device."""
+    if DEBUG:
+        return {p: "" for p in device_paths} # Everything is sent in a dry run
+    output = repl.exec(f"print(json.dumps([_hash(p) for p in {['/' + p for p in device_paths]!r}]))")
+    return dict(zip(device_paths, json.loads(output)))
+
+
+def write_device_file(repl, local_path, device_path):
+    """Writes a file through the raw REPL. Written to a temporary file first, so it is never left half-written."""
+    if DEBUG:
+        return 0
+    with open(local_path, 'rb') as f:
+        data = f.read()
+    target = '/' + device_path
+    repl.exec(f"_mkdirs({target!r})\n_f = open({target + '.part'!r}, 'wb')")
+    try:
+        for i in range(0, len(data), SYNC_CHUNK_SIZE):
+            chunk = base64.b64encode(data[i:i + SYNC_CHUNK_SIZE])
+            repl.exec(f"_f.write(binascii.a2b_base64({chunk!r}))")
+    finally:
+        repl.exec("_f.close()")
+    repl.exec(f"_replace({target + '.part'!r}, {target!r})")
+    return len(data)
+
+
+def sync_scripts(path, port, compile=True):
+    """
+    Incremental upload over a single raw REPL session.
+    Content hashes of the files on the device are compared with the local files (manifest),
+    and only the changed files are sent.
+    """
+    check_venv()
+    print("--- Syncing scripts ---")
+    port = check_upload_args(path, port)
+    start = time.monotonic()
+
+    with tempfile.TemporaryDirectory(prefix='mpy-') as out_dir, RawRepl(port) as repl:
+        expected = None
+        if compile:
+            expected = check_mpy_cross()
+            check_device_mpy(repl.exec(MPY_VERSION_CODE), expected)
+        uploads = collect_uploads(path, out_dir, compile, expected)
+        sync_files(repl, uploads, compile)
+
+    print(f"Script sync complete ({time.monotonic() - start:.1f} s).")
+
+
+def sync_files(repl, uploads, compile):
+    """
+    Sends the files of uploads (see collect_uploads) whose hash differs on the device.
+    Returns (files sent, bytes sent).
+    """
+    manifest = {device_path: file_hash(local_path) for local_path, device_path in uploads}
+    repl.exec(SYNC_PRELUDE)
+    on_device = device_hashes(repl, list(manifest))
+    changed = [(local_path, device_path) for local_path, device_path in uploads
+               if on_device.get(device_path) != manifest[device_path]]
+
+    sent = 0
+    for local_path, device_path in changed:
+        print(f"Sending {local_path} to /{device_path}...")
+        sent += write_device_file(repl, local_path, device_path)
+
+    removed = []
+    if compile:
+        # A .py file of the same name would be imported instead of the .mpy file
+        twins = ['/' + p[:-4] + '.py' for p in manifest if p.endswith('.mpy')]
+        if twins and not DEBUG:
+            removed = json.loads(repl.exec(f"print(json.dumps([p for p in {twins!r} if _rm(p)]))"))
+
+    if changed:
+        verified = device_hashes(repl, [device_path for _, device_path in changed])
+        broken = [p for p, h in verified.items() if not DEBUG and h != manifest[p]]
+        if broken:
+            print(f"Error: Hash mismatch after writing: {', '.join(broken)}", file=sys.stderr)
+            sys.exit(1)
+
+    print(f"{len(changed)} of {len(manifest)} files sent ({sent} bytes), {len(manifest) - len(changed)} unchanged"
+          + (f", removed {', '.join(removed)}" if removed else "") + ".")
+    return len(changed), sent
+
+
+# Removes everything under / in one call. Prints {'files', 'dirs', 'bytes', 'errors', 'free'} as JSON.
+FORMAT_CODE = """
+import os, json
+def _wipe(d, s):
+    for e in list(os.ilistdir(d)):
+        p = d.rstrip('/') + '/' + e[0]
+        try:
+            if e[1] & 0x4000:
+                _wipe(p, s)
+                os.rmdir(p)
+                s['dirs'].append(p)
+            else:
+                os.remove(p)
+                s['files'].append(p)
+                s['bytes'] += e[3] if len(e) > 3 else 0
+        except OSError as x:
+            s['errors'].append(p + ': ' + str(x))
+_s = {'files': [], 'dirs': [], 'bytes': 0, 'errors': []}
+_wipe('/', _s)
+_v = os.statvfs('/')
+_s['free'] = _v[0] * _v[3]
+print(json.dumps(_s))
+"""
+
+# Recreates the littlefs filesystem of the 'vfs' partition. Prints {'used', 'free'} (bytes before and after) as JSON.
+MKFS_CODE = """
+import os, json, esp32
+try:
+    import vfs
+except ImportError:
+    vfs = os # Before v1.23
+_v = os.statvfs('/')
+_used = _v[0] * (_v[2] - _v[3])
+_b = esp32.Partition.find(esp32.Partition.TYPE_DATA, label='vfs')[0]
+vfs.umount('/')
+vfs.VfsLfs2.mkfs(_b)
+vfs.mount(vfs.VfsLfs2(_b), '/')
+_v = os.statvfs('/')
+print(json.dumps({'used': _used, 'free': _v[0] * _v[3]}))
+"""
+
+
+def format_device(port, mkfs=False):
     """
-    Removes all files and directories from the device's root filesystem.
+    Removes all files and directories from the device's root filesystem, over a single raw REPL session.
+    mkfs: Recreates the filesystem instead of removing files one by one.
     """
     check_venv()
     print("--- Formatting device filesystem ---")
@@ -214,51 +760,165 @@ def format_device(port):
         print("Error: Serial port must be provided via argument or SERIAL_PORT variable.", file=sys.stderr)
         sys.exit(1)
 
-    def list_files_recursive(path):
-        """Recursively list all files and dirs on device."""
-        result = run_command(["ampy", "-p", port, "ls", path], check=False)
-        if not result or result.returncode != 0:
-            return [], []
-
-        entries = result.stdout.strip().split('\n')
-        files, dirs = [], []
-        for entry in entries:
-            entry = entry.strip()
-            if entry:
-                if entry.endswith('/'):
-                     dirs.append(entry)
-                else:
-                    files.append(entry)
-        return files, dirs
+    print("This will delete all files on the device.")
+    start = time.monotonic()
+    with RawRepl(port, timeout=60) as repl:
+        output = repl.exec(MKFS_CODE if mkfs else FORMAT_CODE)
+    if DEBUG:
+        print("Device format complete.")
+        return
+    summary = json.loads(output)
+    elapsed = time.monotonic() - start
+
+    if mkfs:
+        print(f"Filesystem recreated: {summary['used']} bytes in use before, {summary['free']} bytes free, {elapsed:.1f} s.")
+    else:
+        for path in summary['files']:
+            print(f"Removed file: {path}")
+        for path in summary['dirs']:
+            print(f"Removed directory: {path}")
+        print(f"Removed {len(summary['files'])} files ({summary['bytes']} bytes) and {len(summary['dirs'])} directories, "
+              f"{summary['free']} bytes free, {elapsed:.1f} s.")
+        if summary['errors']:
+            print("Error: Could not remove: " + ", ".join(summary['errors']), file=sys.stderr)
+            sys.exit(1)
+    print("Device format complete.")
 
-    def remove_all(path):
-        """Recursively remove files and directories."""
-        files, dirs = list_files_recursive(path)
 
-        for f in files:
-            full_path = f"{path}{f}" if path != "/" else f
-            print(f"Removing file: {full_path}")
-            run_command(["ampy", "-p", port, "rm", full_path])
+_device = threading.local() # Log file of the device a fleet worker thread is handling
 
-        for d in dirs:
-            full_path = f"{path}{d}" if path != "/" else d
-            remove_all(full_path)
 
-    print("This will delete all files on the device. Listing root contents:")
-    # Initial list to show the user what's there
-    run_command(["ampy", "-p", port, "ls", "/"])
+class _ThreadOutput:
+    """sys.stdout/sys.stderr replacement: a fleet worker's output goes to its device log, the rest to the console."""
+    def __init__(self, console):
+        self.console = console
 
-    # Start recursive delete from root
-    remove_all('/')
-    
-    # Finally, remove the directories themselves
-    _, dirs = list_files_recursive('/')
-    for d in sorted(dirs, key=lambda x: x.count('/'), reverse=True):
-         print(f"Removing directory: {d}")
-         run_command(["ampy", "-p", port, "rmdir", d])
+    def write(self, text):
+        log = getattr(_device, 'log', None)
+        return (log or self.console).write(text)
 
+    def flush(self):
+        log = getattr(_device, 'log', None)
+        (log or self.console).flush()
 
-    print("Device format complete.")
+    def __getattr__(self, name):
+        return getattr(self.console, name)
+
+
+FLEET_BOOT_WAIT = 30 # Seconds for a flashed device to reboot and come back on its port
+
+
+def expand_ports(patterns):
+    """Serial ports from names and glob patterns (e.g. /dev/ttyACM*), in order, without duplicates."""
+    ports = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        ports += [port for port in matches if port not in ports]
+    return ports
+
+
+def open_repl(port, wait):
+    """Opens a RawRepl, retrying for wait seconds while the device reboots (USB-CDC ports disappear on reset)."""
+    deadline = time.monotonic() + wait
+    while True:
+        repl = RawRepl(port)
+        try:
+            repl.open()
+            return repl
+        except (OSError, TimeoutError):
+            repl.close()
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1)
+
+
+def provision_device(port, firmware_path, uploads, compile, expected, progress):
+    """Fleet worker: flash and/or sync a device. Raises SystemExit or an exception on failure."""
+    if firmware_path:
+        progress(port, "flash")
+        write_firmware(port, firmware_path)
+    if uploads is not None:
+        progress(port, "sync")
+        repl = open_repl(port, FLEET_BOOT_WAIT if firmware_path else 0)
+        try:
+            if compile:
+                check_device_mpy(repl.exec(MPY_VERSION_CODE), expected)
+            return sync_files(repl, uploads, compile)
+        finally:
+            repl.close()
+    return 0, 0
+
+
+def fleet(patterns, path=None, flash=False, compile=True, jobs=8, log_dir="fleet-logs"):
+    """
+    Flashes and/or syncs many devices at the same time, without prompts.
+    Each device is handled by a worker thread, its output goes to <log_dir>/<port>.log.
+    Prints progress per device, and a pass/fail table at the end. Exits with 1 if any device failed.
+    """
+    check_venv()
+    print("--- Provisioning fleet ---")
+    ports = expand_ports(patterns)
+    if not ports:
+        print("Error: No serial port matches " + ", ".join(patterns), file=sys.stderr)
+        sys.exit(1)
+    if not flash and path is None:
+        print("Error: Nothing to do. Give a script directory to sync, and/or --flash.", file=sys.stderr)
+        sys.exit(1)
+    if path is not None and not os.path.isdir(path):
+        print(f"Error: Path '{path}' is not a valid directory.", file=sys.stderr)
+        sys.exit(1)
+    os.makedirs(log_dir, exist_ok=True)
+
+    # Shared by every device: downloaded and compiled once
+    firmware_path = download_firmware() if flash else None
+    with tempfile.TemporaryDirectory(prefix='mpy-') as out_dir:
+        uploads = expected = None
+        if path is not None:
+            if compile:
+                expected = check_mpy_cross()
+            uploads = collect_uploads(path, out_dir, compile, expected)
+
+        console = sys.stdout
+        lock = threading.Lock()
+
+        def progress(port, message):
+            with lock:
+                console.write(f"[{port}] {message}\n")
+                console.flush()
+
+        def worker(port):
+            log_path = os.path.join(log_dir, re.sub(r"[^\w.-]", "_", port.strip("/")) + ".log")
+            start = time.monotonic()
+            with open(log_path, "w", encoding="utf-8") as log:
+                _device.log = log
+                try:
+                    files, sent = provision_device(port, firmware_path, uploads, compile, expected, progress)
+                    result = ("PASS", f"{files} files, {sent} bytes" if uploads is not None else "")
+                except SystemExit:
+                    result = ("FAIL", "see log")
+                except Exception as e:
+                    print(f"Error: {e!r}", file=sys.stderr)
+                    result = ("FAIL", str(e) or type(e).__name__)
+                finally:
+                    _device.log = None
+            progress(port, f"{result[0]} ({time.monotonic() - start:.1f} s)")
+            return (port,) + result + (time.monotonic() - start, log_path)
+
+        sys.stdout, sys.stderr = _ThreadOutput(sys.stdout), _ThreadOutput(sys.stderr)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+                results = list(pool.map(worker, ports))
+        finally:
+            sys.stdout, sys.stderr = sys.stdout.console, sys.stderr.console
+
+    width = max(len("port"), max(len(port) for port in ports))
+    print(f"\n{'port':<{width}}  result  {'time':>7}  detail")
+    for port, status, detail, elapsed, log_path in results:
+        print(f"{port:<{width}}  {status:<6}  {elapsed:>6.1f}s  {detail} ({log_path})")
+    failed = sum(1 for result in results if result[1] != "PASS")
+    print(f"{len(results) - failed} passed, {failed} failed.")
+    if failed:
+        sys.exit(1)
 
 
 def main():
@@ -277,10 +937,30 @@ def main():
     upload_parser = subparsers.add_parser("upload", help="Upload scripts to the device.")
     upload_parser.add_argument("path", help="Path to the script directory to upload.")
     upload_parser.add_argument("-p", "--port", help="Serial port of the device.")
+    upload_parser.add_argument("--source", action="store_true", help="Upload .py files as is, without mpy-cross.")
+    upload_parser.add_argument("--measure", action="store_true",
+                               help="Measure the startup time and heap saved by the .mpy files on the device.")
+
+    # Sync mode
+    sync_parser = subparsers.add_parser("sync", help="Upload only the changed scripts, over a single raw REPL session.")
+    sync_parser.add_argument("path", help="Path to the script directory to upload.")
+    sync_parser.add_argument("-p", "--port", help="Serial port of the device.")
+    sync_parser.add_argument("--source", action="store_true", help="Upload .py files as is, without mpy-cross.")
+
+    # Fleet mode
+    fleet_parser = subparsers.add_parser("fleet", help="Flash and/or sync many devices in parallel, without prompts.")
+    fleet_parser.add_argument("path", nargs="?", help="Path to the script directory to sync. Omit to flash only.")
+    fleet_parser.add_argument("-p", "--port", action="append", required=True,
+                              help="Serial port or glob (e.g. '/dev/ttyACM*'). Can be repeated.")
+    fleet_parser.add_argument("--flash", action="store_true", help="Erase and flash the firmware before syncing.")
+    fleet_parser.add_argument("--source", action="store_true", help="Upload .py files as is, without mpy-cross.")
+    fleet_parser.add_argument("-j", "--jobs", type=int, default=8, help="Devices handled at the same time.")
+    fleet_parser.add_argument("--log-dir", default="fleet-logs", help="Directory of the per-device logs.")
 
     # Format mode
     format_parser = subparsers.add_parser("format", help="Format the device's filesystem.")
     format_parser.add_argument("-p", "--port", help="Serial port of the device.")
+    format_parser.add_argument("--mkfs", action="store_true", help="Recreate the filesystem instead of removing the files.")
 
     args = parser.parse_args()
 
@@ -289,9 +969,13 @@ def main():
     elif args.mode == "flash":
         flash_firmware(args.port)
     elif args.mode == "upload":
-        upload_scripts(args.path, args.port)
+        upload_scripts(args.path, args.port, compile=not args.source, measure=args.measure)
+    elif args.mode == "sync":
+        sync_scripts(args.path, args.port, compile=not args.source)
+    elif args.mode == "fleet":
+        fleet(args.port, args.path, flash=args.flash, compile=not args.source, jobs=args.jobs, log_dir=args.log_dir)
     elif args.mode == "format":
-        format_device(args.port)
+        format_device(args.port, mkfs=args.mkfs)
     else:
         parser.print_help()
 
@@ -0,0 +1,24 @@
+"""
+Host-side simulator of the lamp.
+
+Runs src/ on CPython with stand-ins for the MicroPython-only modules
+(machine, network, ntptime, micropython, time, socket, ssl) on a virtual clock.
+Days of device time run in seconds.
+
+    from simulator import Simulator, Stream
+
+    sim = Simulator(start_epoch, {'channelId': ['UCxxxx']})
+    sim.scenario.add(Stream('videoid', 'UCxxxx', scheduled=start_epoch + 3600, actual=start_epoch + 3700))
+    sim.boot()
+    sim.run(6 * 3600)
+"""
+
+from .clock import VirtualClock
+from .net import Network, ScriptedHost, Request
+from .scenario import Scenario, Stream, iso
+from .stubs import Device
+from .trace import Trace, TraceScenario
+from .runner import Simulator, DEFAULT_CONFIG, SRC_DIR
+
+__all__ = ['VirtualClock', 'Network', 'ScriptedHost', 'Request', 'Scenario', 'Stream', 'iso',
+           'Device', 'Trace', 'TraceScenario', 'Simulator', 'DEFAULT_CONFIG', 'SRC_DIR']
@@ -0,0 +1,43 @@
+"""
+Demo: a day with two channels.
+
+    cd tool
+    python -m simulator [--days N] [--verbose]
+"""
+
+import argparse
+import calendar
+import time
+
+from . import Simulator, Stream, iso
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the lamp on a virtual clock.')
+    parser.add_argument('--start', default='2025-01-06T00:00:00', help='Power on time in UTC')
+    parser.add_argument('--days', type=float, default=1.0, help='Simulated days')
+    parser.add_argument('--no-youtube', action='store_true', help='Holodex-only polling')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print the log of main.py')
+    args = parser.parse_args()
+
+    start = calendar.timegm(time.strptime(args.start, '%Y-%m-%dT%H:%M:%S'))
+    config = {'channelId': ['UC_A', 'UC_B'], 'enable_youtube_api': not args.no_youtube}
+    sim = Simulator(start, config, verbose=args.verbose)
+    for day in range(int(args.days + 0.999)):
+        base = start + day * 86400
+        sim.scenario.add(Stream(f'a{day}', 'UC_A', scheduled=base + 12 * 3600, actual=base + 12 * 3600 + 150))
+        sim.scenario.add(Stream(f'b{day}', 'UC_B', scheduled=base + 20 * 3600, actual=base + 20 * 3600 - 30))
+
+    wall = time.perf_counter()
+    sim.boot()
+    sim.run(args.days * 86400)
+    wall = time.perf_counter() - wall
+
+    for epoch, before, after in sim.transitions:
+        print(f'{iso(epoch, millis=False)}  {before} -> {after}')
+    print(f'API calls: {sim.api_calls()}')
+    print(f'Simulated {args.days} day(s) in {wall:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
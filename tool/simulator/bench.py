@@ -0,0 +1,201 @@
+"""
+Detection latency and API cost benchmark over recorded stream traces.
+
+Replays each trace against the real IdleState/Waiting/OnAir logic of src/main.py
+under simulated time, and reports:
+
+  * Detection latency: actualStartTime -> OnAir entry (p50/p90/max)
+  * Holodex calls, YouTube calls and quota units per stream
+  * Main loop wakeups per day and share of time at the boosted CPU clock
+  * Largest response body and peak heap (CPython tracemalloc, for relative comparison)
+
+    python -m simulator.bench traces/*.json
+    python -m simulator.bench traces/*.json --set enable_youtube_api=false
+    python -m simulator.bench traces/*.json --json result.json
+"""
+
+import argparse
+import json
+import math
+import time
+import tracemalloc
+
+from .runner import Simulator, preload
+from .trace import Trace, TraceScenario
+
+
+def percentile(values, q):
+    """Nearest-rank percentile. None for an empty list."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def _state_at(transitions, epoch, initial):
+    state = initial
+    for t, _, after in transitions:
+        if t > epoch:
+            break
+        state = after
+    return state
+
+
+def _boost_pct(stats):
+    total = stats['low_ms'] + stats['high_ms']
+    return 100 * stats['high_ms'] / total if total else 0
+
+
+def run_trace(trace, config=None, memory=True):
+    """
+    Replays a trace. Returns the result as a dict.
+    memory=False skips tracemalloc, which slows the replay down a few times.
+    """
+    config = dict({'channelId': trace.channels}, **(config or {}))
+    sim = Simulator(trace.start, config, scenario=TraceScenario(trace), log_limit=0)
+
+    preload() # Not counted as the memory of src/
+    if memory:
+        tracemalloc.start()
+    wall = time.perf_counter()
+    sim.boot()
+    boot_kib = peak_kib = None
+    if memory:
+        boot_kib = tracemalloc.get_traced_memory()[0] / 1024
+    sim.run(trace.end - trace.start)
+    if memory:
+        # Peak since power on: src/ modules, Context, API responses (and the request log of the fake hosts)
+        peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    wall = time.perf_counter() - wall
+
+    entries = [t for t, _, after in sim.transitions if after == 'OnAir']
+    latencies = {}
+    masked = []
+    missed = []
+    for video_id, (_, actual) in sorted(trace.actual_starts().items(), key=lambda item: item[1][1]):
+        # Lamp is already on for another stream: no detection to measure
+        if _state_at(sim.transitions, actual, 'OnAir') == 'OnAir':
+            masked.append(video_id)
+            continue
+        detected = next((t for t in entries if t >= actual), None)
+        if detected is None:
+            missed.append(video_id)
+        else:
+            latencies[video_id] = detected - actual
+
+    holodex = sim.net.host('holodex.net').requests
+    youtube = sim.net.host('www.googleapis.com').requests
+    streams = max(1, len(latencies) + len(masked) + len(missed))
+    days = (trace.end - trace.start) / 86400
+    values = list(latencies.values())
+    return {
+        'trace': trace.name,
+        'days': days,
+        'streams': len(latencies) + len(masked) + len(missed),
+        'detected': len(latencies),
+        'masked': len(masked),
+        'missed': len(missed),
+        'latency': latencies,
+        'latency_p50': percentile(values, 50),
+        'latency_p90': percentile(values, 90),
+        'latency_max': max(values) if values else None,
+        'latency_mean': sum(values) / len(values) if values else None,
+        'holodex_calls': len(holodex),
+        'youtube_calls': len(youtube),
+        'holodex_per_stream': len(holodex) / streams,
+        'youtube_per_stream': len(youtube) / streams,
+        # videos.list costs 1 unit, including 304 responses
+        'quota_per_stream': len(youtube) / streams,
+        'quota_per_day': len(youtube) / days if days else 0,
+        'connections': sum(host.connections for host in sim.net.hosts.values()),
+        'wakeups_per_day': sim.context.wakeups / days if days else 0,
+        'boost_pct': _boost_pct(sim.context.governor.stats()),
+        'max_body_kib': max((size for _, _, _, size in holodex + youtube), default=0) / 1024,
+        'boot_kib': boot_kib,
+        'peak_kib': peak_kib,
+        'wall_s': wall,
+    }
+
+
+def summarize(results):
+    """Totals over every trace."""
+    latencies = [v for r in results for v in r['latency'].values()]
+    streams = max(1, sum(r['streams'] for r in results))
+    days = sum(r['days'] for r in results)
+    youtube = sum(r['youtube_calls'] for r in results)
+    return {
+        'trace': 'TOTAL',
+        'days': days,
+        'streams': sum(r['streams'] for r in results),
+        'detected': sum(r['detected'] for r in results),
+        'masked': sum(r['masked'] for r in results),
+        'missed': sum(r['missed'] for r in results),
+        'latency_p50': percentile(latencies, 50),
+        'latency_p90': percentile(latencies, 90),
+        'latency_max': max(latencies) if latencies else None,
+        'latency_mean': sum(latencies) / len(latencies) if latencies else None,
+        'holodex_calls': sum(r['holodex_calls'] for r in results),
+        'youtube_calls': youtube,
+        'holodex_per_stream': sum(r['holodex_calls'] for r in results) / streams,
+        'youtube_per_stream': youtube / streams,
+        'quota_per_stream': youtube / streams,
+        'quota_per_day': youtube / days if days else 0,
+        'connections': sum(r['connections'] for r in results),
+        'wakeups_per_day': sum(r['wakeups_per_day'] * r['days'] for r in results) / days if days else 0,
+        'boost_pct': sum(r['boost_pct'] * r['days'] for r in results) / days if days else 0,
+        'max_body_kib': max((r['max_body_kib'] for r in results), default=0),
+        'boot_kib': max((r['boot_kib'] for r in results if r['boot_kib'] is not None), default=None),
+        'peak_kib': max((r['peak_kib'] for r in results if r['peak_kib'] is not None), default=None),
+        'wall_s': sum(r['wall_s'] for r in results),
+    }
+
+
+def _fmt(value, spec='.0f'):
+    return '-' if value is None else format(value, spec)
+
+
+def print_table(results):
+    header = (f'{"trace":<28} {"streams":>7} {"det":>4} {"mask":>4} {"miss":>4} '
+              f'{"p50 s":>6} {"p90 s":>6} {"max s":>6} {"hdx/st":>7} {"yt/st":>6} {"quota/d":>8} {"wake/d":>7} {"boost%":>6} '
+              f'{"body KiB":>8} {"peak KiB":>8} {"wall s":>6}')
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f'{r["trace"][:28]:<28} {r["streams"]:>7} {r["detected"]:>4} {r["masked"]:>4} {r["missed"]:>4} '
+              f'{_fmt(r["latency_p50"]):>6} {_fmt(r["latency_p90"]):>6} {_fmt(r["latency_max"]):>6} '
+              f'{r["holodex_per_stream"]:>7.1f} {r["youtube_per_stream"]:>6.1f} {r["quota_per_day"]:>8.0f} {r["wakeups_per_day"]:>7.0f} {r["boost_pct"]:>6.2f} '
+              f'{r["max_body_kib"]:>8.1f} {_fmt(r["peak_kib"]):>8} {r["wall_s"]:>6.1f}')
+
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detection latency / API cost benchmark.')
+    parser.add_argument('traces', nargs='+', help='Trace files (see simulator.trace)')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='config.json override, value in JSON (e.g. enable_youtube_api=false)')
+    parser.add_argument('--json', help='Writes the results to this file')
+    parser.add_argument('--no-memory', action='store_true', help='Skips peak memory measurement (faster)')
+    args = parser.parse_args()
+
+    config = {}
+    for item in args.set:
+        key, _, value = item.partition('=')
+        config[key] = _parse_value(value)
+
+    results = [run_trace(Trace.load(path), config, not args.no_memory) for path in args.traces]
+    total = summarize(results)
+    print_table(results + [total])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': config, 'traces': results, 'total': total}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Virtual clock for the host-side simulator.
+
+Replaces `time` of MicroPython (ticks_ms/ticks_us/ticks_diff, time, sleep, mktime, gmtime)
+and drives one-shot/periodic timers. Sleeping advances the clock instantly,
+so days of device time run in seconds.
+"""
+
+import calendar
+import heapq
+import time as _time
+import types
+
+TICKS_PERIOD = 1 << 30 # Same as MicroPython ports
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+class VirtualClock:
+    """Monotonic microsecond clock anchored to a UTC epoch."""
+
+    def __init__(self, start_epoch=0, read_cost_us=1, drift_ppm=0, rtc_error_s=0):
+        """
+        Args:
+            start_epoch (int): UTC seconds at the start of the simulation.
+            read_cost_us (int): Time passing on every ticks_us()/ticks_cpu() read,
+                so busy-wait loops terminate. Timers are not fired by reads.
+            drift_ppm (int): Crystal error of the board. Positive: ticks and RTC run fast.
+            rtc_error_s (int): RTC error at power on (time.time() - true time).
+        """
+        self._start_epoch = start_epoch
+        self._read_cost_us = read_cost_us
+        self.drift_ppm = drift_ppm
+        self._rtc_base = start_epoch + rtc_error_s # RTC at local_us == 0
+        self._us = 0
+        self._events = [] # heap of (due_us, seq, callback)
+        self._seq = 0
+        self._cancelled = set()
+
+    # --- Clock -----------------------------------------------------------
+
+    @property
+    def elapsed_us(self):
+        """Microseconds since the simulation started."""
+        return self._us
+
+    def epoch(self):
+        """Current UTC time in seconds (float)."""
+        return self._start_epoch + self._us / 1_000_000
+
+    @property
+    def local_us(self):
+        """Microseconds since the start as counted by the board (with the drift)."""
+        return self._us + self._us * self.drift_ppm // 1_000_000
+
+    def rtc(self):
+        """time.time() of the board (float)."""
+        return self._rtc_base + self.local_us / 1_000_000
+
+    def set_rtc(self, epoch):
+        self._rtc_base = epoch - self.local_us / 1_000_000
+
+    def advance_us(self, us):
+        """Advances the clock, firing every timer due on the way."""
+        target = self._us + max(0, int(us))
+        while self._events and self._events[0][0] <= target:
+            due, seq, callback = heapq.heappop(self._events)
+            if seq in self._cancelled:
+                self._cancelled.discard(seq)
+                continue
+            self._us = max(self._us, due)
+            callback()
+        self._us = target
+
+    def advance_to_epoch(self, epoch):
+        self.advance_us((epoch - self.epoch()) * 1_000_000)
+
+    # --- Timers ----------------------------------------------------------
+
+    def call_later_us(self, delay_us, callback):
+        """Schedules a callback. Returns a handle for cancel()."""
+        self._seq += 1
+        heapq.heappush(self._events, (self._us + max(0, int(delay_us)), self._seq, callback))
+        return self._seq
+
+    def cancel(self, handle):
+        if handle is not None:
+            self._cancelled.add(handle)
+
+    def next_event_us(self):
+        """Time of the earliest pending timer, or None."""
+        while self._events and self._events[0][1] in self._cancelled:
+            self._cancelled.discard(heapq.heappop(self._events)[1])
+        return self._events[0][0] if self._events else None
+
+    # --- MicroPython `time` module ---------------------------------------
+
+    def module(self):
+        """Builds a stand-in for MicroPython's `time` module bound to this clock."""
+        clock = self
+        mod = types.ModuleType('time')
+
+        def ticks_ms():
+            return (clock.local_us // 1000) & TICKS_MAX
+
+        def ticks_us():
+            clock._us += clock._read_cost_us
+            return clock.local_us & TICKS_MAX
+
+        def ticks_cpu():
+            clock._us += clock._read_cost_us
+            return clock.local_us & TICKS_MAX
+
+        def ticks_add(ticks, delta):
+            return (ticks + delta) & TICKS_MAX
+
+        def ticks_diff(end, start):
+            return ((end - start + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+        def sleep(seconds):
+            clock.advance_us(seconds * 1_000_000)
+
+        def sleep_ms(ms):
+            clock.advance_us(ms * 1000)
+
+        def sleep_us(us):
+            clock.advance_us(us)
+
+        def time():
+            return int(clock.rtc())
+
+        def time_ns():
+            return int(clock.rtc() * 1_000_000_000)
+
+        def gmtime(seconds=None):
+            if seconds is None:
+                seconds = time()
+            # (year, month, mday, hour, minute, second, weekday, yearday), weekday 0: Monday
+            return tuple(_time.gmtime(seconds))[:8]
+
+        def mktime(t):
+            # Board RTC is UTC, so local time == UTC
+            return calendar.timegm(tuple(t[:6]) + (0, 0, 0))
+
+        for func in (ticks_ms, ticks_us, ticks_cpu, ticks_add, ticks_diff,
+                     sleep, sleep_ms, sleep_us, time, time_ns, gmtime, mktime):
+            setattr(mod, func.__name__, func)
+        mod.localtime = gmtime
+        return mod
@@ -0,0 +1,485 @@
+"""
+Scripted HTTPS hosts and the `socket`/`ssl`/`select` stand-ins used by src/.
+
+Every request is answered from a per-host script evaluated at the current
+virtual time. DNS, TCP/TLS handshake and request latency advance the clock.
+Servers on the lamp (src/status.py) are reached with Network.connect().
+"""
+
+import collections
+import hashlib
+import io
+import json
+import struct
+import types
+from urllib.parse import parse_qs, urlsplit
+
+
+class Request:
+    """A request received by a scripted host."""
+
+    def __init__(self, method, path, headers, elapsed_us, epoch):
+        self.method = method
+        self.path = path
+        self.headers = headers          # lower-case names
+        self.elapsed_us = elapsed_us
+        self.epoch = epoch
+        split = urlsplit(path)
+        self.route = split.path
+        self.params = {k: v[-1] for k, v in parse_qs(split.query).items()}
+
+
+class ScriptedHost:
+    """
+    HTTP host answering from a timeline of responses.
+
+    host.at(epoch, body, status=200) sets the response returned from `epoch` on.
+    host.handler = func(request) -> (status, body) overrides the timeline.
+    Bodies are bytes or JSON-serializable objects. ETag/If-None-Match is handled
+    with the body's "etag" field (YouTube style) or a hash of the body.
+    """
+
+    def __init__(self, name, handshake_ms=300, latency_ms=80, idle_timeout_s=60):
+        self.name = name
+        self.handshake_ms = handshake_ms
+        self.latency_ms = latency_ms
+        self.idle_timeout_s = idle_timeout_s
+        self.handler = None
+        self.timeline = []          # sorted (epoch, status, body)
+        self.requests = []          # (elapsed_us, path, status, body_size)
+        self.connections = 0
+
+    def at(self, epoch, body, status=200):
+        self.timeline.append((epoch, status, body))
+        self.timeline.sort(key=lambda item: item[0])
+        return self
+
+    def reset_stats(self):
+        self.requests = []
+        self.connections = 0
+
+    def respond(self, request):
+        """Returns (status, headers, body bytes)."""
+        if self.handler is not None:
+            status, body = self.handler(request)
+        else:
+            status, body = 404, {'message': 'no script'}
+            for epoch, item_status, item_body in self.timeline:
+                if epoch > request.epoch:
+                    break
+                status, body = item_status, item_body
+
+        etag = None
+        if isinstance(body, dict) and 'etag' in body:
+            etag = body['etag']
+        if not isinstance(body, (bytes, bytearray)):
+            body = json.dumps(body).encode()
+        if etag is None:
+            etag = hashlib.md5(body).hexdigest()
+
+        headers = {'content-type': 'application/json; charset=UTF-8', 'etag': etag}
+        if status == 200 and request.headers.get('if-none-match') == etag:
+            status, body = 304, b''
+        self.requests.append((request.elapsed_us, request.path, status, len(body)))
+        return status, headers, bytes(body)
+
+
+class Network:
+    """Registry of scripted hosts and the socket layer state."""
+
+    def __init__(self, clock, device):
+        self.clock = clock
+        self.device = device
+        self.hosts = {}
+        self.dns_ms = 20
+        self.ntp_hosts = {'pool.ntp.org'}
+        self.ntp_latency_ms = 30    # Round trip of NTP
+        self.ntp_offset_ms = 0      # Error of the NTP server
+        self.listeners = {}         # port: listening FakeSocket on the lamp
+
+    def add_host(self, name, **kwargs):
+        host = ScriptedHost(name, **kwargs)
+        self.hosts[name] = host
+        return host
+
+    def host(self, name):
+        return self.hosts[name]
+
+    def connect(self, port, delay_ms=0):
+        """
+        Opens a connection from a LAN client to a server on the lamp.
+        The connection arrives after delay_ms. Raises ConnectionRefusedError if nothing listens.
+        """
+        listener = self.listeners.get(port)
+        if listener is None or listener._closed:
+            raise ConnectionRefusedError(port)
+        client = LocalClient(self.clock)
+        self.clock.call_later_us(delay_ms * 1000, lambda: listener._pending.append(client))
+        if delay_ms <= 0:
+            self.clock.advance_us(0)
+        return client
+
+    # --- module stand-ins ------------------------------------------------
+
+    def socket_module(self):
+        net = self
+        mod = types.ModuleType('socket')
+        mod.AF_INET = 2
+        mod.SOCK_STREAM = 1
+        mod.SOCK_DGRAM = 2
+        mod.IPPROTO_TCP = 6
+        mod.IPPROTO_UDP = 17
+        mod.SOL_SOCKET = 1
+        mod.SO_REUSEADDR = 4
+
+        def getaddrinfo(host, port, af=0, socktype=0, proto=0, flags=0):
+            if not net.device.wifi_available:
+                raise OSError(-202) # DNS failure
+            net.clock.advance_us(net.dns_ms * 1000)
+            return [(mod.AF_INET, socktype or mod.SOCK_STREAM, proto, '', (host, port))]
+
+        def socket(af=2, socktype=1, proto=0):
+            return FakeSocket(net, socktype)
+
+        mod.getaddrinfo = getaddrinfo
+        mod.socket = socket
+        return mod
+
+    def select_module(self):
+        """`select` with poll(). Waiting advances the clock up to the next timer or the timeout."""
+        clock = self.clock
+        mod = types.ModuleType('select')
+        mod.POLLIN = 1
+        mod.POLLOUT = 4
+        mod.POLLERR = 8
+        mod.POLLHUP = 16
+
+        class Poll:
+            def __init__(self):
+                self._objects = {}
+
+            def register(self, obj, mask=mod.POLLIN | mod.POLLOUT):
+                self._objects[obj] = mask
+
+            def modify(self, obj, mask):
+                if obj not in self._objects:
+                    raise OSError(2) # ENOENT
+                self._objects[obj] = mask
+
+            def unregister(self, obj):
+                self._objects.pop(obj, None)
+
+            def poll(self, timeout=-1):
+                deadline = None if timeout is None or timeout < 0 else clock.elapsed_us + timeout * 1000
+                while True:
+                    ready = []
+                    for obj, mask in self._objects.items():
+                        events = obj._poll_events() & (mask | mod.POLLERR | mod.POLLHUP)
+                        if events:
+                            ready.append((obj, events))
+                    if ready or (deadline is not None and clock.elapsed_us >= deadline):
+                        return ready
+                    target = clock.next_event_us()
+                    if target is None or (deadline is not None and target > deadline):
+                        target = deadline
+                    if target is None:
+                        raise RuntimeError('poll() without timeout would block forever')
+                    clock.advance_us(target - clock.elapsed_us)
+
+        mod.poll = Poll
+        return mod
+
+    def ssl_module(self):
+        mod = types.ModuleType('ssl')
+        mod.CERT_NONE = 0
+        mod.CERT_REQUIRED = 2
+        mod.PROTOCOL_TLS_CLIENT = 0
+
+        def wrap_socket(sock, server_hostname=None, **kwargs):
+            sock.start_tls()
+            return sock
+
+        mod.wrap_socket = wrap_socket
+        return mod
+
+
+NTP_DELTA = 2208988800 # 1900-01-01 to 1970-01-01
+
+
+class FakeSocket:
+    """
+    Stream socket connected to a ScriptedHost (MicroPython stream API),
+    or a datagram socket answered by the NTP server of the Network.
+    """
+
+    def __init__(self, net, socktype):
+        self._net = net
+        self._socktype = socktype
+        self._host = None
+        self._tx = b''
+        self._rx = io.BytesIO()
+        self._closed = False
+        self._peer_closed = False
+        self._last_active_us = 0
+        self._blocking = True
+        self._datagrams = []    # (ready elapsed_us, bytes)
+        self._port = None
+        self._pending = collections.deque() # LocalClient waiting for accept()
+
+    def settimeout(self, timeout):
+        pass
+
+    def setblocking(self, flag):
+        self._blocking = flag
+
+    def setsockopt(self, *args):
+        pass
+
+    def connect(self, address):
+        host = self._net.hosts.get(address[0])
+        if host is None or not self._net.device.wifi_available:
+            raise OSError(113) # EHOSTUNREACH
+        self._host = host
+        host.connections += 1
+        self._net.clock.advance_us(host.handshake_ms * 1000 // 3) # TCP part
+        self._last_active_us = self._net.clock.elapsed_us
+
+    def bind(self, address):
+        self._port = address[1]
+
+    def listen(self, backlog=1):
+        self._check_alive()
+        self._net.listeners[self._port] = self
+
+    def accept(self):
+        self._check_alive()
+        if not self._pending:
+            if self._blocking:
+                raise RuntimeError('Blocking accept() is not simulated')
+            raise OSError(11) # EAGAIN
+        client = self._pending.popleft()
+        return LocalConnection(self._net, client), ('192.168.0.10', 50000 + len(self._net.listeners))
+
+    def _poll_events(self):
+        if self._closed:
+            return 32 # POLLNVAL
+        return 1 if self._pending else 0
+
+    def start_tls(self):
+        self._net.clock.advance_us(self._host.handshake_ms * 1000 * 2 // 3)
+
+    def write(self, data):
+        self._check_alive()
+        # Kept-alive connection idled out: server has closed it silently
+        if self._net.clock.elapsed_us - self._last_active_us > self._host.idle_timeout_s * 1_000_000:
+            self._peer_closed = True
+        self._tx += bytes(data)
+        while b'\r\n\r\n' in self._tx:
+            head, self._tx = self._tx.split(b'\r\n\r\n', 1)
+            self._handle(head)
+        return len(data)
+
+    send = write
+    sendall = write
+
+    def readline(self):
+        self._check_alive()
+        return self._rx.readline()
+
+    def readinto(self, buf, size=-1):
+        self._check_alive()
+        view = memoryview(buf)
+        if size >= 0:
+            view = view[:size]
+        return self._rx.readinto(view)
+
+    def read(self, size=-1):
+        self._check_alive()
+        return self._rx.read(size)
+
+    def recv(self, size):
+        self._check_alive()
+        if self._socktype == 2: # SOCK_DGRAM
+            return self._recv_datagram(size)
+        return self._rx.read(size)
+
+    def close(self):
+        self._closed = True
+        if self._port is not None and self._net.listeners.get(self._port) is self:
+            del self._net.listeners[self._port]
+            for client in self._pending:
+                client._reset()
+            self._pending.clear()
+
+    # --- Datagram (NTP) ----------------------------------------------------
+
+    def sendto(self, data, address):
+        self._check_alive()
+        net = self._net
+        net.device.ntp_count += 1
+        if address[0] not in net.ntp_hosts or len(data) < 48:
+            return len(data) # Lost
+        clock = net.clock
+        ready = clock.elapsed_us + net.ntp_latency_ms * 1000
+        server = clock.epoch() + net.ntp_latency_ms / 2000 + net.ntp_offset_ms / 1000
+        seconds = int(server)
+        fraction = int((server - seconds) * (1 << 32))
+        reply = bytearray(48)
+        reply[0] = 0x1C # LI = 0, VN = 3, Mode = 4 (server)
+        reply[1] = 2    # Stratum
+        reply[40:48] = struct.pack('>II', seconds + NTP_DELTA, fraction)
+        self._datagrams.append((ready, bytes(reply)))
+        return len(data)
+
+    def _recv_datagram(self, size):
+        clock = self._net.clock
+        if self._datagrams and self._blocking:
+            clock.advance_us(self._datagrams[0][0] - clock.elapsed_us)
+        if not self._datagrams or self._datagrams[0][0] > clock.elapsed_us:
+            raise OSError(110 if self._blocking else 11) # ETIMEDOUT / EAGAIN
+        return self._datagrams.pop(0)[1][:size]
+
+    def _check_alive(self):
+        if self._closed:
+            raise OSError(9) # EBADF
+        if not self._net.device.wifi_available:
+            raise OSError(104) # ECONNRESET
+
+    def _handle(self, head):
+        if self._peer_closed:
+            return # Reads return b'' (EOF)
+        lines = head.decode().split('\r\n')
+        method, path, _ = lines[0].split(' ', 2)
+        headers = {}
+        for line in lines[1:]:
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        clock = self._net.clock
+        request = Request(method, path, headers, clock.elapsed_us, clock.epoch())
+        clock.advance_us(self._host.latency_ms * 1000)
+        status, response_headers, body = self._host.respond(request)
+
+        out = [f'HTTP/1.1 {status} {"OK" if status == 200 else "Status"}']
+        for key, value in response_headers.items():
+            out.append(f'{key}: {value}')
+        out.append(f'content-length: {len(body)}')
+        out.append('\r\n')
+        pos = self._rx.tell()
+        self._rx.seek(0, io.SEEK_END)
+        self._rx.write('\r\n'.join(out).encode() + body)
+        self._rx.seek(pos)
+        self._last_active_us = clock.elapsed_us
+
+
+class LocalClient:
+    """
+    A LAN client connected to a server on the lamp (see Network.connect).
+
+        client = sim.net.connect(80)
+        client.send(b'GET /status HTTP/1.1\r\n\r\n')
+        sim.run(1, until=lambda sim: client.closed)
+        status, headers, body = client.result()
+    """
+
+    def __init__(self, clock):
+        self._clock = clock
+        self.connected_us = clock.elapsed_us
+        self.request = bytearray()      # Sent, not read by the server yet
+        self.response = bytearray()
+        self.closed = False             # By the server
+        self.closed_us = None
+        self.reset = False              # Connection refused or reset
+        self.hung_up = False            # By this client
+
+    def send(self, data):
+        self.request += data
+
+    def close(self):
+        self.hung_up = True
+
+    def result(self):
+        """(status, {lower-case header: value}, body bytes). status None: No complete response."""
+        head, sep, body = bytes(self.response).partition(b'\r\n\r\n')
+        if not sep:
+            return None, {}, b''
+        lines = head.decode().split('\r\n')
+        headers = {}
+        for line in lines[1:]:
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+        return int(lines[0].split(' ')[1]), headers, body
+
+    def _reset(self):
+        self.reset = True
+        self.closed = True
+        self.closed_us = self._clock.elapsed_us
+
+
+class LocalConnection:
+    """Server end of a LocalClient (accepted socket on the lamp)."""
+
+    def __init__(self, net, client):
+        self._net = net
+        self._client = client
+        self._closed = False
+        self._blocking = True
+
+    def setblocking(self, flag):
+        self._blocking = flag
+
+    def settimeout(self, timeout):
+        self._blocking = timeout is None or timeout > 0
+
+    def readinto(self, buf, size=-1):
+        self._check_alive()
+        request = self._client.request
+        if not request:
+            if self._client.hung_up:
+                return 0
+            if self._blocking:
+                raise RuntimeError('Blocking read is not simulated')
+            return None # MicroPython: no data on a non-blocking socket
+        view = memoryview(buf)
+        n = min(len(view) if size < 0 else size, len(request))
+        view[:n] = request[:n]
+        del request[:n]
+        return n
+
+    def recv(self, size):
+        buf = bytearray(size)
+        n = self.readinto(buf)
+        if n is None:
+            raise OSError(11) # EAGAIN
+        return bytes(buf[:n])
+
+    def send(self, data):
+        self._check_alive()
+        if self._client.hung_up:
+            raise OSError(104) # ECONNRESET
+        self._client.response += bytes(data)
+        return len(data)
+
+    write = send
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._client.closed = True
+            self._client.closed_us = self._net.clock.elapsed_us
+
+    def _poll_events(self):
+        if self._closed:
+            return 32 # POLLNVAL
+        events = 4 # POLLOUT
+        if self._client.request or self._client.hung_up:
+            events |= 1
+        if self._client.hung_up:
+            events |= 16
+        return events
+
+    def _check_alive(self):
+        if self._closed:
+            raise OSError(9) # EBADF
+        if not self._net.device.wifi_available:
+            raise OSError(104) # ECONNRESET
@@ -0,0 +1,236 @@
+"""
+Runs the real src/ code (boot.py, main.py and its modules) on CPython.
+
+MicroPython-only modules are swapped in sys.modules while the simulator is active,
+and the blocking main loop of main.py is driven on the virtual clock.
+"""
+
+import builtins
+import collections
+import contextlib
+import json
+import os
+import struct
+import sys
+import tempfile
+
+from .clock import VirtualClock
+from .net import Network
+from .scenario import Scenario
+from .stubs import Device, make_gc, make_machine, make_micropython, make_network, make_ntptime
+
+SRC_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+SRC_MODULES = ('boot', 'main', 'fsm', 'spwm', 'sequencer', 'jsonstream', 'session', 'quota', 'delay',
+               'wallclock', 'metrics', 'status', 'governor')
+
+DEFAULT_CONFIG = {
+    'ssid': 'simulator',
+    'password': '',
+    'key_holodex': 'holodex-key',
+    'enable_youtube_api': True,
+    'key_youtube': 'youtube-key',
+    'youtube_quota': 10000,
+    'channelId': [],
+    'use_asyncio': False,
+    'audio_wifi_mode': 'keep',
+}
+
+# A short tune: (Hz, ms)
+DEFAULT_AUDIO = ((880, 200), (0, 50), (1320, 400))
+
+# Imported before the stand-ins are installed, so they keep the real `time`/`socket`
+_PRELOAD = ('asyncio', 'json', 'struct', 'array', 'io', 'os', 'errno', 'gc', 'select', 'hashlib')
+
+
+def preload():
+    """Imports the standard modules used by src/ with the real `time`/`socket`."""
+    for name in _PRELOAD:
+        __import__(name)
+
+
+class Simulator:
+    """
+    A simulated lamp.
+
+        sim = Simulator(start_epoch, {'channelId': ['UC...']})
+        sim.scenario.add(Stream('video', 'UC...', scheduled=..., actual=...))
+        sim.boot()
+        sim.run(24 * 3600)
+        print(sim.transitions)
+    """
+
+    def __init__(self, start_epoch, config=None, scenario=None, audio=DEFAULT_AUDIO,
+                 workdir=None, verbose=False, log_limit=None, drift_ppm=0, rtc_error_s=0):
+        """
+        Args:
+            start_epoch (int): UTC seconds at power on.
+            config (dict): Overrides of config.json.
+            scenario (Scenario): Streams served by the fake Holodex/YouTube hosts.
+            audio: (Hz, ms) pairs written to audio.bin. None: No audio.bin.
+            workdir (str): Device filesystem. Default: a new temporary directory.
+                Files (quota.json, delay.json) persist across simulators sharing it.
+            verbose (bool): Prints the log of main.py, every log level enabled.
+            log_limit (int): Entries kept per device/message log. None: Unlimited.
+            drift_ppm (int): Crystal error of the board (ticks and RTC).
+            rtc_error_s (int): RTC error at power on, e.g. -start_epoch for an unset RTC.
+        """
+        self.clock = VirtualClock(start_epoch, drift_ppm=drift_ppm, rtc_error_s=rtc_error_s)
+        self.device = Device(log_limit)
+        self.net = Network(self.clock, self.device)
+        self.scenario = scenario if scenario is not None else Scenario()
+        self.scenario.install(self.net)
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.workdir = workdir or tempfile.mkdtemp(prefix='lamp-sim-')
+        self.verbose = verbose
+
+        self.transitions = []   # (epoch, from state, to state)
+        self.messages = collections.deque(maxlen=log_limit) # (epoch, log message)
+        self.modules = {}       # src modules of this simulator
+        self.main = None
+        self.context = None
+        self.fsm = None
+        self.led = None
+
+        self._stand_ins = {
+            'time': self.clock.module(),
+            'socket': self.net.socket_module(),
+            'ssl': self.net.ssl_module(),
+            'select': self.net.select_module(),
+            'machine': make_machine(self.clock, self.device),
+            'network': make_network(self.clock, self.device),
+            'ntptime': make_ntptime(self.clock, self.device),
+            'micropython': make_micropython(),
+            'gc': make_gc(self.device),
+        }
+        self._write_files(audio)
+
+    # --- Lifecycle -------------------------------------------------------
+
+    @contextlib.contextmanager
+    def activate(self):
+        """Installs the stand-ins and src modules of this simulator. Restored on exit."""
+        preload()
+        saved_modules = {}
+        for name in list(self._stand_ins) + list(SRC_MODULES):
+            saved_modules[name] = sys.modules.pop(name, None)
+        saved_builtins = {name: getattr(builtins, name, None) for name in ('micropython', 'ptr32')}
+        saved_cwd = os.getcwd()
+        saved_path = list(sys.path)
+
+        sys.modules.update(self._stand_ins)
+        sys.modules.update(self.modules)
+        builtins.micropython = self._stand_ins['micropython'] # viper decorator without import
+        builtins.ptr32 = self.device.ptr32
+        sys.path.insert(0, SRC_DIR)
+        os.chdir(self.workdir)
+        try:
+            yield self
+        finally:
+            os.chdir(saved_cwd)
+            sys.path[:] = saved_path
+            for name in SRC_MODULES:
+                module = sys.modules.get(name)
+                if module is not None:
+                    self.modules[name] = module
+            for name, module in saved_modules.items():
+                if module is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = module
+            for name, value in saved_builtins.items():
+                if value is None:
+                    delattr(builtins, name)
+                else:
+                    setattr(builtins, name, value)
+
+    def boot(self, initial_state='OnAir'):
+        """Power on: boot.py, then main() up to the main loop."""
+        with self.activate():
+            import main
+            self.main = main
+            if self.verbose:
+                # const() flags are plain globals on CPython
+                main.LOG_INFO = main.LOG_DEBUG = 1
+            main.init()
+            self.led = main.Heartbeat(11, self.config.get('heartbeat', 'wakeup'))
+            self.context = main.Context()
+            self.context.log = self._log
+            self.fsm = main.create_fsm(self.context)
+            main.create_status_server(self.fsm, self.context)
+            self.fsm.start(getattr(main, initial_state))
+        return self
+
+    def run(self, seconds, until=None):
+        """
+        Runs the main loop for the given simulated seconds.
+        Stops early when until(sim) returns True. Returns the simulated seconds run.
+        """
+        start = self.clock.elapsed_us
+        end = start + int(seconds * 1_000_000)
+        with self.activate():
+            while self.clock.elapsed_us < end:
+                before = self.state
+                wait = self.main.step(self.fsm, self.context, self.led)
+                if self.state != before:
+                    self.transitions.append((self.clock.epoch(), before, self.state))
+                if until is not None and until(self):
+                    break
+                # Never past the end, so consecutive run() calls continue seamlessly
+                remaining_ms = (end - self.clock.elapsed_us + 999) // 1000
+                self.main.idle(self.context, min(wait, remaining_ms))
+        return (self.clock.elapsed_us - start) / 1_000_000
+
+    def run_until_epoch(self, epoch):
+        return self.run(max(0, epoch - self.clock.epoch()))
+
+    def http_get(self, path, port=None, timeout_s=5):
+        """
+        GET request from the LAN to the status server, while the lamp keeps running.
+        Returns (status, JSON body). status None: No response within timeout_s.
+        """
+        client = self.net.connect(port or self.config.get('status_port'))
+        client.send(f'GET {path} HTTP/1.1\r\nHost: lamp\r\n\r\n'.encode())
+        self.run(timeout_s, until=lambda sim: client.closed)
+        status, headers, body = client.result()
+        if status is None:
+            return None, None
+        return status, json.loads(body) if 'json' in headers.get('content-type', '') else body
+
+    # --- Observation -----------------------------------------------------
+
+    @property
+    def state(self):
+        if self.fsm is None or self.fsm.current_state is None:
+            return None
+        return self.fsm.current_state.__class__.__name__
+
+    @property
+    def now(self):
+        return self.clock.epoch()
+
+    def api_calls(self):
+        """Request count per host."""
+        return {name: len(host.requests) for name, host in self.net.hosts.items()}
+
+    def light_log(self):
+        """(elapsed_us, value) of the desk light pin."""
+        return [(t, v) for t, pin, v in self.device.pin_log if pin == 35]
+
+    def _log(self, level, msg):
+        if not level:
+            return
+        self.messages.append((self.clock.epoch(), msg))
+        if self.verbose:
+            print(f'[{self.clock.epoch():.0f}] {msg}')
+
+    def _write_files(self, audio):
+        config_path = os.path.join(self.workdir, 'config.json')
+        with open(config_path, 'w') as f:
+            json.dump(self.config, f)
+        audio_path = os.path.join(self.workdir, 'audio.bin')
+        if audio is not None:
+            with open(audio_path, 'wb') as f:
+                for hz, ms in audio:
+                    f.write(struct.pack('<HH', hz, ms))
+        elif os.path.exists(audio_path):
+            os.remove(audio_path)
@@ -0,0 +1,135 @@
+"""
+Streams on a virtual timeline and the Holodex/YouTube responses derived from them.
+
+A Stream is scheduled, goes live at its actual start and ends.
+Holodex sees it `holodex_lag` seconds late, like the real service.
+"""
+
+import hashlib
+import json
+import time as _time
+
+
+def iso(epoch, millis=True):
+    """UTC ISO 8601 string. Holodex: with milliseconds, YouTube: without."""
+    text = _time.strftime('%Y-%m-%dT%H:%M:%S', _time.gmtime(int(epoch)))
+    return text + ('.000Z' if millis else 'Z')
+
+
+class Stream:
+    """A scheduled live stream."""
+
+    def __init__(self, video_id, channel_id, scheduled, actual=None, duration=2 * 3600,
+                 announced=None, cancelled=None, holodex_lag=60, title=None):
+        """
+        Args:
+            video_id (str): YouTube video id.
+            channel_id (str): YouTube channel id.
+            scheduled (int): Scheduled start, UTC seconds.
+            actual (int): Actual start, UTC seconds. None: Never goes live.
+            duration (int): Seconds from the actual start to the end.
+            announced (int): The stream is listed from this time. Default: 2 days before.
+            cancelled (int): The stream is deleted at this time.
+            holodex_lag (int): Seconds until Holodex reports the status change.
+        """
+        self.video_id = video_id
+        self.channel_id = channel_id
+        self.scheduled = scheduled
+        self.actual = actual
+        self.duration = duration
+        self.announced = scheduled - 2 * 24 * 3600 if announced is None else announced
+        self.cancelled = cancelled
+        self.holodex_lag = holodex_lag
+        self.title = title or f'Stream {video_id}'
+
+    @property
+    def end(self):
+        return None if self.actual is None else self.actual + self.duration
+
+    def exists(self, now):
+        return self.announced <= now and (self.cancelled is None or now < self.cancelled)
+
+    def status(self, now):
+        """'upcoming', 'live', 'past' or None (not listed)."""
+        if not self.exists(now):
+            return None
+        if self.actual is None or now < self.actual:
+            return 'upcoming'
+        if now < self.end:
+            return 'live'
+        return 'past'
+
+    def holodex_record(self, now):
+        status = self.status(now - self.holodex_lag)
+        if status not in ('upcoming', 'live'):
+            return None
+        record = {
+            'id': self.video_id,
+            'title': self.title,
+            'type': 'stream',
+            'status': status,
+            'start_scheduled': iso(self.scheduled),
+            'channel': {'id': self.channel_id, 'name': self.channel_id, 'type': 'vtuber'},
+        }
+        if status == 'live':
+            record['start_actual'] = iso(self.actual)
+        return record
+
+    def youtube_item(self, now):
+        if not self.exists(now):
+            return None
+        details = {'scheduledStartTime': iso(self.scheduled, millis=False)}
+        status = self.status(now)
+        if status in ('live', 'past'):
+            details['actualStartTime'] = iso(self.actual, millis=False)
+        if status == 'past':
+            details['actualEndTime'] = iso(self.end, millis=False)
+        return {'kind': 'youtube#video', 'etag': self.video_id + (status or ''),
+                'id': self.video_id, 'liveStreamingDetails': details}
+
+
+class Scenario:
+    """Serves a list of streams from the Holodex and YouTube hosts of a Network."""
+
+    def __init__(self, streams=()):
+        self.streams = list(streams)
+
+    def add(self, stream):
+        self.streams.append(stream)
+        return stream
+
+    def install(self, net):
+        net.add_host('holodex.net').handler = self.holodex
+        net.add_host('www.googleapis.com').handler = self.youtube
+
+    def holodex(self, request):
+        if request.route != '/api/v2/users/live':
+            return 404, {'message': 'Not Found'}
+        if 'x-apikey' not in request.headers:
+            return 403, {'message': 'Forbidden'}
+        channels = set(request.params.get('channels', '').split(','))
+        records = []
+        for stream in self.streams:
+            if stream.channel_id not in channels:
+                continue
+            record = stream.holodex_record(request.epoch)
+            if record is not None:
+                records.append(record)
+        records.sort(key=lambda record: record['start_scheduled'])
+        return 200, records
+
+    def youtube(self, request):
+        if request.route != '/youtube/v3/videos':
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+        ids = [i for i in request.params.get('id', '').split(',') if i]
+        if not ids or len(ids) > 50:
+            return 400, {'error': {'code': 400, 'message': 'Bad Request'}}
+        items = []
+        for stream in self.streams:
+            if stream.video_id in ids:
+                item = stream.youtube_item(request.epoch)
+                if item is not None:
+                    items.append(item)
+        tag = hashlib.md5(json.dumps(items).encode()).hexdigest()
+        return 200, {'kind': 'youtube#videoListResponse', 'etag': tag, 'items': items,
+                     'pageInfo': {'totalResults': len(items), 'resultsPerPage': len(items)}}
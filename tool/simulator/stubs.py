@@ -0,0 +1,312 @@
+"""
+Stand-ins for MicroPython-only modules: machine, network, ntptime, micropython, gc.
+
+Every module is built per simulation and bound to its VirtualClock,
+so hardware timers fire and sleeps pass in virtual time.
+"""
+
+import calendar
+import collections
+import time as _time
+import types
+
+
+def make_micropython():
+    """`micropython` module. Code emitter decorators are no-ops on host."""
+    mod = types.ModuleType('micropython')
+    mod.const = lambda value: value
+    mod.native = lambda func: func
+    mod.viper = lambda func: func
+    mod.schedule = lambda func, arg: func(arg)
+    mod.mem_info = lambda *args: None
+    mod.opt_level = lambda *args: 0
+    return mod
+
+
+def make_gc(device):
+    """`gc` module: CPython gc with the heap figures of MicroPython, read from device."""
+    import gc as _gc
+    mod = types.ModuleType('gc')
+    for name in ('collect', 'enable', 'disable', 'isenabled'):
+        setattr(mod, name, getattr(_gc, name))
+    mod.mem_free = lambda: device.mem_free
+    mod.mem_alloc = lambda: device.heap_size - device.mem_free
+    mod.threshold = lambda *args: -1
+    return mod
+
+
+class _Ptr32:
+    """`ptr32` of viper code. Reads as zero, writes are dropped."""
+
+    def __init__(self, address):
+        self._address = address
+
+    def __getitem__(self, index):
+        return 0
+
+    def __setitem__(self, index, value):
+        pass
+
+
+def make_machine(clock, device):
+    """`machine` module bound to the clock. Pin/PWM/Timer activity is recorded on device."""
+    mod = types.ModuleType('machine')
+
+    class Pin:
+        IN = 0
+        OUT = 1
+        PULL_UP = 2
+        PULL_DOWN = 3
+
+        def __init__(self, pin_id, mode=-1, pull=-1, value=None):
+            self.id = pin_id
+            self._value = 0
+            device.pins[pin_id] = self
+            if value is not None:
+                self.value(value)
+
+        def value(self, value=None):
+            if value is None:
+                return self._value
+            self._value = 1 if value else 0
+            device.pin_log.append((clock.elapsed_us, self.id, self._value))
+            return None
+
+        def on(self):
+            self.value(1)
+
+        def off(self):
+            self.value(0)
+
+        __call__ = value
+
+    class PWM:
+        def __init__(self, pin, freq=0, duty=0, **kwargs):
+            self._pin = pin
+            self._freq = freq
+            self._duty = duty
+
+        def freq(self, value=None):
+            if value is None:
+                return self._freq
+            self._freq = value
+            return None
+
+        def duty(self, value=None):
+            if value is None:
+                return self._duty
+            self._duty = value
+            return None
+
+        def deinit(self):
+            pass
+
+    class Timer:
+        ONE_SHOT = 0
+        PERIODIC = 1
+        # Periodic timers faster than this (e.g. SPWM sine steps) are not simulated
+        MIN_PERIOD_US = 1000
+
+        def __init__(self, timer_id, **kwargs):
+            self.id = timer_id
+            self._handle = None
+            self.freq = 0
+            if kwargs:
+                self.init(**kwargs)
+
+        def init(self, mode=PERIODIC, period=-1, freq=-1, callback=None, **kwargs):
+            self.deinit()
+            if freq > 0:
+                period_us = 1_000_000 / freq
+                self.freq = freq
+            else:
+                period_us = period * 1000
+                self.freq = 1000 / period if period > 0 else 0
+            device.timer_log.append((clock.elapsed_us, self.id, mode, period_us))
+            if callback is None:
+                return
+            if mode == Timer.PERIODIC and period_us < Timer.MIN_PERIOD_US:
+                return
+
+            def fire():
+                self._handle = None
+                if mode == Timer.PERIODIC:
+                    self._handle = clock.call_later_us(period_us, fire)
+                callback(self)
+
+            self._handle = clock.call_later_us(period_us, fire)
+
+        def deinit(self):
+            clock.cancel(self._handle)
+            self._handle = None
+            self.freq = 0
+
+    class _Mem32:
+        def __getitem__(self, address):
+            # GPIO_FUNCn_OUT_SEL_CFG: LEDC low speed channel 0 for every pin
+            return 79
+
+        def __setitem__(self, address, value):
+            pass
+
+    def freq(value=None):
+        if value is None:
+            return device.cpu_freq
+        device.cpu_freq = value
+        device.freq_log.append((clock.elapsed_us, value))
+        return None
+
+    def lightsleep(ms=None):
+        device.sleep_log.append((clock.elapsed_us, ms))
+        if ms is None:
+            due = clock.next_event_us()
+            if due is not None:
+                clock.advance_us(due - clock.elapsed_us)
+            return
+        clock.advance_us(ms * 1000)
+
+    def soft_reset():
+        raise SystemExit('soft_reset')
+
+    def reset():
+        raise SystemExit('reset')
+
+    class RTC:
+        def datetime(self, value=None):
+            if value is None:
+                t = tuple(_time.gmtime(int(clock.rtc())))
+                # (year, month, day, weekday, hours, minutes, seconds, subseconds)
+                return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+            year, month, day, _, hour, minute, second = value[:7]
+            clock.set_rtc(calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0)))
+            device.rtc_log.append((clock.elapsed_us, clock.rtc()))
+            return None
+
+        def init(self, value):
+            self.datetime(value)
+
+    def unique_id():
+        return b'\x00SIMUL'
+
+    mod.Pin = Pin
+    mod.PWM = PWM
+    mod.Timer = Timer
+    mod.RTC = RTC
+    mod.mem32 = _Mem32()
+    mod.freq = freq
+    mod.lightsleep = lightsleep
+    mod.deepsleep = lightsleep
+    mod.idle = lambda: None
+    mod.soft_reset = soft_reset
+    mod.reset = reset
+    mod.unique_id = unique_id
+    mod.disable_irq = lambda: 0
+    mod.enable_irq = lambda state: None
+    return mod
+
+
+def make_network(clock, device):
+    """`network` module. Wi-Fi connects instantly unless device.wifi_available is False."""
+    mod = types.ModuleType('network')
+
+    class WLAN:
+        IF_STA = 0
+        IF_AP = 1
+        PM_NONE = 0
+        PM_PERFORMANCE = 1
+        PM_POWERSAVE = 2
+
+        def __init__(self, interface=0):
+            self._active = False
+            self._connected = False
+            self._config = {'txpower': 20, 'pm': WLAN.PM_PERFORMANCE, 'mac': b'\x00SIMUL'}
+            device.wlan = self
+
+        def active(self, value=None):
+            if value is None:
+                return self._active
+            self._active = bool(value)
+            if not self._active:
+                self._connected = False
+            device.wifi_log.append((clock.elapsed_us, 'active', self._active))
+            return None
+
+        def connect(self, ssid=None, password=None, **kwargs):
+            if self._active and device.wifi_available:
+                self._connected = True
+            device.wifi_log.append((clock.elapsed_us, 'connect', self._connected))
+
+        def disconnect(self):
+            self._connected = False
+
+        def isconnected(self):
+            return self._active and self._connected and device.wifi_available
+
+        def status(self, param=None):
+            if param == 'rssi':
+                return -50
+            return 1010 if self.isconnected() else 1000
+
+        def ifconfig(self, *args):
+            return ('192.168.0.2', '255.255.255.0', '192.168.0.1', '192.168.0.1')
+
+        def config(self, *args, **kwargs):
+            if args:
+                return self._config.get(args[0])
+            self._config.update(kwargs)
+            return None
+
+    mod.WLAN = WLAN
+    mod.STA_IF = WLAN.IF_STA
+    mod.AP_IF = WLAN.IF_AP
+    return mod
+
+
+def make_ntptime(clock, device):
+    """`ntptime` module. settime() sets the RTC to the true time."""
+    mod = types.ModuleType('ntptime')
+    mod.host = 'pool.ntp.org'
+    mod.timeout = 1
+
+    def settime():
+        device.ntp_count += 1
+        if not device.wifi_available:
+            raise OSError(110) # ETIMEDOUT
+        clock.set_rtc(clock.epoch())
+
+    def time():
+        settime()
+        return int(clock.epoch())
+
+    mod.settime = settime
+    mod.time = time
+    return mod
+
+
+class Device:
+    """Observable state of the simulated board."""
+
+    def __init__(self, log_limit=None):
+        """
+        Args:
+            log_limit (int): Entries kept per log, the oldest are dropped. None: Unlimited.
+        """
+        def log():
+            return collections.deque(maxlen=log_limit)
+
+        self.pins = {}
+        self.pin_log = log()    # (elapsed_us, pin, value)
+        self.timer_log = log()  # (elapsed_us, timer_id, mode, period_us)
+        self.freq_log = log()   # (elapsed_us, hz)
+        self.sleep_log = log()  # (elapsed_us, ms)
+        self.wifi_log = log()   # (elapsed_us, event, value)
+        self.rtc_log = log()    # (elapsed_us, epoch set)
+        self.cpu_freq = 160_000_000
+        self.wifi_available = True
+        self.wlan = None
+        self.ntp_count = 0      # NTP requests (ntptime and UDP)
+        self.heap_size = 2 * 1024 * 1024 # gc heap (PSRAM)
+        self.mem_free = 1536 * 1024      # Returned by gc.mem_free(), set by scenarios
+
+    def ptr32(self, address):
+        return _Ptr32(address)
@@ -0,0 +1,262 @@
+"""
+Recorded stream traces: Holodex /users/live responses and YouTube videos items over time.
+
+Trace file (JSON):
+
+    {
+      "name": "...",
+      "start": 1736121600, "end": 1736208000,       # UTC seconds
+      "channels": ["UC...", ...],
+      "holodex": [{"t": 1736121600, "body": [...]}, ...],           # /users/live responses, on change
+      "youtube": [{"t": 1736121600, "id": "...", "item": {...}}, ...] # videos items, on change (null: deleted)
+    }
+
+Replayed responses are the last recorded ones at the request time.
+
+    python -m simulator.trace record out.json --holodex-key K --youtube-key Y --channels UC_A,UC_B --hours 24
+    python -m simulator.trace synth out.json --days 7 --seed 1
+"""
+
+import argparse
+import bisect
+import calendar
+import hashlib
+import json
+import random
+import time
+import urllib.request
+
+from .scenario import Scenario, Stream
+
+
+def _parse_iso(text):
+    return calendar.timegm(time.strptime(text[:19], '%Y-%m-%dT%H:%M:%S'))
+
+
+class Trace:
+    """A recorded timeline of API responses."""
+
+    def __init__(self, name, start, end, channels, holodex=None, youtube=None):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.channels = list(channels)
+        self.holodex = sorted(holodex or [], key=lambda entry: entry['t'])
+        self.youtube = sorted(youtube or [], key=lambda entry: entry['t'])
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get('name', path), data['start'], data['end'], data['channels'],
+                   data.get('holodex'), data.get('youtube'))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'name': self.name, 'start': self.start, 'end': self.end,
+                       'channels': self.channels, 'holodex': self.holodex, 'youtube': self.youtube},
+                      f, separators=(',', ':'))
+
+    def actual_starts(self):
+        """{video_id: (channel_id, actual start)} of the streams going live in the trace."""
+        channels = {}
+        for entry in self.holodex:
+            for record in entry['body']:
+                channels[record['id']] = (record.get('channel') or {}).get('id', record.get('channel_id'))
+        starts = {}
+        for entry in self.youtube:
+            item = entry['item']
+            if item is None or entry['id'] in starts:
+                continue
+            actual = item.get('liveStreamingDetails', {}).get('actualStartTime')
+            if actual is not None:
+                starts[entry['id']] = (channels.get(entry['id']), _parse_iso(actual))
+        # Streams only seen by Holodex
+        for entry in self.holodex:
+            for record in entry['body']:
+                if record['id'] not in starts and record.get('start_actual'):
+                    starts[record['id']] = (channels.get(record['id']), _parse_iso(record['start_actual']))
+        return {k: v for k, v in starts.items() if self.start <= v[1] < self.end}
+
+
+class TraceScenario:
+    """Serves a Trace from the Holodex and YouTube hosts of a Network. Same interface as Scenario."""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self._holodex_t = [entry['t'] for entry in trace.holodex]
+        self._youtube = {}  # video_id: ([t], [item])
+        for entry in trace.youtube:
+            times, items = self._youtube.setdefault(entry['id'], ([], []))
+            times.append(entry['t'])
+            items.append(entry['item'])
+
+    def install(self, net):
+        net.add_host('holodex.net').handler = self.holodex
+        net.add_host('www.googleapis.com').handler = self.youtube
+
+    def holodex(self, request):
+        if request.route != '/api/v2/users/live':
+            return 404, {'message': 'Not Found'}
+        index = bisect.bisect_right(self._holodex_t, request.epoch) - 1
+        if index < 0:
+            return 200, []
+        channels = set(request.params.get('channels', '').split(','))
+        body = [record for record in self.trace.holodex[index]['body']
+                if (record.get('channel') or {}).get('id', record.get('channel_id')) in channels]
+        return 200, body
+
+    def youtube(self, request):
+        if request.route != '/youtube/v3/videos':
+            return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+        ids = [i for i in request.params.get('id', '').split(',') if i]
+        if not ids or len(ids) > 50:
+            return 400, {'error': {'code': 400, 'message': 'Bad Request'}}
+        items = []
+        for video_id in ids:
+            times, values = self._youtube.get(video_id, ((), ()))
+            index = bisect.bisect_right(times, request.epoch) - 1
+            if index >= 0 and values[index] is not None:
+                items.append(values[index])
+        tag = hashlib.md5(json.dumps(items).encode()).hexdigest()
+        return 200, {'kind': 'youtube#videoListResponse', 'etag': tag, 'items': items}
+
+
+# --- Trace sources -------------------------------------------------------
+
+class _Recorder:
+    """Appends snapshots to a Trace only when they change."""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self._last_holodex = None
+        self._last_youtube = {}
+
+    def holodex(self, t, body):
+        if body != self._last_holodex:
+            self.trace.holodex.append({'t': t, 'body': body})
+            self._last_holodex = body
+
+    def youtube(self, t, video_id, item):
+        if video_id not in self._last_youtube or self._last_youtube[video_id] != item:
+            self.trace.youtube.append({'t': t, 'id': video_id, 'item': item})
+            self._last_youtube[video_id] = item
+
+
+def trace_from_scenario(scenario, start, end, name='synthetic'):
+    """Samples a Scenario at every change point."""
+    channels = sorted({stream.channel_id for stream in scenario.streams})
+    trace = Trace(name, start, end, channels)
+    recorder = _Recorder(trace)
+    points = {start}
+    for stream in scenario.streams:
+        for t in (stream.announced, stream.actual, stream.end, stream.cancelled):
+            if t is not None:
+                points.add(t)
+                points.add(t + stream.holodex_lag)
+    for t in sorted(p for p in points if start <= p < end):
+        body = [record for record in (stream.holodex_record(t) for stream in scenario.streams) if record]
+        body.sort(key=lambda record: record['start_scheduled'])
+        recorder.holodex(t, body)
+        for stream in scenario.streams:
+            if stream.announced <= t or stream.video_id in recorder._last_youtube:
+                recorder.youtube(t, stream.video_id, stream.youtube_item(t))
+    return trace
+
+
+def synthetic_scenario(start, days, channels=('UC_A', 'UC_B', 'UC_C'), seed=0):
+    """
+    Streams with delays drawn from a typical distribution:
+    mostly on time or a few minutes late, some early, a few very late or cancelled.
+    """
+    rng = random.Random(seed)
+    scenario = Scenario()
+    for day in range(days):
+        for index, channel in enumerate(channels):
+            if rng.random() < 0.2: # Day off
+                continue
+            scheduled = start + day * 86400 + rng.choice((10, 12, 13, 18, 20, 21, 22)) * 3600
+            r = rng.random()
+            if r < 0.10:
+                delay = rng.randint(-300, -30)
+            elif r < 0.75:
+                delay = rng.randint(0, 180)
+            elif r < 0.95:
+                delay = rng.randint(180, 900)
+            else:
+                delay = rng.randint(900, 3600)
+            cancelled = scheduled - rng.randint(600, 7200) if rng.random() < 0.03 else None
+            scenario.add(Stream(f'{channel}-{day}-{index}', channel, scheduled,
+                                actual=None if cancelled else scheduled + delay,
+                                duration=rng.randint(3600, 4 * 3600),
+                                announced=scheduled - rng.randint(3600, 2 * 86400),
+                                cancelled=cancelled, holodex_lag=rng.randint(20, 120)))
+    return scenario
+
+
+def record_live(path, holodex_key, youtube_key, channels, hours, interval=60):
+    """Polls the real APIs and writes a trace. YouTube is polled for imminent and live streams only."""
+    start = int(time.time())
+    trace = Trace(f'recorded {time.strftime("%Y-%m-%d %H:%M", time.gmtime(start))}', start, start, channels)
+    recorder = _Recorder(trace)
+
+    def get(url, headers=None):
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {}), timeout=30) as f:
+            return json.load(f)
+
+    while time.time() < start + hours * 3600:
+        now = int(time.time())
+        try:
+            body = get(f'https://holodex.net/api/v2/users/live?channels={",".join(channels)}',
+                       {'X-APIKEY': holodex_key})
+            recorder.holodex(now, body)
+            ids = [r['id'] for r in body if r.get('status') == 'live'
+                   or _parse_iso(r['start_scheduled']) - now < 3600]
+            ids += [i for i, item in recorder._last_youtube.items() if item is not None and i not in ids]
+            if youtube_key and ids:
+                resp = get(f'https://www.googleapis.com/youtube/v3/videos?part=liveStreamingDetails'
+                           f'&id={",".join(ids[:50])}&key={youtube_key}')
+                items = {item['id']: item for item in resp.get('items', [])}
+                for video_id in ids[:50]:
+                    recorder.youtube(now, video_id, items.get(video_id))
+        except (OSError, ValueError) as e:
+            print(f'[{now}] {e}')
+        trace.end = now
+        trace.save(path)
+        time.sleep(interval)
+    return trace
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Records or synthesizes stream traces.')
+    sub = parser.add_subparsers(dest='mode', required=True)
+    rec = sub.add_parser('record', help='Poll the real APIs')
+    rec.add_argument('path')
+    rec.add_argument('--holodex-key', required=True)
+    rec.add_argument('--youtube-key', default='')
+    rec.add_argument('--channels', required=True, help='Comma-separated channel ids')
+    rec.add_argument('--hours', type=float, default=24)
+    rec.add_argument('--interval', type=int, default=60, help='Seconds between polls')
+    syn = sub.add_parser('synth', help='Generate a synthetic trace')
+    syn.add_argument('path')
+    syn.add_argument('--start', default='2025-01-06T00:00:00', help='UTC')
+    syn.add_argument('--days', type=int, default=7)
+    syn.add_argument('--channels', default='UC_A,UC_B,UC_C')
+    syn.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.mode == 'record':
+        record_live(args.path, args.holodex_key, args.youtube_key, args.channels.split(','),
+                    args.hours, args.interval)
+    else:
+        start = _parse_iso(args.start)
+        scenario = synthetic_scenario(start, args.days, args.channels.split(','), args.seed)
+        trace = trace_from_scenario(scenario, start, start + args.days * 86400,
+                                    name=f'synthetic {args.days}d seed {args.seed}')
+        trace.save(args.path)
+        print(f'{args.path}: {len(trace.actual_starts())} streams, '
+              f'{len(trace.holodex)} Holodex / {len(trace.youtube)} YouTube snapshots')
+
+
+if __name__ == '__main__':
+    main()